@@ -1,33 +1,60 @@
-import subprocess
-import json
+import threading
+from instrumentation import timed
 
-def schedule_customer_call(customer_name, customer_number, customer_vehicle, service_reason, available_slots):
+_DISPATCHER = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_dispatcher():
+    """Process-wide call_dispatcher.CallDispatcher, started on first use."""
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None:
+            from call_dispatcher import CallDispatcher
+            _DISPATCHER = CallDispatcher().start()
+        return _DISPATCHER
+
+
+def build_call_script(customer_name, customer_vehicle, service_reason, available_slots):
+    """Text read to the customer on the call."""
+    output = f"Hello {customer_name},\nThis call is to inform you that your {customer_vehicle} needs service due to {service_reason}.\nAvailable slots are: "
+    for slot in available_slots:
+        output += slot + "\n"
+    return output
+
+
+def schedule_customer_call_async(customer_name, customer_number, customer_vehicle, service_reason,
+                                 available_slots, dispatcher=None, callback=None):
+    """
+    Place an interactive customer service call without waiting for it.
+
+    Returns:
+        concurrent.futures.Future: resolves to the customer's spoken reply
+        (lowercased text), or None if the call went unanswered
+    """
+    dispatcher = dispatcher or get_dispatcher()
+    script = build_call_script(customer_name, customer_vehicle, service_reason, available_slots)
+    return dispatcher.submit(script, list(available_slots), customer_number, callback=callback)
+
+
+@timed("engagement.schedule_customer_call")
+def schedule_customer_call(customer_name, customer_number, customer_vehicle, service_reason, available_slots,
+                           dispatcher=None):
     """
     Schedule and execute an interactive customer service call.
-    
+
     Args:
         customer_name (str): Name of the customer
         customer_number (str): Phone number of the customer
         customer_vehicle (str): Vehicle model
         service_reason (str): Reason for service
         available_slots (list): List of available appointment slots
-    
+        dispatcher (CallDispatcher): Optional dispatcher (default: process-wide one)
+
     Returns:
-        subprocess.CompletedProcess: Result from the subprocess call
+        str or None: The customer's spoken reply, None if unanswered
     """
-    # Generate customer message
-    output = f"Hello {customer_name},\nThis call is to inform you that your {customer_vehicle} needs service due to {service_reason}.\nAvailable slots are: "
-    for slot in available_slots:
-        output += slot + "\n"
-    
-    # Prepare JSON payload
-    payload = json.dumps({
-        "script": output,
-        "slots": available_slots,
-        "number": customer_number
-    })
-    
-    # Execute the interactive call server (same as your original code)
-    result = subprocess.run(["python", "InteractiveCallServer.py", payload])
-    
-    return result
+    return schedule_customer_call_async(
+        customer_name, customer_number, customer_vehicle, service_reason, available_slots,
+        dispatcher=dispatcher
+    ).result()
@@ -6,6 +6,8 @@ from threading import Timer
 import threading
 import sys
 import json
+import time
+import uuid
 
 # Twilio credentials
 TWILIO_ACCOUNT_SID = 'yoursid'
@@ -15,29 +17,26 @@ TWILIO_CALLER_ID = '+987654321'
 client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 app = Flask(__name__)
 
-# ---- GLOBAL STORAGE ----
-SESSION = {
-    "script": "",
-    "slots": [],
-    "response": None       # <-- user response captured here
-}
+# ---- PER-CALL SESSIONS ----
+# Every outbound call gets its own session, found either by the token carried in
+# the webhook URLs (/start-call?session=<token>) or by the provider's CallSid once
+# the call is bound to it. Sessions nobody closes (dropped calls, crashed callers)
+# are evicted after their TTL. The slot-offer TwiML is rendered once per session.
+SESSION_TTL = 900   # seconds an unanswered/abandoned session is kept
 
-# This event allows Flask to stop when user response is captured
-response_event = threading.Event()
 
-@app.route("/start-call", methods=["POST"])
-def start_call_twiml():
+def _render_offer(token, script):
     resp = VoiceResponse()
 
     gather = resp.gather(
         input="speech",
         timeout="auto",
-        action="/handle-response",
+        action=f"/handle-response?session={token}",
         method="POST"
     )
 
     gather.say(
-        SESSION["script"],
+        script,
         voice="Polly.Aditi",
         language="en-IN"
     )
@@ -45,30 +44,160 @@ def start_call_twiml():
     resp.say("Your response is not clear to us.",
              voice="Polly.Aditi", language="en-IN")
 
-    return Response(str(resp), mimetype="text/xml")
+    return str(resp)
+
+
+def _render_say(text):
+    resp = VoiceResponse()
+    resp.say(text, voice="Polly.Aditi", language="en-IN")
+    return str(resp)
+
+
+RECORDED_TWIML = _render_say("Your response has been recorded.")
+EXPIRED_TWIML = _render_say("Sorry, this call has expired.")
+
+
+class CallSession:
+    __slots__ = ("token", "script", "slots", "twiml", "call_sid", "response", "event", "expires_at")
+
+    def __init__(self, token, script, slots, expires_at):
+        self.token = token
+        self.script = script
+        self.slots = slots
+        self.twiml = _render_offer(token, script)
+        self.call_sid = None
+        self.response = None       # <-- user response captured here
+        self.event = threading.Event()
+        self.expires_at = expires_at
+
+
+class SessionTable:
+    """Thread-safe token/CallSid -> CallSession map with TTL eviction."""
+
+    def __init__(self, ttl=SESSION_TTL, sweep_every=256):
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._by_token = {}
+        self._by_sid = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self.evicted = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_token)
+
+    def create(self, script, slots, ttl=None):
+        token = uuid.uuid4().hex
+        session = CallSession(token, script, slots, time.monotonic() + (ttl or self.ttl))
+        with self._lock:
+            self._by_token[token] = session
+            self._created += 1
+            sweep = self._created % self.sweep_every == 0
+        if sweep:
+            self.evict_expired()
+        return session
+
+    def bind_call(self, token, call_sid):
+        with self._lock:
+            session = self._by_token.get(token)
+            if session is not None and call_sid:
+                session.call_sid = call_sid
+                self._by_sid[call_sid] = session
+            return session
+
+    def get(self, token=None, call_sid=None):
+        with self._lock:
+            session = self._by_token.get(token) if token else None
+            if session is None and call_sid:
+                session = self._by_sid.get(call_sid)
+            if session is not None and session.expires_at < time.monotonic():
+                self._remove(session)
+                self.evicted += 1
+                session.event.set()
+                return None
+            return session
+
+    def _remove(self, session):
+        self._by_token.pop(session.token, None)
+        if session.call_sid is not None:
+            self._by_sid.pop(session.call_sid, None)
+
+    def close(self, token):
+        with self._lock:
+            session = self._by_token.get(token)
+            if session is not None:
+                self._remove(session)
+            return session
+
+    def evict_expired(self, now=None):
+        """Drop every session past its TTL (waking any waiter); returns how many."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [s for s in self._by_token.values() if s.expires_at < now]
+            for session in expired:
+                self._remove(session)
+            self.evicted += len(expired)
+        for session in expired:
+            session.event.set()
+        return len(expired)
+
+
+SESSIONS = SessionTable()
+
+
+def new_session(script, slots):
+    return SESSIONS.create(script, slots).token
+
+
+def get_session(session_id):
+    return SESSIONS.get(session_id)
+
+
+def close_session(session_id):
+    return SESSIONS.close(session_id)
+
+
+def wait_response(session_id, timeout=None):
+    """Block until the caller answered (or timeout/eviction); returns the speech text or None."""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return None
+    session.event.wait(timeout)
+    return session.response
+
+
+def _request_session():
+    call_sid = request.values.get("CallSid")
+    token = request.args.get("session", "")
+    session = SESSIONS.get(token, call_sid)
+    if session is not None and call_sid and session.call_sid is None:
+        SESSIONS.bind_call(session.token, call_sid)
+    return session
+
+
+@app.route("/start-call", methods=["POST"])
+def start_call_twiml():
+    session = _request_session()
+    if session is None:
+        return Response(EXPIRED_TWIML, mimetype="text/xml")
+    return Response(session.twiml, mimetype="text/xml")
 
 @app.route("/handle-response", methods=["POST"])
 def handle_response():
     user_input = (request.values.get("SpeechResult") or "").lower()
 
-    SESSION["response"] = user_input
-    response_event.set()
-
-    # Build TwiML manually (no VoiceResponse)
-    xml = """<?xml version="1.0" encoding="UTF-8"?>
-    <Response>
-        <Say voice="Polly.Aditi" language="en-IN">
-            Your response has been recorded.
-        </Say>
-    </Response>
-    """
+    session = _request_session()
+    if session is not None:
+        session.response = user_input
+        session.event.set()
 
-    return Response(xml, mimetype="text/xml")
+    return Response(RECORDED_TWIML, mimetype="text/xml")
 
 
 def run_call(script, slots, to_number):
-    SESSION["script"] = script
-    SESSION["slots"] = slots
+    """One-off call from the command line; see call_dispatcher for a long-lived server."""
+    session_id = new_session(script, slots)
 
     tunnel = ngrok.connect(5000)
     public_url = tunnel.public_url
@@ -78,7 +207,7 @@ def run_call(script, slots, to_number):
         call = client.calls.create(
             to=to_number,
             from_=TWILIO_CALLER_ID,
-            url=f"{public_url}/start-call",
+            url=f"{public_url}/start-call?session={session_id}",
             method="POST"
         )
         print("Call SID:", call.sid)
@@ -86,16 +215,18 @@ def run_call(script, slots, to_number):
     Timer(3, trigger).start()
 
     server_thread = threading.Thread(
-        target=lambda: app.run(port=5000, debug=False, use_reloader=False)
+        target=lambda: app.run(port=5000, debug=False, use_reloader=False),
+        daemon=True
     )
     server_thread.start()
 
-    response_event.wait()
+    response = wait_response(session_id)
+    close_session(session_id)
 
-    print("Captured user input:", SESSION["response"])
+    print("Captured user input:", response)
     ngrok.kill()
 
-    return SESSION["response"]
+    return response
 
 if __name__ == "__main__":
     data = json.loads(sys.argv[1])
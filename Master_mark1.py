@@ -1,72 +1,142 @@
-import pandas as pd
-from main_runner import module_1
-from EngagementAgent import schedule_customer_call
+import sys
+from telemetry_io import BATTERY_COLUMNS, ENGINE_COLUMNS, TELEMETRY_COLUMNS, read_table
+from fleet_runner import diagnose_fleet
+from EngagementAgent import schedule_customer_call_async
+from call_dispatcher import CallDispatcher
+from slot_matcher import MIN_CONFIDENCE, SlotMatcher
 from scheduler_agent import *
+from rolling_calendar import RollingCalendar
+from instrumentation import export_json, new_trace_id, timed, trace
+from vehicle_state import VEHICLE_STATE
 
-def process_csv(input_file, output_file1, output_file2):
+METRICS_JSON = "pipeline_metrics.json"
+VEHICLE_STATE_NPZ = "vehicle_state.npz"
+LLM_CACHE_DB = "llm_cache.sqlite"
+
+# (vehicle type, service type) booked for each diagnosis; sets how many
+# consecutive slots the visit takes (SERVICE_DURATION)
+ISSUE_SERVICE = {
+    "ENGINE ISSUE": ("Car", "Engine Check"),
+    "BATTERY ISSUE": ("EV", "Battery Issue"),
+}
+
+@timed("master.process_csv")
+def process_csv(input_file, workers=1, dispatcher=None, service_calendar=None, llm_cache_path=LLM_CACHE_DB):
     
-    df = pd.read_csv(input_file)
+    # CSV, .npcol, Parquet or Feather; only the columns used below are read
+    df = read_table(input_file, columns=TELEMETRY_COLUMNS)
     
     df = df[df['Name'] != 'Name']
     df = df.reset_index(drop=True)
     
-    engine_columns = ['Engine rpm', 'Lub oil pressure', 'Fuel pressure', 
-                      'Coolant pressure', 'lub oil temp', 'Coolant temp', 'km_driven']
+    engine_columns = ENGINE_COLUMNS
     
-    electrical_columns = ['Voltage (V)', 'Current (A)', 'Temperature (°C)', 
-                          'Motor Speed (RPM)', 'Estimated SOC (%)', 'km_driven']
+    electrical_columns = BATTERY_COLUMNS
     
     total_rows = len(df)
     print(f"Total rows to process: {total_rows}\n")
     
-    freeSlot = generate_slots()
-    
+    # Rolling calendar: bookings from earlier runs are kept, passed days archived
+    service_calendar = service_calendar or RollingCalendar()
+    service_calendar.advance()
+    freeSlot = service_calendar.frame(days=7)
+
+    # Diagnose the whole fleet up front; rows are sharded across `workers`
+    # processes and the decisions come back in telemetry order.
+    # The customer's phone number identifies the vehicle for maintenance tracking
+    df["vehicle_id"] = df["Phone Number"].astype(str).str.lstrip("+")
+    row_pairs = list(zip(df[engine_columns + ["vehicle_id"]].to_dict(orient="records"),
+                         df[electrical_columns + ["vehicle_id"]].to_dict(orient="records")))
+    # One trace ID per telemetry row, shared by diagnosis, the call and the booking
+    trace_ids = [new_trace_id() for _ in range(total_rows)]
+    # LLM verdicts for near-identical readings are reused across rows and runs
+    results = diagnose_fleet(row_pairs, workers=workers, trace_ids=trace_ids, llm_cache_path=llm_cache_path,
+                             with_confidence=True)
+
+    # Flagged vehicles are queued by risk (verdict severity, ML confidence, then waiting time),
+    # so the most urgent customers are called first and book first.
+    queue = PriorityScheduler()
     for index, row in df.iterrows():
-        freeSlots = freeSlot
-        print("\n")
-        print(f"Processing row {index + 1}/{total_rows}")
-        print(f"Name: {row['Name']}, Phone: {row['Phone Number']}")
-        
-        engine_data = {col: row[col] for col in engine_columns}
-        
-        electrical_data = {col: row[col] for col in electrical_columns}
-        
-        engine_df = pd.DataFrame([engine_data])
-        electrical_df = pd.DataFrame([electrical_data])
-        
-        engine_df.to_csv(output_file1, index=False)
-        electrical_df.to_csv(output_file2, index=False)
+        with trace(trace_ids[index]):
+            print("\n")
+            print(f"Processing row {index + 1}/{total_rows} (trace {trace_ids[index]})")
+            print(f"Name: {row['Name']}, Phone: {row['Phone Number']}")
+
+            result, confidence = results[index]
+            print(f"Row {index+1} Condition: {result}")
 
-        result = module_1()
-        print(f"Row {index+1} Condition: {result}")
+            if "ISSUE" in result:
+                vehicle_type, service_type = ISSUE_SERVICE.get(result, ("Vehicle", result))
+                # An unscored row (conservative FAULT) counts as fully confident
+                queue.push(df.at[index, "vehicle_id"], result,
+                           confidence=1.0 if confidence is None else confidence,
+                           vehicle_type=vehicle_type, service_type=service_type, index=index)
 
-        if "ISSUE" in result:
-            freeSlots = random_bookings(freeSlots, 0.3)
-            freeSlots = get_available_slots(freeSlots)
+    # Calls run concurrently on the dispatcher, placed in priority order
+    pending = []
+    for entry in queue.drain():
+        index = entry["index"]
+        row = df.loc[index]
+        with trace(trace_ids[index]):
+            # The calendar persists across runs, so offers come from real
+            # bookings only (no simulated random_bookings here)
+            freeSlots = get_available_slots(freeSlot)
 
             if len(freeSlots) == 0:
                 continue
             else:
-                phNo = "+"+str(row['Phone Number'])
-                bookedSlot = schedule_customer_call(
+                phNo = "+"+str(row['Phone Number']).lstrip("+")
+                print(f"Row {index+1}: calling ({entry['verdict']}, risk {entry['risk_level']})")
+                future = schedule_customer_call_async(
                     customer_name=row['Name'],
                     customer_number=phNo,
                     customer_vehicle="Vehicle",
-                    service_reason=result,
-                    available_slots=freeSlots
+                    service_reason=entry["verdict"],
+                    available_slots=freeSlots,
+                    dispatcher=dispatcher
                 )
+                # Index of exactly what was offered, to resolve the spoken reply
+                pending.append((future, entry, SlotMatcher.from_calendar(freeSlot)))
 
-                booking = book_slot(
-                    df, bookedSlot, "Vehicle", "None", result, "None"
-                )
+    # Bookings are made in priority order, not in the order customers answer,
+    # so a higher-risk vehicle is never beaten to an earlier bay.
+    for future, entry, matcher in pending:
+        index = entry["index"]
+        with trace(trace_ids[index]):
+            try:
+                reply = future.result()
+            except Exception as e:
+                print(f"Row {index+1} call failed: {e}")
+                continue
+
+            bookedSlot, label, confidence = matcher.match(reply)
+            if bookedSlot is None or confidence < MIN_CONFIDENCE:
+                print(f"Row {index+1}: could not resolve a slot from reply {reply!r}")
+                continue
+            print(f"Row {index+1}: reply {reply!r} -> {label} (confidence {confidence:.2f})")
+
+            # Whole visit starting at the chosen slot; if it was taken meanwhile
+            # (e.g. by a higher-risk caller offered the same slots) the booking
+            # fails instead of silently moving to another time
+            booking = book_service(
+                freeSlot, entry["vehicle_id"], entry["vehicle_type"], entry["service_type"],
+                entry["risk_level"], start_slot_id=bookedSlot, exact=True
+            )
+
+            print(booking)
 
-                print(booking)
+    # Write this run's bookings to the day partitions (and truncate the log)
+    service_calendar.save()
     
     print(f"ALL {total_rows} ROWS PROCESSED SUCCESSFULLY!")
 
 if __name__ == "__main__":
     input_csv = "telemetry.csv"
-    output_engine_csv = "engine_inference.csv"
-    output_electrical_csv = "battery_inference.csv"
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    concurrent_calls = int(sys.argv[2]) if len(sys.argv) > 2 else 4
     
-    process_csv(input_csv, output_engine_csv, output_electrical_csv)
\ No newline at end of file
+    VEHICLE_STATE.restore(VEHICLE_STATE_NPZ)
+    with CallDispatcher(max_concurrent=concurrent_calls) as dispatcher:
+        process_csv(input_csv, workers=workers, dispatcher=dispatcher)
+    VEHICLE_STATE.save(VEHICLE_STATE_NPZ)
+    export_json(METRICS_JSON)
\ No newline at end of file
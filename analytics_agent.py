@@ -1,17 +1,63 @@
+import asyncio
+import random
+import threading
 import ollama
-from datetime import datetime
+from instrumentation import inc, timer
+from vehicle_state import DEFAULT_VEHICLE, VehicleStateStore
+
+# Decision modes:
+#   "rules" - answer from the rule table / memo cache only (default, no LLM call)
+#   "audit" - answer from the rules, but send a sample of reports to the LLM and
+#             count disagreements; the output is still the rule decision
+#   "llm"   - legacy behaviour: the LLM decides, rules are only the fallback
+DECISION_MODES = ("rules", "audit", "llm")
+
+# (subsystem, fact_fault, fact_km, fact_date) -> decision, shared by every analyst
+_DECISION_CACHE = {}
+_STATS = {"hits": 0, "misses": 0, "llm_calls": 0, "audit_mismatches": 0, "llm_errors": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(name):
+    with _STATS_LOCK:
+        _STATS[name] += 1
+
+
+# Severity order used to merge the subsystem decisions of one vehicle into a
+# single verdict (same order as scheduler_agent.SEVERITY)
+DECISION_SEVERITY = {"NO SERVICE": 0, "MAINTENANCE DUE": 1, "BATTERY ISSUE": 2, "ENGINE ISSUE": 3}
+
+
+def merge_decisions(decisions):
+    """Most severe of the subsystem decisions (None ignored); None if there are none."""
+    return max((d for d in decisions if d is not None), key=lambda d: DECISION_SEVERITY.get(d, 0), default=None)
+
+
+def decision_stats():
+    """Process-wide decision counters (cache hits/misses, LLM calls, audit mismatches)."""
+    with _STATS_LOCK:
+        return dict(_STATS)
+
 
 class DataAnalystAgent:
     ALLOWED = {"BATTERY ISSUE", "ENGINE ISSUE", "MAINTENANCE DUE", "NO SERVICE"}
-
-    def __init__(self, service_threshold=5000):
-        self.total_km = 1000.0
-        self.last_service_km = 0.0
+    MODEL = "llama3.1:8b"
+
+    def __init__(self, service_threshold=5000, mode="rules", audit_rate=0.05, state=None):
+        if mode not in DECISION_MODES:
+            raise ValueError(f"mode must be one of {DECISION_MODES}, got {mode!r}")
+        # Odometer / service history per vehicle (vehicle_state.VehicleStateStore).
+        # Pass a shared store to keep it across analysts; by default each analyst
+        # starts from scratch like before.
+        self.state = state if state is not None else VehicleStateStore()
         self.service_threshold = service_threshold
-        self.next_service_date = datetime(2025, 12, 31)
+        self.mode = mode
+        self.audit_rate = audit_rate
 
         # NEW: holds the last decision string
         self.last_output = None
+        # ML fault confidence of the payload behind last_output (None if unscored)
+        self.last_confidence = None
 
     def _local_decision(self, sub, fact_fault, fact_km, fact_date):
         if fact_fault and sub == "BATTERY":
@@ -22,23 +68,56 @@ class DataAnalystAgent:
             return "MAINTENANCE DUE"
         return "NO SERVICE"
 
-    def analyze_and_report(self, msg):
+    def _decide(self, facts):
+        """Rule decision for facts, memoized across all analysts in the process."""
+        decision = _DECISION_CACHE.get(facts)
+        if decision is not None:
+            _count("hits")
+            return decision
+        _count("misses")
+        decision = self._local_decision(*facts)
+        _DECISION_CACHE[facts] = decision
+        return decision
+
+    def _should_audit(self):
+        return self.mode == "audit" and random.random() < self.audit_rate
+
+    def _check_audit(self, llm_output, decision):
+        if llm_output != decision:
+            _count("audit_mismatches")
+
+    def _update(self, msg):
+        """Update the vehicle's state from msg; returns (vehicle_id, sub, fact_fault)."""
         sub = msg["subsystem"]
         verdict = msg["ai_verdict"]
         km_inc = float(msg["km_driven"])
+        vehicle_id = msg.get("vehicle_id") or DEFAULT_VEHICLE
 
         # Update odometer
-        self.total_km += km_inc
-        km_since_service = self.total_km - self.last_service_km
-        today = datetime.now()
+        self.state.add_km(vehicle_id, km_inc)
+        self.state.record_verdict(vehicle_id, sub, verdict)
+        return vehicle_id, sub, (verdict == "FAULT")
 
-        # Facts
-        fact_fault = (verdict == "FAULT")
-        fact_km = (km_since_service >= self.service_threshold)
-        fact_date = (today > self.next_service_date)
+    def _facts(self, vehicle_id, sub, fact_fault):
+        """(sub, fact_fault, fact_km, fact_date) from the vehicle's current state."""
+        fact_km = (self.state.km_since_service(vehicle_id) >= self.service_threshold)
+        fact_date = self.state.service_date_passed(vehicle_id)
+        return sub, fact_fault, fact_km, fact_date
 
+    def _commit(self, vehicle_id, sub, fact_fault, asked=None, llm_output=None, confidence=None):
+        """
+        Decide on the vehicle's current facts and record it; the caller holds
+        state.lock(vehicle_id). An LLM answer is used only if it was given for these
+        same facts (the other subsystem may have reset the service meanwhile);
+        otherwise the rules decide. Returns (decision, facts).
+        """
+        facts = self._facts(vehicle_id, sub, fact_fault)
+        final_output = llm_output if llm_output is not None and facts == asked else self._decide(facts)
+        return self._record(final_output, vehicle_id, confidence), facts
+
+    def _prompt(self, sub, fact_fault, fact_km, fact_date):
         # STRICT PROMPT WITHOUT extra arguments
-        prompt = f"""
+        return f"""
         ONLY OUTPUT ONE OF THESE OPTIONS (UPPERCASE, EXACT MATCH, NO EXTRA WORDS):
         BATTERY ISSUE
         ENGINE ISSUE
@@ -62,35 +141,96 @@ class DataAnalystAgent:
         Respond with ONLY one of the four outputs.
         """
 
-        try:
-            resp = ollama.chat(
-                model="llama3.1:8b",
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            raw = resp["message"]["content"].strip().upper()
-            line = raw.splitlines()[0].strip()
+    def _parse(self, raw, facts):
+        raw = raw.strip().upper()
+        line = raw.splitlines()[0].strip()
 
-            if line in self.ALLOWED:
-                final_output = line
-            else:
-                match = next((a for a in self.ALLOWED if a in line), None)
-                if match:
-                    final_output = match
-                else:
-                    final_output = self._local_decision(sub, fact_fault, fact_km, fact_date)
-
-        except Exception:
-            # If LLM fails, fallback to deterministic rules
-            final_output = self._local_decision(sub, fact_fault, fact_km, fact_date)
+        if line in self.ALLOWED:
+            return line
+        match = next((a for a in self.ALLOWED if a in line), None)
+        if match:
+            return match
+        return self._local_decision(*facts)
 
+    def _record(self, final_output, vehicle_id=DEFAULT_VEHICLE, confidence=None):
         # Print exactly one line: the final decision from the analyst
         #print(final_output)
 
         # NEW: save last output so callers can inspect or return it
         self.last_output = final_output
+        self.last_confidence = confidence
 
         if final_output == "MAINTENANCE DUE":
-            self.last_service_km = self.total_km
+            self.state.mark_serviced(vehicle_id)
+
+        return final_output
+
+    def _ask_llm(self, facts):
+        _count("llm_calls")
+        try:
+            resp = ollama.chat(
+                model=self.MODEL,
+                messages=[{"role": "user", "content": self._prompt(*facts)}]
+            )
+            return self._parse(resp["message"]["content"], facts)
+        except Exception:
+            _count("llm_errors")
+            inc("analyst.llm_fallback")
+            return None
+
+    async def _ask_llm_async(self, facts, gateway):
+        _count("llm_calls")
+        try:
+            resp = await gateway.chat(self.MODEL, [{"role": "user", "content": self._prompt(*facts)}])
+            return self._parse(resp["message"]["content"], facts)
+        except Exception:
+            _count("llm_errors")
+            inc("analyst.llm_fallback")
+            return None
+
+    def analyze_and_report(self, msg):
+        with timer("analyst.analyze_and_report"):
+            vehicle_id, sub, fact_fault = self._update(msg)
+
+            # The LLM is asked without the vehicle lock, so the other subsystem's
+            # analyst (same state store) is not held up; _commit then re-reads the
+            # facts and records the decision as one step
+            asked = llm_output = None
+            if self.mode == "llm":
+                asked = self._facts(vehicle_id, sub, fact_fault)
+                llm_output = self._ask_llm(asked)  # None -> rules decide
+            with self.state.lock(vehicle_id):
+                final_output, facts = self._commit(vehicle_id, sub, fact_fault, asked, llm_output,
+                                                   msg.get("ml_conf"))
+
+            # An audit only counts disagreements, so it does not need the lock
+            if self.mode != "llm" and self._should_audit():
+                llm_output = self._ask_llm(facts)
+                if llm_output is not None:
+                    self._check_audit(llm_output, final_output)
+
+            return final_output
+
+    async def analyze_and_report_async(self, msg, gateway):
+        """analyze_and_report through an LLMGateway (llm_gateway) instead of ollama.chat."""
+        vehicle_id, sub, fact_fault = self._update(msg)
+
+        asked = llm_output = None
+        if self.mode == "llm":
+            asked = self._facts(vehicle_id, sub, fact_fault)
+            llm_output = await self._ask_llm_async(asked, gateway)
+        # Wait for a busy vehicle lock on a worker thread, not on the event loop
+        lock = self.state.lock(vehicle_id)
+        if not lock.acquire(blocking=False):
+            await asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+        try:
+            final_output, facts = self._commit(vehicle_id, sub, fact_fault, asked, llm_output, msg.get("ml_conf"))
+        finally:
+            lock.release()
+
+        if self.mode != "llm" and self._should_audit():
+            llm_output = await self._ask_llm_async(facts, gateway)
+            if llm_output is not None:
+                self._check_audit(llm_output, final_output)
 
-        return final_output
\ No newline at end of file
+        return final_output
@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import analytics_agent
+import diagnostic_agent
+from analytics_agent import DataAnalystAgent
+from diagnostic_agent import DiagnosticAgent
+from llm_gateway import LLMGateway
+from main_runner import BATTERY_FINAL, BATTERY_RAW, ENGINE_FEATS
+from ollama_stub import default_reply, start_stub_server
+from scheduler_agent import book_slot, generate_slots, get_available_slots, random_bookings
+
+# -----------------------------
+# Benchmark harness
+# -----------------------------
+# Synthetic fleets (telemetry.csv schema) and calendars (generate_slots) of
+# configurable size, timed against the diagnostic and scheduling hot paths.
+# The LLM is replaced by an in-process stub (ollama_stub.default_reply) with an
+# optional fixed latency, so results measure our code and not the model server.
+# Every run writes one JSON file under bench_results/; --compare diffs two runs.
+#
+#   python benchmark.py --rows 2000 --days 28
+#   python benchmark.py --compare bench_results/a.json bench_results/b.json
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "bench_results")
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+def synthetic_fleet(n_rows, seed=0):
+    """n_rows vehicles in the telemetry.csv schema, values in plausible ranges."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Name": [f"Customer{i}" for i in range(n_rows)],
+        "Phone Number": rng.integers(919000000000, 919999999999, n_rows),
+        "Engine rpm": rng.integers(400, 2400, n_rows),
+        "Lub oil pressure": rng.uniform(1.5, 6.5, n_rows).round(2),
+        "Fuel pressure": rng.uniform(3.0, 20.0, n_rows).round(2),
+        "Coolant pressure": rng.uniform(1.0, 4.5, n_rows).round(2),
+        "lub oil temp": rng.uniform(70.0, 90.0, n_rows).round(1),
+        "Coolant temp": rng.uniform(65.0, 100.0, n_rows).round(1),
+        "km_driven": rng.integers(5, 400, n_rows),
+        "Voltage (V)": rng.uniform(3.0, 4.2, n_rows).round(2),
+        "Current (A)": rng.uniform(-5.0, 5.0, n_rows).round(2),
+        "Temperature (°C)": rng.uniform(15.0, 55.0, n_rows).round(1),
+        "Motor Speed (RPM)": rng.integers(0, 3000, n_rows),
+        "Estimated SOC (%)": rng.uniform(5.0, 100.0, n_rows).round(1),
+    })
+
+
+def synthetic_calendar(days, seed=0):
+    """A fresh generate_slots calendar (written inside the current work dir)."""
+    random.seed(seed)
+    return generate_slots(days)
+
+
+@contextmanager
+def _workdir():
+    """Run inside a throw-away directory so calendar/log files never touch the repo."""
+    cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix="autosense_bench_")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def stub_llm(latency=0.0):
+    """Replace ollama.chat in both agents with the local stub reply."""
+    def chat(model=None, messages=None, **kwargs):
+        if latency:
+            time.sleep(latency)
+        return {"message": {"role": "assistant", "content": default_reply(model, messages or [])}}
+
+    saved = (diagnostic_agent.ollama.chat, analytics_agent.ollama.chat)
+    diagnostic_agent.ollama.chat = chat
+    analytics_agent.ollama.chat = chat
+    try:
+        yield
+    finally:
+        diagnostic_agent.ollama.chat, analytics_agent.ollama.chat = saved
+
+
+class _NullAnalyst:
+    def analyze_and_report(self, msg):
+        return None
+
+    async def analyze_and_report_async(self, msg, gateway):
+        return None
+
+
+# -----------------------------
+# Models
+# -----------------------------
+def _synthetic_model(features, labels, seed=0):
+    """Small RandomForest stand-in trained on synthetic rows (used when the shipped
+    joblib models cannot score the current feature set)."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(2000, len(features))), columns=features)
+    y = rng.choice(labels, 2000)
+    le = LabelEncoder().fit(y)
+    model = RandomForestClassifier(n_estimators=100, random_state=seed).fit(X, le.transform(y))
+    return model, le
+
+
+def make_agent(subsystem, analyst, fleet, model_source="auto"):
+    """
+    DiagnosticAgent for ENGINE/BATTERY. model_source: "shipped" (the joblib files),
+    "synthetic" (trained stand-in) or "auto" (shipped if it can score the fleet).
+    Returns (agent, model_source_used).
+    """
+    features = ENGINE_FEATS if subsystem == "ENGINE" else BATTERY_FINAL
+    name = "Engine" if subsystem == "ENGINE" else "Battery"
+    agent = DiagnosticAgent(subsystem, f"{name}RF.joblib", f"{name}LE.joblib", features, analyst,
+                            base_dir=BASE_DIR, conservative_on_error=True)
+
+    if model_source in ("auto", "shipped"):
+        try:
+            agent.predict_many(fleet.head(1))
+            return agent, "shipped"
+        except Exception:
+            if model_source == "shipped":
+                return agent, "shipped (failing)"
+
+    agent.model, agent.le = _synthetic_model(features, ["Normal", "Fault", "Warning"])
+    return agent, "synthetic"
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def _summarize(latencies, n_rows, elapsed):
+    lat = np.asarray(latencies, dtype=float) if latencies else None
+    out = {
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_sec": n_rows / elapsed if elapsed else None,
+    }
+    if lat is not None and lat.size:
+        out.update({
+            "lat_mean_ms": float(lat.mean() * 1000),
+            "lat_p50_ms": float(np.percentile(lat, 50) * 1000),
+            "lat_p95_ms": float(np.percentile(lat, 95) * 1000),
+            "lat_p99_ms": float(np.percentile(lat, 99) * 1000),
+        })
+    return out
+
+
+def _per_op(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+    return _summarize(latencies, len(latencies), time.perf_counter() - start)
+
+
+def _once(fn, n_rows):
+    start = time.perf_counter()
+    fn()
+    return _summarize(None, n_rows, time.perf_counter() - start)
+
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+def bench_diagnostics(fleet, model_source="auto", queue_rows=500):
+    results = {}
+    engine_cols = ENGINE_FEATS + ["km_driven"]
+    battery_cols = BATTERY_RAW + ["km_driven"]
+
+    for subsystem, cols in (("ENGINE", engine_cols), ("BATTERY", battery_cols)):
+        frame = fleet[cols]
+        agent, source = make_agent(subsystem, _NullAnalyst(), frame, model_source)
+        key = subsystem.lower()
+        results[f"{key}.model_source"] = source
+
+        # Legacy CSV pop-first-row queue (O(N^2) I/O); capped at queue_rows
+        queue = frame.head(queue_rows)
+        queue.to_csv(f"{key}_queue.csv", index=False)
+        results[f"{key}.run_csv_queue"] = _per_op(lambda _: agent.run(f"{key}_queue.csv"), range(len(queue)))
+
+        records = frame.to_dict(orient="records")
+        results[f"{key}.run_row"] = _per_op(agent.run_row, records)
+        results[f"{key}.run_batch"] = _once(lambda: agent.run_batch(frame), len(frame))
+
+        one_row = [frame.iloc[[i]] for i in range(min(len(frame), queue_rows))]
+        results[f"{key}.predict_proba_single"] = _per_op(agent.predict_many, one_row)
+        results[f"{key}.predict_proba_batch"] = _once(lambda: agent.predict_many(frame), len(frame))
+
+    return results
+
+
+def bench_gateway(fleet, llm_latency=0.0, gateway_rows=500):
+    """
+    run_batch (one blocking LLM call per flagged row) against run_batch_async
+    through an LLMGateway talking to the HTTP ollama stub with the same latency.
+    The model is a stand-in that flags every row, so every row is escalated.
+    """
+    results = {}
+    frame = fleet[ENGINE_FEATS + ["km_driven"]].head(gateway_rows)
+    agent, _ = make_agent("ENGINE", _NullAnalyst(), frame, "synthetic")
+    agent.model, agent.le = _synthetic_model(ENGINE_FEATS, ["Fault"])
+
+    results["gateway.run_batch_sync"] = _once(lambda: agent.run_batch(frame), len(frame))
+
+    server, url = start_stub_server(delay=llm_latency)
+    try:
+        async def run():
+            async with LLMGateway(host=url) as gateway:
+                await agent.run_batch_async(frame, gateway)
+                return dict(gateway.stats)
+
+        stats = {}
+        def once():
+            stats.update(asyncio.run(run()))
+        results["gateway.run_batch_async"] = _once(once, len(frame))
+        results["gateway.requests"] = stats.get("requests", 0)
+        results["gateway.sent"] = stats.get("sent", 0)
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_analyst(fleet):
+    msgs = [{"subsystem": random.choice(["ENGINE", "BATTERY"]),
+             "ai_verdict": random.choice(["FAULT", "SAFE"]),
+             "km_driven": km} for km in fleet["km_driven"].tolist()]
+    results = {}
+    for mode in ("rules", "llm"):
+        analyst = DataAnalystAgent(service_threshold=5000, mode=mode)
+        results[f"analyst.{mode}"] = _per_op(analyst.analyze_and_report, msgs)
+    return results
+
+
+def bench_scheduler(days, bookings):
+    results = {}
+    df = synthetic_calendar(days)
+    n_slots = len(df)
+    results["calendar.slots"] = n_slots
+
+    results["scheduler.get_available_slots"] = _per_op(lambda _: get_available_slots(df), range(200))
+    results["scheduler.random_bookings"] = _once(lambda: random_bookings(df, 0.3), int(n_slots * 0.3))
+
+    slot_ids = df["SlotID"].tolist()
+    targets = [random.choice(slot_ids) for _ in range(bookings)]
+    results["scheduler.book_slot"] = _per_op(
+        lambda sid: book_slot(df, sid, "BENCH", "Car", "Brake Check", "Low"), targets)
+    return results
+
+
+def run_all(rows=1000, days=7, bookings=500, seed=0, model_source="auto", llm_latency=0.0, queue_rows=500):
+    random.seed(seed)
+    fleet = synthetic_fleet(rows, seed)
+    results = {}
+    with _workdir(), stub_llm(llm_latency):
+        results.update(bench_diagnostics(fleet, model_source, queue_rows))
+        results.update(bench_gateway(fleet, llm_latency, queue_rows))
+        results.update(bench_analyst(fleet))
+        results.update(bench_scheduler(days, bookings))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def write_results(results, params, out_dir=RESULTS_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    doc = {
+        "timestamp": stamp,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    path = os.path.join(out_dir, f"bench-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2, default=str)
+    return path
+
+
+def compare(old_path, new_path):
+    """Print rows/sec and p95 latency of two result files side by side."""
+    with open(old_path) as f:
+        old = json.load(f)["results"]
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    print(f"{'benchmark':42} {'old rows/s':>12} {'new rows/s':>12} {'speedup':>8} {'old p95ms':>10} {'new p95ms':>10}")
+    for name in sorted(set(old) & set(new)):
+        a, b = old[name], new[name]
+        if not isinstance(a, dict) or not isinstance(b, dict):
+            continue
+        ra, rb = a.get("rows_per_sec"), b.get("rows_per_sec")
+        speedup = f"{rb / ra:.2f}x" if ra and rb else "-"
+        pa, pb = a.get("lat_p95_ms"), b.get("lat_p95_ms")
+        print(f"{name:42} {ra or 0:12.1f} {rb or 0:12.1f} {speedup:>8} "
+              f"{'-' if pa is None else f'{pa:.3f}':>10} {'-' if pb is None else f'{pb:.3f}':>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AutoSense hot-path benchmarks")
+    parser.add_argument("--rows", type=int, default=1000, help="synthetic fleet size")
+    parser.add_argument("--days", type=int, default=7, help="calendar horizon in days")
+    parser.add_argument("--bookings", type=int, default=500, help="book_slot calls")
+    parser.add_argument("--queue-rows", type=int, default=500, help="rows pushed through the CSV queue path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", choices=["auto", "shipped", "synthetic"], default="auto")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds added per stubbed LLM call")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    params = {"rows": args.rows, "days": args.days, "bookings": args.bookings, "queue_rows": args.queue_rows,
+              "seed": args.seed, "models": args.models, "llm_latency": args.llm_latency}
+    results = run_all(args.rows, args.days, args.bookings, args.seed, args.models, args.llm_latency,
+                      args.queue_rows)
+    path = write_results(results, params, args.out)
+
+    for name, r in results.items():
+        if isinstance(r, dict):
+            p95 = f"{r['lat_p95_ms']:.3f} ms" if "lat_p95_ms" in r else "-"
+            print(f"{name:42} {r['rows_per_sec'] or 0:12.1f} rows/s   p95 {p95}")
+        else:
+            print(f"{name:42} {r}")
+    print(f"\nResults written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+# -----------------------------
+# Append-only booking log
+# -----------------------------
+# The calendar CSV is a snapshot; bookings made after it are appended to a JSON
+# lines log next to it, one line per transaction:
+#   {"txn": 7, "events": [{"SlotID": 12, "VehicleID": "CA1234", ...}, ...]}
+# A transaction (e.g. all consecutive slots of one service) is a single line
+# written with one write() + fsync, so on restart it is replayed entirely or -
+# if the process died mid-write and the line is torn - not at all.
+# Every compact_every events the snapshot is rewritten and the log truncated.
+# transaction() runs a booking, its log append and any compaction under the
+# log's lock, so a snapshot never captures half of a concurrent booking.
+# A writer(df) callable replaces the single CSV snapshot (rolling_calendar
+# writes one partition file per day).
+
+
+class BookingLog:
+    def __init__(self, snapshot_path, log_path=None, compact_every=500, fsync=True, writer=None):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or os.path.splitext(snapshot_path)[0] + ".log"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.writer = writer
+        self.pending_events = 0
+        self._txn = 0
+        self._lock = threading.RLock()
+
+    def append(self, events):
+        """Durably append one transaction (a list of booking event dicts)."""
+        if not events:
+            return
+        with self._lock:
+            self._txn += 1
+            line = json.dumps({"txn": self._txn, "events": events}, default=str) + "\n"
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self.pending_events += len(events)
+
+    def replay(self):
+        """Yield the event list of every complete transaction in the log, in order."""
+        self.pending_events = 0
+        if not os.path.exists(self.log_path):
+            return
+        good_end = 0
+        torn = False
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    txn = json.loads(line)
+                except ValueError:
+                    torn = True  # torn final write: transaction never committed
+                    break
+                good_end += len(line)
+                self._txn = max(self._txn, txn.get("txn", 0))
+                self.pending_events += len(txn["events"])
+                yield txn["events"]
+
+        if torn:
+            # Drop the partial line so later appends start on a clean line
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_end)
+
+    def write_snapshot(self, df):
+        """Atomically replace the snapshot with df and start an empty log."""
+        with self._lock:
+            if self.writer is not None:
+                self.writer(df)
+            else:
+                tmp = self.snapshot_path + ".tmp"
+                df.to_csv(tmp, index=False)
+                os.replace(tmp, self.snapshot_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.pending_events = 0
+
+    def maybe_compact(self, df, columns=None):
+        """
+        Fold the log into a new snapshot of df (only `columns`, if given) once
+        compact_every events have piled up. df is only copied when compacting.
+        """
+        with self._lock:
+            if self.pending_events < self.compact_every:
+                return False
+            self.write_snapshot(df if columns is None else df[columns])
+            return True
+
+    @contextmanager
+    def transaction(self, df, columns=None):
+        """
+        Book under the log lock: yields a list to fill with the events applied to
+        df; on exit they are appended as one transaction and df is compacted if due.
+        """
+        with self._lock:
+            events = []
+            yield events
+            self.append(events)
+            self.maybe_compact(df, columns)
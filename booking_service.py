@@ -0,0 +1,290 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from calendar_engine import engine_for
+from scheduler_agent import _apply_booking, _booking, bind_log, generate_slots, log_for, slots_needed
+
+# -----------------------------
+# Concurrent booking service
+# -----------------------------
+# Several workers/threads can reserve slots on one calendar at the same time.
+#   * every slot carries a version number, bumped on each reservation/hold change,
+#     so callers can do compare-and-swap reservations (expected_version)
+#   * one lock per day partition guards capacity checks and the engine bitmaps;
+#     multi-slot requests take their day locks in order, so they cannot deadlock
+#   * DataFrame + booking-log writes go through one short commit lock
+#   * hold() keeps capacity aside while a slot is offered on a phone call;
+#     confirm() turns the hold into a booking, release()/expiry give it back.
+#     Holds are counted in the CalendarEngine (engine.held), so scheduler_agent's
+#     book_slot / book_service / find_capacity_run see them as taken too.
+
+
+class BookingService:
+    def __init__(self, df, log=None, hold_ttl=300.0):
+        self.df = df
+        self.engine = engine_for(df)
+        if log is not None:
+            bind_log(df, log)  # scheduler_agent bookings on df go to the same log
+        self.log = log_for(df)
+        self.hold_ttl = hold_ttl
+
+        n = len(self.engine.slot_ids)
+        self.versions = np.zeros(n, dtype=np.int64)
+
+        self._day_locks = [threading.Lock() for _ in self.engine.day_start]
+        self._commit_lock = threading.Lock()
+        self._holds = {}  # hold_id -> (rows, fields, expires_at)
+        self._holds_lock = threading.Lock()
+        self._hold_ids = itertools.count(1)
+
+        self.stats = {"reserved": 0, "conflicts": 0, "full": 0, "held": 0, "confirmed": 0, "expired": 0}
+        self._stats_lock = threading.Lock()
+
+    # ---- helpers ----
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def snapshot_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _rows(self, slot_ids):
+        rows = [self.engine.lookup(sid) for sid in slot_ids]
+        return None if None in rows else rows
+
+    def _locks_for(self, rows):
+        days = sorted({int(self.engine.day_of_row[r]) for r in rows})
+        return [self._day_locks[d] for d in days]
+
+    def _has_room(self, row):
+        return not self.engine.is_full(row)
+
+    def _commit(self, rows, fields, held=False):
+        """
+        Book rows; False if one filled up meanwhile (e.g. through scheduler_agent).
+        With held=True the rows' hold is turned into the booking in the same step.
+        """
+        # caller holds the day locks for rows
+        with self._commit_lock, _booking(self.df, self.log) as (events, undo):
+            if held:
+                self.engine.release(rows)
+            elif not all(self._has_room(r) for r in rows):
+                return False
+            events.extend(_apply_booking(self.df, self.engine, row, *fields, undo) for row in rows)
+        for row in rows:
+            self.versions[row] += 1
+        return True
+
+    def version(self, slot_id):
+        row = self.engine.lookup(slot_id)
+        return None if row is None else int(self.versions[row])
+
+    # ---- compare-and-swap reservation ----
+    def reserve(self, slot_ids, vehicle_id, vehicle_type, service_type, risk_level, expected_versions=None):
+        """
+        Atomically book every slot in slot_ids (one id or a list).
+        If expected_versions is given the booking only happens when each slot's
+        version still matches (compare-and-swap).
+        Returns (True, new_versions) or (False, reason).
+        """
+        if not isinstance(slot_ids, (list, tuple)):
+            slot_ids = [slot_ids]
+            if expected_versions is not None and not isinstance(expected_versions, (list, tuple)):
+                expected_versions = [expected_versions]
+        rows = self._rows(slot_ids)
+        if rows is None:
+            return False, "unknown slot"
+
+        locks = self._locks_for(rows)
+        for lock in locks:
+            lock.acquire()
+        try:
+            if expected_versions is not None and \
+                    any(self.versions[r] != v for r, v in zip(rows, expected_versions)):
+                self._count("conflicts")
+                return False, "version conflict"
+            if not all(self._has_room(r) for r in rows):
+                self._count("full")
+                return False, "slot full"
+
+            if not self._commit(rows, (vehicle_id, vehicle_type, service_type, risk_level)):
+                self._count("full")
+                return False, "slot full"
+            self._count("reserved")
+            return True, [int(self.versions[r]) for r in rows]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def reserve_service(self, vehicle_id, vehicle_type, service_type, risk_level, start_slot_id=None,
+                        max_attempts=8):
+        """
+        Reserve the earliest run of consecutive slots long enough for the service
+        (see scheduler_agent.book_service), counting held capacity as taken.
+        The search is lock-free; if another thread wins a slot in between, the
+        search is repeated. Returns (True, slot_ids) or (False, reason).
+        """
+        start_row = 0
+        if start_slot_id is not None:
+            start_row = self.engine.lookup(start_slot_id)
+            if start_row is None:
+                return False, "unknown slot"
+        k = slots_needed(vehicle_type, service_type)
+
+        for _ in range(max_attempts):
+            row = self.engine.find_capacity_run(k, start_row)
+            if row is None:
+                self._count("full")
+                return False, "no consecutive slots"
+            slot_ids = [self.engine.slot_ids[r] for r in range(row, row + k)]
+            ok, _ = self.reserve(slot_ids, vehicle_id, vehicle_type, service_type, risk_level)
+            if ok:
+                return True, slot_ids
+        return False, "contention"
+
+    # ---- hold / confirm / expire ----
+    def hold(self, slot_ids, vehicle_id, vehicle_type, service_type, risk_level, ttl=None):
+        """Set capacity aside on slot_ids; returns a hold_id, or None if any slot is full."""
+        self.expire_holds()
+        if not isinstance(slot_ids, (list, tuple)):
+            slot_ids = [slot_ids]
+        rows = self._rows(slot_ids)
+        if rows is None:
+            return None
+
+        locks = self._locks_for(rows)
+        for lock in locks:
+            lock.acquire()
+        try:
+            if not self.engine.hold(rows):
+                self._count("full")
+                return None
+            for r in rows:
+                self.versions[r] += 1
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        hold_id = next(self._hold_ids)
+        expires_at = time.monotonic() + (self.hold_ttl if ttl is None else ttl)
+        with self._holds_lock:
+            self._holds[hold_id] = (rows, (vehicle_id, vehicle_type, service_type, risk_level), expires_at)
+        self._count("held")
+        return hold_id
+
+    def _take_hold(self, hold_id):
+        with self._holds_lock:
+            return self._holds.pop(hold_id, None)
+
+    def _drop_hold(self, rows):
+        locks = self._locks_for(rows)
+        for lock in locks:
+            lock.acquire()
+        try:
+            self.engine.release(rows)
+            for r in rows:
+                self.versions[r] += 1
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def confirm(self, hold_id):
+        """Turn a live hold into a booking. Returns True, or False if it expired/was released."""
+        hold = self._take_hold(hold_id)
+        if hold is None:
+            return False
+        rows, fields, expires_at = hold
+        if time.monotonic() > expires_at:
+            self._drop_hold(rows)
+            self._count("expired")
+            return False
+
+        locks = self._locks_for(rows)
+        for lock in locks:
+            lock.acquire()
+        try:
+            self._commit(rows, fields, held=True)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        self._count("confirmed")
+        return True
+
+    def release(self, hold_id):
+        hold = self._take_hold(hold_id)
+        if hold is None:
+            return False
+        self._drop_hold(hold[0])
+        return True
+
+    def expire_holds(self, now=None):
+        """Release every hold past its deadline; returns how many were expired."""
+        now = time.monotonic() if now is None else now
+        with self._holds_lock:
+            expired = [hid for hid, (_, _, exp) in self._holds.items() if exp < now]
+            taken = [self._holds.pop(hid) for hid in expired]
+        for rows, _, _ in taken:
+            self._drop_hold(rows)
+        self._count("expired", len(taken))
+        return len(taken)
+
+
+# -----------------------------
+# Contention benchmark
+# -----------------------------
+def benchmark_contention(threads=8, attempts_per_thread=500, days=7, capacity=None):
+    """
+    Hammer one calendar from `threads` threads with CAS reservations on random slots.
+    Runs against a throw-away calendar/log in a temp dir. Returns a stats dict.
+    """
+    workdir = tempfile.mkdtemp(prefix="autosense_bench_")
+    try:
+        # Explicit paths: the process working directory is left alone
+        df = generate_slots(days, path=os.path.join(workdir, "calendar.csv"))
+        if capacity is not None:
+            df["Capacity"] = capacity
+        log_for(df).fsync = False
+        service = BookingService(df)
+        slot_ids = list(service.engine.slot_ids)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(attempts_per_thread):
+                sid = rng.choice(slot_ids)
+                v = service.version(sid)
+                service.reserve(sid, f"V{seed}", "Car", "Brake Check", "Low", expected_versions=v)
+
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        result = service.snapshot_stats()
+        result.update({
+            "threads": threads,
+            "attempts": threads * attempts_per_thread,
+            "seconds": elapsed,
+            "attempts_per_sec": threads * attempts_per_thread / elapsed if elapsed else 0.0,
+            "overbooked_slots": int((service.engine.used > service.engine.capacity).sum()),
+            "used": int(service.engine.used.sum()),
+            "capacity": int(service.engine.capacity.sum()),
+        })
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for n in (1, 2, 4, 8):
+        r = benchmark_contention(threads=n)
+        print(f"threads={n}: {r['attempts_per_sec']:.0f} attempts/s, reserved={r['reserved']}, "
+              f"conflicts={r['conflicts']}, full={r['full']}, overbooked={r['overbooked_slots']}")
@@ -0,0 +1,231 @@
+import random
+import threading
+import weakref
+import numpy as np
+
+# -----------------------------
+# Indexed service calendar engine
+# -----------------------------
+# Mirrors a calendar DataFrame (EXPECTED_COLUMNS) in array form:
+#   * SlotID -> row index dict for O(1) lookup
+#   * Capacity / Used / Held as int arrays (Held: capacity set aside by
+#     BookingService holds, counted as taken by every search below)
+#   * one free-slot bitmap (Python int) per day partition (a run of rows with the
+#     same Date, or the same Day for calendars without dates), bit j set when the
+#     j-th slot of that day is FREE and still has capacity
+#   * a second bitmap per day with bit j set while the j-th slot has spare
+#     Capacity, whatever its Status (several bays per slot)
+# engine.lock guards a capacity check together with the update it allows:
+# bookings hold it for their whole transaction (scheduler_agent._booking),
+# hold() / release() take it themselves.
+# Runs of k consecutive free slots are found with k shift-and-AND steps on the
+# day bitmaps instead of probing rows one by one.
+
+
+def _lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+def _run_starts(mask, k):
+    """Bits where a run of k consecutive set bits starts."""
+    starts = mask
+    for j in range(1, k):
+        starts &= mask >> j
+        if not starts:
+            break
+    return starts
+
+
+class CalendarEngine:
+    def __init__(self, slot_ids, days, times, capacity, used, free, dates=None):
+        self.slot_ids = list(slot_ids)
+        self.labels = [f"{d} {t}" for d, t in zip(days, times)]
+        self.capacity = np.asarray(capacity, dtype=np.int64).copy()
+        self.used = np.asarray(used, dtype=np.int64).copy()
+        self.free = np.asarray(free, dtype=bool).copy()
+        self.held = np.zeros(len(self.used), dtype=np.int64)
+        self.lock = threading.RLock()
+        self.index = {sid: i for i, sid in enumerate(self.slot_ids)}
+
+        # Day partitions: maximal runs of consecutive rows with the same date
+        # (weekday names repeat after a week, so Date is used when present)
+        self.day_start = []
+        self.day_of_row = np.empty(len(self.slot_ids), dtype=np.int64)
+        prev = object()
+        for i, d in enumerate(dates if dates is not None else days):
+            if d != prev:
+                self.day_start.append(i)
+                prev = d
+            self.day_of_row[i] = len(self.day_start) - 1
+        self.day_end = self.day_start[1:] + [len(self.slot_ids)]
+
+        self.bitmaps = [0] * len(self.day_start)
+        for i in np.flatnonzero(self.free & (self.used < self.capacity)):
+            day = self.day_of_row[i]
+            self.bitmaps[day] |= 1 << int(i - self.day_start[day])
+        self.room = [0] * len(self.day_start)
+        for i in np.flatnonzero(self.used < self.capacity):
+            day = self.day_of_row[i]
+            self.room[day] |= 1 << int(i - self.day_start[day])
+
+        self._frame = None
+
+    @classmethod
+    def from_frame(cls, df):
+        dates = None
+        if "Date" in df.columns and (df["Date"] != "").all():
+            dates = df["Date"].tolist()
+        engine = cls(
+            df["SlotID"].tolist(),
+            df["Day"].tolist(),
+            df["Time"].tolist(),
+            df["Capacity"].to_numpy(),
+            df["Used"].to_numpy(),
+            (df["Status"] == "FREE").to_numpy(),
+            dates,
+        )
+        engine._frame = weakref.ref(df)
+        return engine
+
+    def bound_to(self, df):
+        return self._frame is not None and self._frame() is df and len(df) == len(self.slot_ids)
+
+    # ---- lookups ----
+    def lookup(self, slot_id):
+        """Row index of slot_id, or None if unknown."""
+        try:
+            return self.index.get(slot_id)
+        except TypeError:  # unhashable input
+            return None
+
+    def is_full(self, row):
+        return self.used[row] + self.held[row] >= self.capacity[row]
+
+    def available_rows(self):
+        """Rows that are FREE with spare capacity, in calendar order."""
+        rows = []
+        for day, mask in enumerate(self.bitmaps):
+            base = self.day_start[day]
+            while mask:
+                low = mask & -mask
+                rows.append(base + low.bit_length() - 1)
+                mask ^= low
+        return rows
+
+    def available_labels(self):
+        return [self.labels[i] for i in self.available_rows()]
+
+    def _first_run(self, k, start_row, mask_of):
+        """First row r >= start_row starting k set bits of mask_of(day), scanning days in order."""
+        if k < 1 or start_row >= len(self.slot_ids):
+            return None
+        first_day = int(self.day_of_row[start_row])
+        for day in range(first_day, len(self.day_start)):
+            starts = _run_starts(mask_of(day), k)
+            if day == first_day:
+                starts &= ~((1 << (start_row - self.day_start[day])) - 1)
+            if starts:
+                return self.day_start[day] + _lowest_bit(starts)
+        return None
+
+    def find_consecutive(self, k, start_row=0):
+        """First row r >= start_row such that rows r..r+k-1 are free on the same day."""
+        return self._first_run(k, start_row, self.bitmaps.__getitem__)
+
+    def random_consecutive(self, k, rng=random):
+        """Uniformly random start row among all runs of k free slots, or None."""
+        starts = [_run_starts(mask, k) for mask in self.bitmaps]
+        total = sum(bin(s).count("1") for s in starts)
+        if total == 0:
+            return None
+        pick = rng.randrange(total)
+        for day, s in enumerate(starts):
+            n = bin(s).count("1")
+            if pick >= n:
+                pick -= n
+                continue
+            for _ in range(pick):
+                s &= s - 1
+            return self.day_start[day] + _lowest_bit(s)
+        return None
+
+    def find_capacity_run(self, k, start_row=0, reserved=None):
+        """
+        First row r >= start_row such that rows r..r+k-1 all have spare capacity
+        (Capacity - Used - Held, minus reserved if given) and lie on the same day.
+        Scans the day bitmaps from start_row's day and stops at the first fit, so
+        the cost is O(k) per day looked at, not a pass over the whole calendar.
+        With reserved, each scanned day's mask is rebuilt from its own rows.
+        """
+        if reserved is None:
+            return self._first_run(k, start_row, self.room.__getitem__)
+
+        def mask_of(day):
+            lo, hi = self.day_start[day], self.day_end[day]
+            spare = self.capacity[lo:hi] - self.used[lo:hi] - self.held[lo:hi] - reserved[lo:hi]
+            return sum(1 << int(j) for j in np.flatnonzero(spare > 0))
+
+        return self._first_run(k, start_row, mask_of)
+
+    def capacity_run_at(self, row, k):
+        """True if rows row..row+k-1 all have spare capacity and lie on the same day."""
+        if k < 1 or not 0 <= row < len(self.slot_ids):
+            return False
+        day = int(self.day_of_row[row])
+        return bool(_run_starts(self.room[day], k) >> (row - self.day_start[day]) & 1)
+
+    # ---- updates ----
+    def _refresh_bits(self, row):
+        """Recompute row's bits in both day bitmaps from the arrays."""
+        day = self.day_of_row[row]
+        bit = 1 << int(row - self.day_start[day])
+        has_room = not self.is_full(row)
+        self.bitmaps[day] = self.bitmaps[day] | bit if self.free[row] and has_room else self.bitmaps[day] & ~bit
+        self.room[day] = self.room[day] | bit if has_room else self.room[day] & ~bit
+
+    def mark_booked(self, row):
+        """Record one booking on row (Status -> BOOKED, Used += 1)."""
+        self.used[row] += 1
+        self.free[row] = False
+        self._refresh_bits(row)
+
+    def hold(self, rows):
+        """Set one unit of capacity aside on every row, or on none if any is full. Returns True/False."""
+        with self.lock:
+            if any(self.is_full(r) for r in rows):
+                return False
+            for r in rows:
+                self.held[r] += 1
+                self._refresh_bits(r)
+            return True
+
+    def release(self, rows):
+        """Give back capacity set aside by hold()."""
+        with self.lock:
+            for r in rows:
+                self.held[r] -= 1
+                self._refresh_bits(r)
+
+    def row_state(self, row):
+        """(Used, FREE) of row, to hand back to restore_row."""
+        return int(self.used[row]), bool(self.free[row])
+
+    def restore_row(self, row, state):
+        """Undo bookings on row back to a row_state() value."""
+        self.used[row], self.free[row] = state
+        self._refresh_bits(row)
+
+
+_ENGINES = {}
+
+
+def engine_for(df):
+    """The CalendarEngine mirroring df, built on first use and kept while df lives."""
+    engine = _ENGINES.get(id(df))
+    if engine is not None and engine.bound_to(df):
+        return engine
+    engine = CalendarEngine.from_frame(df)
+    key = id(df)
+    _ENGINES[key] = engine
+    weakref.finalize(df, _ENGINES.pop, key, None)
+    return engine
@@ -0,0 +1,123 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import WSGIRequestHandler, make_server
+import InteractiveCallServer as ics
+from instrumentation import inc, timer
+
+# -----------------------------
+# Outbound call dispatcher
+# -----------------------------
+# One long-lived webhook server (the InteractiveCallServer Flask app) and at most
+# max_concurrent calls in flight. submit() returns a Future that resolves to the
+# caller's speech text (None if nobody answered within call_timeout); an optional
+# callback is attached to the future.
+#
+#   with CallDispatcher(max_concurrent=8) as dispatcher:
+#       fut = dispatcher.submit(script, slots, "+9194...", callback=on_answer)
+#
+# Pass client=telephony_stub.FakeTelephonyClient() to run without Twilio/ngrok.
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class CallDispatcher:
+    def __init__(self, client=None, caller_id=None, public_url=None, host="127.0.0.1", port=0,
+                 max_concurrent=4, call_timeout=180, use_ngrok=None, verbose=False):
+        self.client = client or ics.client
+        self.caller_id = caller_id or ics.TWILIO_CALLER_ID
+        self.public_url = public_url
+        self.host = host
+        self.port = port
+        self.max_concurrent = max_concurrent
+        self.call_timeout = call_timeout
+        # Real calls need a public URL; tunnel through ngrok unless one is given
+        self.use_ngrok = (client is None and public_url is None) if use_ngrok is None else use_ngrok
+        self.verbose = verbose
+
+        self._server = None
+        self._tunnel = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "answered": 0, "unanswered": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+
+    # ---- lifecycle ----
+    def start(self):
+        with self._lock:
+            if self._server is not None:
+                return self
+            handler = WSGIRequestHandler if self.verbose else _QuietHandler
+            self._server = make_server(self.host, self.port, ics.app, threaded=True, request_handler=handler)
+            self.port = self._server.server_port
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+            if self.public_url is None:
+                if self.use_ngrok:
+                    self._tunnel = ics.ngrok.connect(self.port)
+                    self.public_url = self._tunnel.public_url
+                else:
+                    self.public_url = f"http://{self.host}:{self.port}"
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="call")
+            if self.verbose:
+                print(f"[DISPATCHER] Webhooks at {self.public_url}, {self.max_concurrent} concurrent calls")
+        return self
+
+    def close(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+            if self._server is not None:
+                self._server.shutdown()
+                self._server = None
+            if self._tunnel is not None:
+                ics.ngrok.disconnect(self._tunnel.public_url)
+                self._tunnel = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # ---- calls ----
+    def _call(self, script, slots, to_number):
+        session_id = ics.new_session(script, slots)
+        try:
+            with timer("engagement.call"):
+                call = self.client.calls.create(
+                    to=to_number,
+                    from_=self.caller_id,
+                    url=f"{self.public_url}/start-call?session={session_id}",
+                    method="POST"
+                )
+                ics.SESSIONS.bind_call(session_id, call.sid)
+                if self.verbose:
+                    print(f"[DISPATCHER] Call SID {call.sid} -> {to_number}")
+                response = ics.wait_response(session_id, self.call_timeout)
+        except Exception:
+            self._count("failed")
+            inc("engagement.call_failed")
+            raise
+        finally:
+            ics.close_session(session_id)
+
+        self._count("answered" if response is not None else "unanswered")
+        return response
+
+    def submit(self, script, slots, to_number, callback=None):
+        """Queue one call; returns a Future with the caller's speech text (or None)."""
+        if self._pool is None:
+            self.start()
+        self._count("submitted")
+        future = self._pool.submit(self._call, script, slots, to_number)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
@@ -0,0 +1,327 @@
+import json
+import sys
+import time
+import weakref
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Compiled tree-ensemble inference
+# -----------------------------
+# Flattens a fitted tree ensemble into NumPy node arrays (feature, threshold,
+# left/right child, default direction, leaf values) and scores a batch by walking
+# every (row, tree) pair one level per step with vectorized indexing.
+#
+# Supported models:
+#   * scikit-learn forests (RandomForest/ExtraTrees classifiers): probabilities
+#     are accumulated tree by tree exactly like ForestClassifier.predict_proba,
+#     so they are bit-identical to sklearn.
+#   * XGBoost gbtree classifiers (binary:logistic, multi:softprob/softmax) - what
+#     EngineRF.joblib / BatteryRF.joblib actually contain. Margins are summed in
+#     float32 in tree order; results match XGBoost to float32 rounding (~1e-7).
+#
+#   python compiled_forest.py validate [model.joblib ...] [--rows N]
+
+
+class CompiledForest:
+    def __init__(self, kind, feature, threshold, left, right, default_left, leaf_value,
+                 roots, tree_class, n_classes, n_features, base_margin=None, objective=None,
+                 feature_names=None):
+        self.kind = kind                    # "sklearn" | "xgboost"
+        self.feature = feature              # int32  [n_nodes]
+        self.threshold = threshold          # float64 (sklearn) / float32 (xgboost) [n_nodes]
+        self.left = left                    # int32  [n_nodes], -1 for leaves
+        self.right = right                  # int32  [n_nodes]
+        self.default_left = default_left    # bool   [n_nodes], direction for NaN
+        self.leaf_value = leaf_value        # [n_nodes, n_classes] (sklearn) / [n_nodes] (xgboost)
+        self.roots = roots                  # int32  [n_trees]
+        self.tree_class = tree_class        # int32  [n_trees] output column each tree adds to
+        self.n_classes = n_classes
+        self.n_features = n_features
+        self.base_margin = base_margin
+        self.objective = objective
+        self.feature_names = feature_names
+        self._step = None
+
+    # ---- construction ----
+    @classmethod
+    def from_model(cls, model):
+        if hasattr(model, "get_booster"):
+            return cls._from_xgboost(model)
+        if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+            return cls._from_sklearn(model)
+        raise TypeError(f"Unsupported model type for compilation: {type(model).__name__}")
+
+    @classmethod
+    def _from_sklearn(cls, forest):
+        feats, thrs, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        n_classes = int(forest.n_classes_)
+        for est in forest.estimators_:
+            t = est.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            roots.append(offset)
+            feats.append(np.where(is_leaf, 0, t.feature))
+            thrs.append(t.threshold)
+            lefts.append(np.where(is_leaf, -1, t.children_left + offset))
+            rights.append(np.where(is_leaf, -1, t.children_right + offset))
+            missing_left = getattr(t, "missing_go_to_left", None)
+            defaults.append(np.zeros(n, dtype=bool) if missing_left is None else missing_left.astype(bool))
+
+            # Same per-node normalization as DecisionTreeClassifier.predict_proba
+            proba = t.value[:, 0, :n_classes].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            values.append(proba)
+            offset += n
+
+        names = getattr(forest, "feature_names_in_", None)
+        return cls(
+            "sklearn",
+            np.concatenate(feats).astype(np.int32),
+            np.concatenate(thrs).astype(np.float64),
+            np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32),
+            np.concatenate(defaults),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.int32),
+            np.zeros(len(roots), dtype=np.int32),
+            n_classes,
+            int(forest.n_features_in_),
+            feature_names=None if names is None else list(names),
+        )
+
+    @classmethod
+    def _from_xgboost(cls, model):
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        gb = learner["gradient_booster"]
+        if gb["name"] != "gbtree":
+            raise TypeError(f"Unsupported XGBoost booster: {gb['name']}")
+        trees = gb["model"]["trees"]
+        tree_info = gb["model"]["tree_info"]
+
+        objective = learner["objective"]["name"]
+        params = learner["learner_model_param"]
+        n_classes = max(1, int(params["num_class"]))
+        base_score = np.asarray(json.loads(params["base_score"]), dtype=np.float32).reshape(-1)
+        if objective == "binary:logistic":
+            p = base_score[:1].astype(np.float64)
+            base_margin = np.log(p / (1.0 - p)).astype(np.float32)
+        else:
+            base_margin = np.broadcast_to(base_score, (n_classes,)).astype(np.float32)
+
+        feats, thrs, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for t in trees:
+            if any(t.get("split_type", [])):
+                raise TypeError("Categorical splits are not supported")
+            left = np.asarray(t["left_children"], dtype=np.int64)
+            right = np.asarray(t["right_children"], dtype=np.int64)
+            cond = np.asarray(t["split_conditions"], dtype=np.float32)
+            is_leaf = left == -1
+            roots.append(offset)
+            feats.append(np.where(is_leaf, 0, np.asarray(t["split_indices"])))
+            thrs.append(cond)
+            lefts.append(np.where(is_leaf, -1, left + offset))
+            rights.append(np.where(is_leaf, -1, right + offset))
+            defaults.append(np.asarray(t["default_left"], dtype=bool))
+            values.append(np.where(is_leaf, cond, np.float32(0)).astype(np.float32))
+            offset += len(left)
+
+        names = booster.feature_names
+        return cls(
+            "xgboost",
+            np.concatenate(feats).astype(np.int32),
+            np.concatenate(thrs),
+            np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32),
+            np.concatenate(defaults),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.int32),
+            np.asarray(tree_info, dtype=np.int32),
+            n_classes,
+            int(params["num_feature"]),
+            base_margin=base_margin,
+            objective=objective,
+            feature_names=names,
+        )
+
+    # ---- inference ----
+    def _as_array(self, X):
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None and list(X.columns) != list(self.feature_names):
+                raise ValueError(f"Feature names mismatch: expected {self.feature_names}, got {list(X.columns)}")
+            X = X.to_numpy()
+        X = np.asarray(X, dtype=np.float32)  # both libraries score float32 inputs
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the model expects {self.n_features}")
+        return X
+
+    def _traversal_arrays(self):
+        # Leaves point back to themselves, so every (row, tree) can take exactly
+        # max_depth steps without masking.
+        if self._step is None:
+            nodes = np.arange(len(self.left), dtype=np.int32)
+            leaf = self.left == -1
+            left = np.where(leaf, nodes, self.left)
+            right = np.where(leaf, nodes, self.right)
+            depth = np.zeros(len(nodes), dtype=np.int32)
+            for _ in range(len(nodes)):
+                child_depth = depth + 1
+                new = depth.copy()
+                np.maximum.at(new, left[~leaf], child_depth[~leaf])
+                np.maximum.at(new, right[~leaf], child_depth[~leaf])
+                if np.array_equal(new, depth):
+                    break
+                depth = new
+            self._step = (left, right, int(depth.max()))
+        return self._step
+
+    def apply(self, X):
+        """Leaf node index for every (row, tree): int array [n_rows, n_trees]."""
+        if not (isinstance(X, np.ndarray) and X.dtype == np.float32 and X.ndim == 2
+                and X.shape[1] == self.n_features):
+            X = self._as_array(X)
+        if self.kind == "sklearn":
+            X = X.astype(np.float64)  # sklearn compares float32 X against float64 thresholds
+        left, right, max_depth = self._traversal_arrays()
+        n_rows, n_features = X.shape
+
+        node = np.tile(self.roots, n_rows)
+        base = np.repeat(np.arange(n_rows, dtype=np.int32) * n_features, len(self.roots))
+        flat_X = X.ravel()
+        has_missing = np.isnan(flat_X).any()
+        for _ in range(max_depth):
+            x = np.take(flat_X, base + np.take(self.feature, node))
+            threshold = np.take(self.threshold, node)
+            go_left = x <= threshold if self.kind == "sklearn" else x < threshold
+            if has_missing:
+                go_left = np.where(np.isnan(x), np.take(self.default_left, node), go_left)
+            node = np.where(go_left, np.take(left, node), np.take(right, node))
+        return node.reshape(n_rows, len(self.roots))
+
+    def predict_proba(self, X, block_rows=256):
+        X = self._as_array(X)
+        if X.shape[0] <= block_rows:
+            return self._predict_block(X)
+        return np.concatenate([self._predict_block(X[i:i + block_rows])
+                               for i in range(0, X.shape[0], block_rows)])
+
+    def _predict_block(self, X):
+        leaves = self.apply(X)
+        n_trees = leaves.shape[1]
+
+        if self.kind == "sklearn":
+            # ForestClassifier.predict_proba adds tree probabilities one by one into
+            # zeros; cumsum along the tree axis performs the same sequential adds.
+            proba = np.cumsum(self.leaf_value[leaves], axis=1)[:, -1]
+            proba /= n_trees
+            return proba
+
+        margin = np.empty((X.shape[0], len(self.base_margin)), dtype=np.float32)
+        for k in range(len(self.base_margin)):
+            values = self.leaf_value[leaves[:, self.tree_class == k]]
+            start = np.full((X.shape[0], 1), self.base_margin[k], dtype=np.float32)
+            margin[:, k] = np.cumsum(np.hstack([start, values]), axis=1)[:, -1]
+
+        if self.objective == "binary:logistic":
+            p = (np.float32(1) / (np.float32(1) + np.exp(-margin[:, 0]))).astype(np.float32)
+            return np.column_stack([np.float32(1) - p, p])
+        e = np.exp(margin - margin.max(axis=1, keepdims=True))
+        return (e / e.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right,
+                                      self.default_left, self.leaf_value, self.roots, self.tree_class))
+
+
+_COMPILED = weakref.WeakKeyDictionary()
+
+
+def compile_model(model):
+    """CompiledForest for model, built once per model object."""
+    compiled = _COMPILED.get(model)
+    if compiled is None:
+        compiled = CompiledForest.from_model(model)
+        _COMPILED[model] = compiled
+    return compiled
+
+
+# -----------------------------
+# Validation command
+# -----------------------------
+def _sample_inputs(model, compiled, n_rows, seed=0):
+    """Random rows around the split thresholds the model actually uses."""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, compiled.n_features), dtype=np.float32)
+    internal = compiled.left != -1
+    for f in range(compiled.n_features):
+        thr = compiled.threshold[internal & (compiled.feature == f)]
+        thr = thr[np.isfinite(thr)]
+        if thr.size:
+            X[:, f] = rng.choice(thr, n_rows) + rng.normal(0, np.std(thr) + 1e-3, n_rows)
+        else:
+            X[:, f] = rng.normal(size=n_rows)
+    if compiled.feature_names is not None:
+        return pd.DataFrame(X, columns=compiled.feature_names)
+    return X
+
+
+def validate(model, n_rows=2000, seed=0):
+    compiled = compile_model(model)
+    X = _sample_inputs(model, compiled, n_rows, seed)
+
+    start = time.perf_counter()
+    ref = np.asarray(model.predict_proba(X))
+    t_ref = time.perf_counter() - start
+    start = time.perf_counter()
+    got = compiled.predict_proba(X)
+    t_got = time.perf_counter() - start
+
+    single = X.iloc[[0]] if isinstance(X, pd.DataFrame) else X[:1]
+    start = time.perf_counter()
+    for _ in range(50):
+        model.predict_proba(single)
+    t_ref1 = (time.perf_counter() - start) / 50
+    start = time.perf_counter()
+    for _ in range(50):
+        compiled.predict_proba(single)
+    t_got1 = (time.perf_counter() - start) / 50
+
+    return {
+        "kind": compiled.kind,
+        "rows": n_rows,
+        "bit_identical": bool(np.array_equal(ref, got)),
+        "max_abs_diff": float(np.max(np.abs(ref.astype(np.float64) - got.astype(np.float64)))),
+        "argmax_agreement": float(np.mean(ref.argmax(axis=1) == got.argmax(axis=1))),
+        "batch_ms_reference": t_ref * 1000,
+        "batch_ms_compiled": t_got * 1000,
+        "single_row_ms_reference": t_ref1 * 1000,
+        "single_row_ms_compiled": t_got1 * 1000,
+        "compiled_bytes": compiled.nbytes(),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] != "validate":
+        print("usage: python compiled_forest.py validate [model.joblib ...] [--rows N]")
+        sys.exit(2)
+    args = args[1:]
+    n_rows = 2000
+    if "--rows" in args:
+        i = args.index("--rows")
+        n_rows = int(args[i + 1])
+        del args[i:i + 2]
+    paths = args or ["EngineRF.joblib", "BatteryRF.joblib"]
+
+    from model_registry import load_model
+
+    for path in paths:
+        report = validate(load_model(path), n_rows=n_rows)
+        print(f"{path}:")
+        for k, v in report.items():
+            print(f"  {k:26} {v}")
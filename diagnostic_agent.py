@@ -1,13 +1,58 @@
+import asyncio
 import os
 import pandas as pd
 import numpy as np
-import joblib
 import traceback
 import ollama
+from compiled_forest import compile_model
+from model_registry import load_model
+from instrumentation import inc, timer
+from telemetry_stream import micro_batches
+
+# ML confidence above which a non-"Normal" prediction counts as a failure
+FAILURE_THRESHOLD = 0.60
+
+LLAMA_MODEL = "llama3.2:1b"
+
+# Distance reported for a row that carries no km_driven
+DEFAULT_KM_DRIVEN = 10
+
+# Telemetry fields shown to the LLM for a flagged row
+ESSENTIAL_FIELDS = ['Voltage (V)', 'Temperature (°C)', 'lub oil temp', 'Engine rpm']
+
+
+def add_battery_features(df):
+    """
+    Column-wise battery feature engineering on a whole DataFrame.
+    Returns a copy with Power_Watts, Internal_Res_Proxy and Temp_Stress added.
+    """
+    n = len(df)
+
+    def col(name):
+        if name not in df.columns:
+            return np.zeros(n)
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+
+    v = col("Voltage (V)")
+    c = col("Current (A)")
+    t = col("Temperature (°C)")
+
+    out = df.copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["Power_Watts"] = v * c
+        res = v / (c + 0.1)
+        stress = t / (c + 1.0)
+    # A zero denominator used to abort feature engineering for the row, leaving the
+    # feature at its default 0 — keep that instead of propagating inf.
+    out["Internal_Res_Proxy"] = np.where(np.isinf(res), 0.0, res)
+    out["Temp_Stress"] = np.where(np.isinf(stress), 0.0, stress)
+    return out
+
 
 class DiagnosticAgent:
     """
-    DiagnosticAgent processes one CSV row at a time and sends payloads to the analyst.
+    DiagnosticAgent processes one CSV row at a time (run) or a whole DataFrame at once
+    (run_batch) and sends payloads to the analyst.
     By default it is silent (no prints). Set verbose=True to enable debug prints.
     """
 
@@ -20,7 +65,12 @@ class DiagnosticAgent:
         analyst,
         base_dir=r"./",
         conservative_on_error=False,
-        verbose=False
+        verbose=False,
+        mmap_mode=None,
+        llm_cache=None,
+        compiled=False,
+        llm_batcher=None,
+        envelope=None
     ):
         self.name = subsystem
         self.features = features
@@ -28,24 +78,54 @@ class DiagnosticAgent:
         self.base_dir = base_dir
         self.conservative_on_error = conservative_on_error
         self.verbose = verbose
-
-        # Load models and label encoder
+        # Optional llm_cache.LLMResultCache in front of the ask_llama round trip
+        self.llm_cache = llm_cache
+        # Optional llm_batcher.EscalationBatcher: flagged rows share LLM prompts
+        self.llm_batcher = llm_batcher
+        # Optional envelope_filter.EnvelopeFilter: clearly normal rows skip the model
+        self.envelope = envelope
+
+        self.model_path = os.path.join(self.base_dir, model_path)
+        self.le_path = os.path.join(self.base_dir, le_path)
+        self.mmap_mode = mmap_mode
+        # Score through compiled_forest.CompiledForest instead of model.predict_proba
+        self.compiled = compiled
+        self.compiled_model = None
+
+        # Load models and label encoder (shared through the process-wide registry)
+        self.model = None
+        self.le = None
+        self.refresh_models()
+
+    def refresh_models(self):
+        """
+        (Re)bind model and label encoder from the registry. Cheap when the files are
+        unchanged; picks up a new model when a joblib file has been replaced.
+        """
         try:
-            self.model = joblib.load(os.path.join(self.base_dir, model_path))
+            self.model = load_model(self.model_path, mmap_mode=self.mmap_mode)
             if self.verbose:
-                print(f"[{self.name}] Model loaded: {model_path}")
+                print(f"[{self.name}] Model loaded: {self.model_path}")
         except Exception as e:
             if self.verbose:
-                print(f"[{self.name}][ERROR] Failed to load model {model_path}: {e}")
+                print(f"[{self.name}][ERROR] Failed to load model {self.model_path}: {e}")
             self.model = None
 
+        self.compiled_model = None
+        if self.compiled and self.model is not None:
+            try:
+                self.compiled_model = compile_model(self.model)
+            except Exception as e:
+                if self.verbose:
+                    print(f"[{self.name}][ERROR] Cannot compile {self.model_path}, using predict_proba: {e}")
+
         try:
-            self.le = joblib.load(os.path.join(self.base_dir, le_path))
+            self.le = load_model(self.le_path, mmap_mode=self.mmap_mode)
             if self.verbose:
-                print(f"[{self.name}] LabelEncoder loaded: {le_path}")
+                print(f"[{self.name}] LabelEncoder loaded: {self.le_path}")
         except Exception as e:
             if self.verbose:
-                print(f"[{self.name}][ERROR] Failed to load label encoder {le_path}: {e}")
+                print(f"[{self.name}][ERROR] Failed to load label encoder {self.le_path}: {e}")
             self.le = None
 
     def run(self, csv_path):
@@ -55,7 +135,8 @@ class DiagnosticAgent:
             return True  # nothing to do
 
         try:
-            df = pd.read_csv(csv_path)
+            with timer("diagnostic.csv_read"):
+                df = pd.read_csv(csv_path)
         except Exception as e:
             if self.verbose:
                 print(f"[{self.name}][ERROR] Failed to read CSV {csv_path}: {e}")
@@ -72,26 +153,149 @@ class DiagnosticAgent:
 
         # Write remaining rows back safely
         try:
-            df.iloc[1:].to_csv(csv_path, index=False)
+            with timer("diagnostic.csv_write"):
+                df.iloc[1:].to_csv(csv_path, index=False)
         except Exception as e:
             if self.verbose:
                 print(f"[{self.name}][ERROR] Failed to write CSV back: {e}")
                 traceback.print_exc()
 
-        # Battery feature engineering
+        with timer("diagnostic.run"):
+            return self._process(data)
+
+    def run_row(self, data):
+        """Process one telemetry row handed over directly (no CSV queue)."""
+        data = dict(data)
+        data['_subsystem'] = self.name
+        with timer("diagnostic.run"):
+            return self._process(data)
+
+    def run_stream(self, rows, batch_size=None):
+        """
+        Drain an iterable of row dicts (see telemetry_stream). Rows are scored one by
+        one, or in micro-batches via run_batch when batch_size is given.
+        Returns the number of rows processed.
+        """
+        self.refresh_models()
+        count = 0
+        if batch_size:
+            for batch in micro_batches(rows, batch_size=batch_size):
+                self.run_batch(batch)
+                count += len(batch)
+            return count
+
+        for data in rows:
+            self.run_row(data)
+            count += 1
+        return count
+
+    def _model_input(self, df):
+        """Engineer features (battery) and align columns with what the model expects."""
         if self.name == "BATTERY":
             try:
-                v = float(data.get("Voltage (V)", 0) or 0)
-                c = float(data.get("Current (A)", 0) or 0)
-                t = float(data.get("Temperature (°C)", 0) or 0)
-                data["Power_Watts"] = v * c
-                data["Internal_Res_Proxy"] = v / (c + 0.1)
-                data["Temp_Stress"] = t / (c + 1.0)
+                with timer("diagnostic.features"):
+                    df = add_battery_features(df)
             except Exception as e:
                 if self.verbose:
                     print(f"[{self.name}][WARN] Feature engineering error: {e}")
                     traceback.print_exc()
 
+        missing = [feat for feat in self.features if feat not in df.columns]
+        if missing:
+            if self.verbose:
+                print(f"[{self.name}][WARN] Missing features {missing} in input — adding default 0.")
+            df = df.assign(**{feat: 0 for feat in missing})
+
+        # Select only the columns expected (order matters for some models)
+        return df[self.features]
+
+    def _score(self, df):
+        """(ml_pred, ml_conf, is_failure) arrays from one predict_proba call over df."""
+        input_df = self._model_input(df)
+        scorer = self.compiled_model if self.compiled_model is not None else self.model
+        with timer("diagnostic.predict_proba"):
+            probs = np.asarray(scorer.predict_proba(input_df))
+        idx = probs.argmax(axis=1)
+        ml_pred = self.le.inverse_transform(idx)
+        ml_conf = probs[np.arange(len(idx)), idx].astype(float)
+        is_failure = (ml_pred != "Normal") & (ml_conf > FAILURE_THRESHOLD)
+        return ml_pred, ml_conf, is_failure
+
+    def predict_many(self, df):
+        """
+        Score every row of df with a single predict_proba call. With an envelope,
+        only the rows outside it reach the model (all rows in shadow mode).
+        Returns a DataFrame (same index as df) with ml_pred, ml_conf and is_failure.
+        Raises if the model or label encoder is unavailable or prediction fails.
+        """
+        if self.model is None or self.le is None:
+            raise RuntimeError(f"[{self.name}] Model or label encoder not available.")
+
+        if self.envelope is None:
+            ml_pred, ml_conf, is_failure = self._score(df)
+        else:
+            inside, skip = self.envelope.skip_mask(df)
+            ml_pred = np.full(len(df), self.envelope.normal_label, dtype=object)
+            ml_conf = np.full(len(df), float(self.envelope.normal_conf))
+            is_failure = np.zeros(len(df), dtype=bool)
+            todo = ~skip
+            if todo.any():
+                ml_pred[todo], ml_conf[todo], is_failure[todo] = self._score(df[todo])
+            if self.envelope.shadow:
+                self.envelope.record_shadow(inside, ml_pred, is_failure)
+
+        return pd.DataFrame(
+            {"ml_pred": ml_pred, "ml_conf": ml_conf, "is_failure": is_failure},
+            index=df.index
+        )
+
+    def _payload(self, data, ai_verdict, ml_pred=None, ml_conf=None):
+        # ml_conf: the model's confidence in a fault (1 - P(Normal) for a Normal
+        # prediction), None if the row was not scored
+        if ml_conf is not None and ml_pred == "Normal":
+            ml_conf = 1.0 - ml_conf
+        return {"subsystem": self.name, "ai_verdict": ai_verdict, "km_driven": data.get("km_driven", DEFAULT_KM_DRIVEN),
+                "vehicle_id": data.get("vehicle_id"), "ml_conf": None if ml_conf is None else float(ml_conf)}
+
+    def _conservative_payload(self, data):
+        inc("diagnostic.conservative_on_error")
+        return self._payload(data, "FAULT")
+
+    def _verdict_payload(self, data, is_failure, ml_pred, ml_conf, escalation=None, ai_verdict=None):
+        """
+        Run the LLM check and the conservative override for one scored row.
+        escalation is an optional (cache key, Future) from _escalate_all;
+        ai_verdict an LLM answer already obtained (e.g. by ask_llama_async),
+        or the exception raised while obtaining it.
+        """
+        # Agentic LLaMA check (only if is_failure)
+        try:
+            # pass ml_pred and ml_conf to help LLM align (ask_llama may ignore if silent)
+            with timer("diagnostic.ask_llama"):
+                if isinstance(ai_verdict, Exception):
+                    raise ai_verdict
+                if ai_verdict is None and escalation is not None:
+                    key, future = escalation
+                    ai_verdict = self._cache_store(key, future.result())
+                elif ai_verdict is None:
+                    ai_verdict = self.ask_llama(data, is_failure, ml_pred=ml_pred, ml_conf=ml_conf)
+        except Exception as e:
+            if self.verbose:
+                print(f"[{self.name}][ERROR] ask_llama raised: {e}")
+                traceback.print_exc()
+            ai_verdict = "FAULT" if self.conservative_on_error else "SAFE"
+
+        # CONSERVATIVE OVERRIDE: if ML says failure but LLM did not return FAULT, force FAULT
+        if is_failure and ai_verdict != "FAULT":
+            inc("diagnostic.conservative_override")
+            if self.verbose:
+                print(f"[{self.name}] Overriding ai_verdict '{ai_verdict}' -> 'FAULT' because is_failure=True")
+            ai_verdict = "FAULT"
+
+        return self._payload(data, ai_verdict, ml_pred, ml_conf)
+
+    def _process(self, data):
+        """Score one row dict, report the payload to the analyst. Returns False (still running)."""
         # ML Prediction
         ml_pred = "Error"
         ml_conf = 0.0
@@ -101,38 +305,34 @@ class DiagnosticAgent:
             if self.verbose:
                 print(f"[{self.name}][ERROR] Model or label encoder not available.")
             if self.conservative_on_error:
-                ai_verdict = "FAULT"
-                payload = {"subsystem": self.name, "ai_verdict": ai_verdict, "km_driven": data.get("km_driven", 10)}
-                self.analyst.analyze_and_report(payload)
-                return False
+                self.analyst.analyze_and_report(self._conservative_payload(data))
             return False
 
+        # One envelope check per row, counted here (the same stats predict_many keeps)
+        inside = False
+        if self.envelope is not None:
+            inside = self.envelope.contains(data)
+            skip = inside and not self.envelope.shadow
+            self.envelope.record(1, int(inside), int(skip))
+            # Clearly normal reading: no DataFrame, no model call
+            if skip:
+                self.analyst.analyze_and_report(
+                    self._verdict_payload(data, False, self.envelope.normal_label, self.envelope.normal_conf))
+                return False
+
         try:
-            # Create input dataframe but guard missing columns
             input_df = pd.DataFrame([data])
-
-            # Check each expected feature exists or add default 0
-            for feat in self.features:
-                if feat not in input_df.columns:
-                    if self.verbose:
-                        print(f"[{self.name}][WARN] Missing feature '{feat}' in input — adding default 0.")
-                    input_df[feat] = 0
-
-            # Select only the columns expected (order matters for some models)
-            input_df = input_df[self.features]
-
             if self.verbose:
-                print(f"[{self.name}] Input DF for model:\n{input_df.to_dict(orient='records')[0]}")
-
-            probs = self.model.predict_proba(input_df)[0]
-            idx = int(np.argmax(probs))
-            ml_pred = self.le.inverse_transform([idx])[0]
-            ml_conf = float(probs[idx])
+                print(f"[{self.name}] Input row for model:\n{data}")
+
+            preds, confs, failures = self._score(input_df)
+            if self.envelope is not None and self.envelope.shadow:
+                self.envelope.record_shadow([inside], preds, failures)
+            ml_pred = preds[0]
+            ml_conf = float(confs[0])
+            is_failure = bool(failures[0])
             if self.verbose:
                 print(f"[{self.name}] ML predicted = {ml_pred}, conf = {ml_conf:.4f}")
-
-            is_failure = (ml_pred != "Normal" and ml_conf > 0.60)
-            if self.verbose:
                 print(f"[{self.name}] is_failure = {is_failure}")
 
         except Exception as e:
@@ -140,48 +340,88 @@ class DiagnosticAgent:
                 print(f"[{self.name}][ERROR] Prediction failed: {e}")
                 traceback.print_exc()
             if self.conservative_on_error:
-                ai_verdict = "FAULT"
-                payload = {"subsystem": self.name, "ai_verdict": ai_verdict, "km_driven": data.get("km_driven", 10)}
-                self.analyst.analyze_and_report(payload)
+                self.analyst.analyze_and_report(self._conservative_payload(data))
                 return False
             is_failure = False
 
-        # Agentic LLaMA check (only if is_failure)
-        try:
-            # pass ml_pred and ml_conf to help LLM align (ask_llama may ignore if silent)
-            ai_verdict = self.ask_llama(data, is_failure, ml_pred=ml_pred, ml_conf=ml_conf)
-        except Exception as e:
-            if self.verbose:
-                print(f"[{self.name}][ERROR] ask_llama raised: {e}")
-                traceback.print_exc()
-            ai_verdict = "FAULT" if self.conservative_on_error else "SAFE"
-
-        # CONSERVATIVE OVERRIDE: if ML says failure but LLM did not return FAULT, force FAULT
-        if is_failure and ai_verdict != "FAULT":
-            if self.verbose:
-                print(f"[{self.name}] Overriding ai_verdict '{ai_verdict}' -> 'FAULT' because is_failure=True")
-            ai_verdict = "FAULT"
-
         # Send the payload to analyst (analyst will print)
-        payload = {
-            "subsystem": self.name,
-            "ai_verdict": ai_verdict,
-            "km_driven": data.get("km_driven", 10)
-        }
+        payload = self._verdict_payload(data, is_failure, ml_pred, ml_conf)
         # silent: do not print payload
         self.analyst.analyze_and_report(payload)
 
         return False  # still running
 
-    def ask_llama(self, data, is_failure, ml_pred=None, ml_conf=None):
+    def run_batch(self, df):
         """
-        Strict ask_llama that also logs raw model reply only when verbose=True.
-        Returns "SAFE"/"WARNING"/"FAULT". If LLM errors, returns FAULT if conservative_on_error else FAULT.
+        Vectorized counterpart of run(): score all rows of df with one predict_proba
+        call, then check/override/report each row exactly like run() does.
+        Returns the list of payloads sent to the analyst, in row order.
         """
-        if not is_failure:
-            return "SAFE"
+        if df is None or df.empty:
+            return []
 
-        essential = {k: v for k, v in data.items() if k in ['Voltage (V)', 'Temperature (°C)', 'lub oil temp', 'Engine rpm']}
+        records = df.to_dict(orient="records")
+        for data in records:
+            data['_subsystem'] = self.name
+
+        if self.model is None or self.le is None:
+            if self.verbose:
+                print(f"[{self.name}][ERROR] Model or label encoder not available.")
+            if not self.conservative_on_error:
+                return []
+            payloads = [self._conservative_payload(data) for data in records]
+            for payload in payloads:
+                self.analyst.analyze_and_report(payload)
+            return payloads
+
+        try:
+            preds = self.predict_many(df)
+            scored = zip(preds["ml_pred"], preds["ml_conf"], preds["is_failure"])
+            if self.verbose:
+                print(f"[{self.name}] Scored {len(df)} rows, {int(preds['is_failure'].sum())} flagged")
+        except Exception as e:
+            if self.verbose:
+                print(f"[{self.name}][ERROR] Batch prediction failed: {e}")
+                traceback.print_exc()
+            if self.conservative_on_error:
+                payloads = [self._conservative_payload(data) for data in records]
+                for payload in payloads:
+                    self.analyst.analyze_and_report(payload)
+                return payloads
+            scored = (("Error", 0.0, False) for _ in records)
+
+        scored = list(scored)
+        escalations = self._escalate_all(records, scored)
+        payloads = []
+        for i, (data, (ml_pred, ml_conf, is_failure)) in enumerate(zip(records, scored)):
+            payload = self._verdict_payload(data, bool(is_failure), ml_pred, float(ml_conf), escalations.get(i))
+            self.analyst.analyze_and_report(payload)
+            payloads.append(payload)
+        return payloads
+
+    def _escalate_all(self, records, scored):
+        """
+        With an llm_batcher, queue every flagged, uncached row of a batch up front so
+        they are answered together. Returns {row position: (cache key, Future)}.
+        """
+        if self.llm_batcher is None:
+            return {}
+        escalations = {}
+        for i, (data, (ml_pred, ml_conf, is_failure)) in enumerate(zip(records, scored)):
+            if not is_failure:
+                continue
+            key, cached = self._cache_lookup(data, ml_pred, float(ml_conf))
+            if cached is None:
+                escalations[i] = (key, self.llm_batcher.submit(self, data, ml_pred, float(ml_conf)))
+        return escalations
+
+    @staticmethod
+    def essential_fields(data):
+        return {k: v for k, v in data.items() if k in ESSENTIAL_FIELDS}
+
+    def _llama_messages(self, data, ml_pred=None, ml_conf=None):
+        """Chat messages for the strict FAULT/WARNING check of one flagged row."""
+        essential = self.essential_fields(data)
 
         # Build a strong prompt including ML evidence
         system_msg = {
@@ -200,25 +440,121 @@ class DiagnosticAgent:
             user_content += "Is this dangerous? Output ONLY FAULT or WARNING.\n"
 
         user_msg = {"role": "user", "content": user_content}
+        return [system_msg, user_msg]
+
+    def _parse_llama_reply(self, raw):
+        if self.verbose:
+            print(f"[{self.name}][LLM RAW] {raw!r}")
+
+        first_line = next((ln.strip() for ln in raw.splitlines() if ln.strip()), "").upper()
+        if first_line in ("FAULT", "WARNING"):
+            return first_line
+        if "FAULT" in first_line:
+            return "FAULT"
+        if "WARNING" in first_line:
+            return "WARNING"
+
+        return "FAULT" if self.conservative_on_error else "FAULT"
+
+    def _cache_lookup(self, data, ml_pred, ml_conf):
+        """Returns (key, cached verdict or None); key is None when no cache is set."""
+        if self.llm_cache is None:
+            return None, None
+        key = self.llm_cache.make_key(self.name, LLAMA_MODEL, data, ml_pred, ml_conf)
+        return key, self.llm_cache.get(key)
+
+    def _cache_store(self, key, verdict):
+        if key is not None:
+            self.llm_cache.put(key, verdict)
+        return verdict
+
+    def _chat_llama(self, data, ml_pred=None, ml_conf=None):
+        """One ollama round trip for one flagged row (raises if the call fails)."""
+        resp = ollama.chat(model=LLAMA_MODEL, messages=self._llama_messages(data, ml_pred, ml_conf))
+        return self._parse_llama_reply(resp.get("message", {}).get("content", ""))
+
+    def ask_llama(self, data, is_failure, ml_pred=None, ml_conf=None):
+        """
+        Strict ask_llama that also logs raw model reply only when verbose=True.
+        Returns "SAFE"/"WARNING"/"FAULT". If LLM errors, returns FAULT if conservative_on_error else FAULT.
+        """
+        if not is_failure:
+            return "SAFE"
+
+        key, cached = self._cache_lookup(data, ml_pred, ml_conf)
+        if cached is not None:
+            return cached
 
         try:
-            resp = ollama.chat(model="llama3.2:1b", messages=[system_msg, user_msg])
-            raw = resp.get("message", {}).get("content", "")
+            if self.llm_batcher is not None:
+                return self._cache_store(key, self.llm_batcher.ask(self, data, ml_pred, ml_conf))
+            return self._cache_store(key, self._chat_llama(data, ml_pred, ml_conf))
+
+        except Exception as e:
             if self.verbose:
-                print(f"[{self.name}][LLM RAW] {raw!r}")
+                print(f"[{self.name}][ERROR] ollama.chat failed: {e}")
+                traceback.print_exc()
+            inc("diagnostic.llm_fallback")
+            return "FAULT" if self.conservative_on_error else "FAULT"
 
-            first_line = next((ln.strip() for ln in raw.splitlines() if ln.strip()), "").upper()
-            if first_line in ("FAULT", "WARNING"):
-                return first_line
-            if "FAULT" in first_line:
-                return "FAULT"
-            if "WARNING" in first_line:
-                return "WARNING"
+    async def ask_llama_async(self, gateway, data, is_failure, ml_pred=None, ml_conf=None):
+        """ask_llama through an LLMGateway (llm_gateway), so many rows can be awaited at once."""
+        if not is_failure:
+            return "SAFE"
+
+        key, cached = self._cache_lookup(data, ml_pred, ml_conf)
+        if cached is not None:
+            return cached
+
+        try:
+            resp = await gateway.chat(LLAMA_MODEL, self._llama_messages(data, ml_pred, ml_conf))
+            return self._cache_store(key, self._parse_llama_reply(resp.get("message", {}).get("content", "")))
 
+        except Exception as e:
+            if self.verbose:
+                print(f"[{self.name}][ERROR] gateway chat failed: {e}")
+                traceback.print_exc()
+            inc("diagnostic.llm_fallback")
             return "FAULT" if self.conservative_on_error else "FAULT"
 
+    async def run_batch_async(self, df, gateway):
+        """
+        run_batch with the LLM checks for all flagged rows awaited concurrently
+        through gateway. Payloads are reported to the analyst in row order, via
+        analyze_and_report_async on the same gateway, so the event loop is never
+        blocked on an LLM round trip.
+        """
+        if df is None or df.empty:
+            return []
+
+        records = df.to_dict(orient="records")
+        for data in records:
+            data['_subsystem'] = self.name
+
+        try:
+            preds = self.predict_many(df)
+            scored = list(zip(preds["ml_pred"], preds["ml_conf"].astype(float), preds["is_failure"].astype(bool)))
         except Exception as e:
             if self.verbose:
-                print(f"[{self.name}][ERROR] ollama.chat failed: {e}")
+                print(f"[{self.name}][ERROR] Batch prediction failed: {e}")
                 traceback.print_exc()
-            return "FAULT" if self.conservative_on_error else "FAULT"
\ No newline at end of file
+            if self.conservative_on_error:
+                payloads = [self._conservative_payload(data) for data in records]
+                for payload in payloads:
+                    await self.analyst.analyze_and_report_async(payload, gateway)
+                return payloads
+            if self.model is None or self.le is None:
+                return []
+            scored = [("Error", 0.0, False)] * len(records)
+
+        verdicts = await asyncio.gather(*[
+            self.ask_llama_async(gateway, data, is_failure, ml_pred=ml_pred, ml_conf=ml_conf)
+            for data, (ml_pred, ml_conf, is_failure) in zip(records, scored)
+        ], return_exceptions=True)
+
+        payloads = []
+        for data, (ml_pred, ml_conf, is_failure), ai_verdict in zip(records, scored, verdicts):
+            payload = self._verdict_payload(data, is_failure, ml_pred, ml_conf, ai_verdict=ai_verdict)
+            await self.analyst.analyze_and_report_async(payload, gateway)
+            payloads.append(payload)
+        return payloads
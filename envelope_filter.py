@@ -0,0 +1,169 @@
+import json
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from instrumentation import inc
+
+# -----------------------------
+# Normal-operating-envelope pre-filter
+# -----------------------------
+# Per-feature [low, high] bounds of healthy telemetry. A row whose bounded
+# features all lie inside is clearly normal and is not sent to the forest: it
+# gets ml_pred=normal_label, ml_conf=normal_conf, is_failure=False. Rows with a
+# missing/NaN bounded feature count as outside. The mask over a whole batch is
+# one NumPy comparison.
+#
+# Bounds are learned from training data (EnvelopeFilter.fit: quantiles of the
+# rows labelled normal_label, widened by margin) or declared in a JSON config:
+#   {"normal_label": "Normal", "normal_conf": 1.0,
+#    "bounds": {"Engine rpm": [600, 1800], "Coolant temp": [70, 95]}}
+#
+# shadow=True scores every row with the model anyway and records how often the
+# model agrees that in-envelope rows are not failures - run it that way before
+# trusting new bounds. stats() reports the skip rate and the agreement.
+#
+#   python envelope_filter.py fit telemetry.csv ENGINE engine_envelope.json [--label COL] [--q 0.01]
+#   python envelope_filter.py check telemetry.csv engine_envelope.json
+
+
+class EnvelopeFilter:
+    def __init__(self, bounds, normal_label="Normal", normal_conf=1.0, shadow=False):
+        self.bounds = {f: (float(lo), float(hi)) for f, (lo, hi) in bounds.items()}
+        self.features = list(self.bounds)
+        self.low = np.array([lo for lo, _ in self.bounds.values()], dtype=float)
+        self.high = np.array([hi for _, hi in self.bounds.values()], dtype=float)
+        self.normal_label = normal_label
+        self.normal_conf = normal_conf
+        self.shadow = shadow
+
+        self._stats = {"rows": 0, "inside": 0, "skipped": 0,
+                       "shadow_rows": 0, "shadow_agree": 0, "shadow_agree_label": 0}
+        self._lock = threading.Lock()
+
+    # ---- construction ----
+    @classmethod
+    def fit(cls, X, y=None, features=None, normal_label="Normal", quantiles=(0.01, 0.99), margin=0.0, **kwargs):
+        """
+        Bounds from the rows of X labelled normal_label (all rows if y is None):
+        the given quantiles of each feature, widened by margin * (high - low).
+        """
+        X = pd.DataFrame(X)
+        if y is not None:
+            X = X[np.asarray(y) == normal_label]
+        if X.empty:
+            raise ValueError(f"No {normal_label!r} rows to fit an envelope on")
+        bounds = {}
+        for f in features or list(X.columns):
+            col = pd.to_numeric(X[f], errors="coerce").dropna()
+            lo, hi = col.quantile(quantiles[0]), col.quantile(quantiles[1])
+            pad = margin * (hi - lo)
+            bounds[f] = (lo - pad, hi + pad)
+        return cls(bounds, normal_label=normal_label, **kwargs)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """config is a dict (see module header) or the path of a JSON file with one."""
+        if isinstance(config, str):
+            with open(config, encoding="utf-8") as f:
+                config = json.load(f)
+        options = {k: config[k] for k in ("normal_label", "normal_conf") if k in config}
+        options.update(kwargs)
+        return cls(config["bounds"], **options)
+
+    def to_config(self):
+        return {"normal_label": self.normal_label, "normal_conf": self.normal_conf,
+                "bounds": {f: [lo, hi] for f, (lo, hi) in self.bounds.items()}}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_config(), f, indent=2)
+
+    # ---- evaluation ----
+    def mask(self, df):
+        """Boolean array: True for rows of df inside the envelope."""
+        if not self.features:
+            return np.ones(len(df), dtype=bool)
+        if any(f not in df.columns for f in self.features):
+            return np.zeros(len(df), dtype=bool)
+        X = df[self.features].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        # NaN compares False on both sides, so it lands outside
+        return ((X >= self.low) & (X <= self.high)).all(axis=1)
+
+    def contains(self, row):
+        """Single-row check on a dict, without building a DataFrame."""
+        for f, (lo, hi) in self.bounds.items():
+            try:
+                v = float(row[f])
+            except (KeyError, TypeError, ValueError):
+                return False
+            if not lo <= v <= hi:  # also False for NaN
+                return False
+        return True
+
+    def skip_mask(self, df):
+        """Rows that may skip the model (none in shadow mode); also counts them."""
+        inside = self.mask(df)
+        skip = np.zeros(len(df), dtype=bool) if self.shadow else inside
+        self.record(len(df), int(inside.sum()), int(skip.sum()))
+        return inside, skip
+
+    def record(self, rows, inside, skipped):
+        with self._lock:
+            self._stats["rows"] += rows
+            self._stats["inside"] += inside
+            self._stats["skipped"] += skipped
+        inc("envelope.rows", rows)
+        inc("envelope.skipped", skipped)
+
+    def record_shadow(self, inside, ml_pred, is_failure):
+        """Compare the model's verdicts on in-envelope rows with the envelope's."""
+        inside = np.asarray(inside, dtype=bool)
+        n = int(inside.sum())
+        if not n:
+            return
+        agree = int((~np.asarray(is_failure, dtype=bool)[inside]).sum())
+        agree_label = int((np.asarray(ml_pred)[inside] == self.normal_label).sum())
+        with self._lock:
+            self._stats["shadow_rows"] += n
+            self._stats["shadow_agree"] += agree
+            self._stats["shadow_agree_label"] += agree_label
+        inc("envelope.shadow_disagree", n - agree)
+
+    def stats(self):
+        """Counters plus skip_rate, inside_rate and shadow agreement (None before any data)."""
+        with self._lock:
+            s = dict(self._stats)
+        s["skip_rate"] = s["skipped"] / s["rows"] if s["rows"] else None
+        s["inside_rate"] = s["inside"] / s["rows"] if s["rows"] else None
+        s["shadow_agreement"] = s["shadow_agree"] / s["shadow_rows"] if s["shadow_rows"] else None
+        s["shadow_label_agreement"] = s["shadow_agree_label"] / s["shadow_rows"] if s["shadow_rows"] else None
+        return s
+
+
+if __name__ == "__main__":
+    from telemetry_io import read_table
+
+    args = sys.argv[1:]
+    if len(args) >= 4 and args[0] == "fit":
+        from main_runner import BATTERY_RAW, ENGINE_FEATS
+        path, subsystem, out = args[1], args[2].upper(), args[3]
+        label = args[args.index("--label") + 1] if "--label" in args else None
+        q = float(args[args.index("--q") + 1]) if "--q" in args else 0.01
+        features = ENGINE_FEATS if subsystem == "ENGINE" else BATTERY_RAW
+        df = read_table(path, columns=features + ([label] if label else []))
+        envelope = EnvelopeFilter.fit(df[features], df[label] if label else None, quantiles=(q, 1 - q))
+        envelope.save(out)
+        print(f"Envelope for {subsystem} ({len(df)} rows) written to {out}")
+        for f, (lo, hi) in envelope.bounds.items():
+            print(f"  {f}: [{lo:.4g}, {hi:.4g}]")
+    elif len(args) == 3 and args[0] == "check":
+        envelope = EnvelopeFilter.from_config(args[2])
+        df = read_table(args[1], columns=envelope.features)
+        envelope.skip_mask(df)
+        s = envelope.stats()
+        print(f"{s['inside']}/{s['rows']} rows inside the envelope (skip rate {s['skip_rate']:.1%})")
+    else:
+        print("usage: python envelope_filter.py fit <file> <ENGINE|BATTERY> <out.json> [--label COL] [--q Q]\n"
+              "       python envelope_filter.py check <file> <envelope.json>")
+        sys.exit(2)
@@ -0,0 +1,270 @@
+import io
+import json
+import os
+import sys
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are optional; CSV needs only pandas
+    pq = None
+
+# -----------------------------
+# Streaming service-feedback analytics
+# -----------------------------
+# Incremental replacement for the full-sheet groupbys of
+# Autosense_Feedback_Analysis.ipynb. Feedback exports (CSV or Parquet with the
+# sheet's columns: Timestamp, FaultType, Component, Severity, VehicleID, Rating,
+# ServiceCenterID) are ingested incrementally: for every source file the state
+# remembers how far it has read (byte offset for CSV, row count for Parquet), so
+# a re-run only parses records appended since the last one.
+# Running aggregates are plain dicts of counts / (sum, n) pairs that merge by
+# addition, so partial states from several exports or workers combine with
+# merge(). tables() rebuilds the notebook's report tables from the aggregates
+# in time proportional to the number of groups, not of records.
+#
+#   python feedback_analytics.py update feedback_state.json export.csv [more exports] [--report report.xlsx]
+#   python feedback_analytics.py report feedback_state.json report.xlsx|report_dir
+
+FEEDBACK_COLUMNS = ["Timestamp", "FaultType", "Component", "Severity", "VehicleID", "Rating", "ServiceCenterID"]
+ALERT_COLUMNS = ["VehicleID", "Component", "FaultType", "Timestamp", "ServiceCenterID"]
+_TEXT = {c: str for c in ("FaultType", "Component", "Severity", "VehicleID", "ServiceCenterID")}
+
+# Per-key FaultType counts kept for these report groupings
+_COUNTED = {"month": "Month", "component": "Component", "severity": "Severity", "center": "ServiceCenterID"}
+
+
+def _add_counts(acc, counts):
+    for key, n in counts.items():
+        acc[key] = acc.get(key, 0) + int(n)
+
+
+class FeedbackAggregates:
+    def __init__(self):
+        self.rows = 0
+        self.counts = {name: {} for name in _COUNTED}   # grouping -> key -> FaultType count
+        self.ratings = {}                               # VehicleID -> [rating sum, rating count]
+        self.alerts = []                                # High-severity rows (ALERT_COLUMNS)
+        self.sources = {}                               # path -> bytes/rows already ingested
+
+    # ---- ingestion ----
+    def add_frame(self, df):
+        """Fold a DataFrame of feedback records into the aggregates."""
+        df = df.dropna(how="all")
+        if df.empty:
+            return 0
+        df = df.copy()
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
+        df["Month"] = df["Timestamp"].dt.strftime("%Y-%m")  # NaT -> NaN, dropped by groupby
+        df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
+
+        self.rows += len(df)
+        for name, column in _COUNTED.items():
+            _add_counts(self.counts[name], df.groupby(column)["FaultType"].count())
+        by_vehicle = df.groupby("VehicleID")["Rating"].agg(["sum", "count"])
+        for vehicle, (total, n) in by_vehicle.iterrows():
+            acc = self.ratings.setdefault(vehicle, [0.0, 0])
+            acc[0] += float(total)
+            acc[1] += int(n)
+
+        high = df[df["Severity"] == "High"][ALERT_COLUMNS]
+        for row in high.itertuples(index=False):
+            ts = row.Timestamp
+            self.alerts.append([row.VehicleID, row.Component, row.FaultType,
+                                None if pd.isna(ts) else ts.isoformat(), row.ServiceCenterID])
+        return len(df)
+
+    def add_records(self, records):
+        """Fold an iterable of record dicts (e.g. from a live feed) into the aggregates."""
+        return self.add_frame(pd.DataFrame(list(records), columns=FEEDBACK_COLUMNS))
+
+    def ingest(self, path):
+        """Read the part of a CSV/Parquet export not seen before; returns the new record count."""
+        if path.lower().endswith((".parquet", ".pq")):
+            return self._ingest_parquet(path)
+        return self._ingest_csv(path)
+
+    def _ingest_csv(self, path):
+        key = os.path.abspath(path)
+        offset = self.sources.get(key, 0)
+        with open(path, "rb") as f:
+            header = f.readline()
+            if offset > os.path.getsize(path):
+                raise ValueError(f"{path} is shorter than when it was last ingested; start a new state")
+            f.seek(max(offset, len(header)))
+            data = f.read()
+        # Only complete lines: a record still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        self.sources[key] = max(offset, len(header)) + end
+        if end == 0:
+            return 0
+        df = pd.read_csv(io.BytesIO(header + data[:end]), dtype=_TEXT)
+        return self.add_frame(df)
+
+    def _ingest_parquet(self, path):
+        if pq is None:
+            raise ImportError("Parquet feedback exports need pyarrow (pip install pyarrow)")
+        key = os.path.abspath(path)
+        skip = self.sources.get(key, 0)
+        pf = pq.ParquetFile(path)
+        groups, seen = [], 0
+        for i in range(pf.metadata.num_row_groups):
+            n = pf.metadata.row_group(i).num_rows
+            if seen + n > skip:
+                groups.append(i)
+            else:
+                seen += n  # whole row group already ingested
+        added = 0
+        if groups:
+            df = pf.read_row_groups(groups, columns=FEEDBACK_COLUMNS).to_pandas().iloc[skip - seen:]
+            for column in _TEXT:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+            added = self.add_frame(df)
+        self.sources[key] = pf.metadata.num_rows
+        return added
+
+    # ---- partial states ----
+    def merge(self, other):
+        """Add another partial state into this one; the two must cover disjoint records."""
+        self.rows += other.rows
+        for name in _COUNTED:
+            _add_counts(self.counts[name], other.counts[name])
+        for vehicle, (total, n) in other.ratings.items():
+            acc = self.ratings.setdefault(vehicle, [0.0, 0])
+            acc[0] += total
+            acc[1] += n
+        self.alerts.extend(other.alerts)
+        for path, offset in other.sources.items():
+            self.sources[path] = max(self.sources.get(path, 0), offset)
+        return self
+
+    def to_dict(self):
+        return {"rows": self.rows, "counts": self.counts, "ratings": self.ratings,
+                "alerts": self.alerts, "sources": self.sources}
+
+    @classmethod
+    def from_dict(cls, state):
+        agg = cls()
+        agg.rows = state["rows"]
+        agg.counts = {name: dict(state["counts"].get(name, {})) for name in _COUNTED}
+        agg.ratings = {k: list(v) for k, v in state["ratings"].items()}
+        agg.alerts = [list(a) for a in state["alerts"]]
+        agg.sources = dict(state["sources"])
+        return agg
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """State saved by save(), or an empty one if path does not exist yet."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    # ---- report ----
+    def _count_table(self, name, column, value="FaultCount"):
+        counts = self.counts[name]
+        keys = sorted(counts)
+        return pd.DataFrame({column: keys, value: [counts[k] for k in keys]})
+
+    def tables(self):
+        """The notebook's report tables, by Excel sheet name."""
+        monthly_faults = self._count_table("month", "Month")
+        monthly_faults["Month"] = pd.PeriodIndex(monthly_faults["Month"], freq="M")
+
+        top_parts = self._count_table("component", "Component")
+        top_parts = top_parts.sort_values(by="FaultCount", ascending=False)
+
+        severity_stats = self._count_table("severity", "Severity", value="Count")
+
+        vehicles = sorted(self.ratings)
+        cust_satisfaction = pd.DataFrame({
+            "VehicleID": vehicles,
+            "AvgRating": [self.ratings[v][0] / self.ratings[v][1] if self.ratings[v][1] else float("nan")
+                          for v in vehicles],
+        }).sort_values(by="AvgRating")
+
+        service_center_perf = self._count_table("center", "ServiceCenterID")
+
+        manufacturing_alerts = pd.DataFrame(self.alerts, columns=ALERT_COLUMNS)
+        manufacturing_alerts["Timestamp"] = pd.to_datetime(manufacturing_alerts["Timestamp"])
+
+        high = self.counts["severity"].get("High", 0)
+        summary = pd.DataFrame({
+            "Metric": [
+                "Most Failed Part",
+                "Total Faults Logged",
+                "Highest Severity Count",
+                "Worst Customer Rating Vehicle",
+                "Best Customer Rating Vehicle",
+            ],
+            "Value": [
+                top_parts.iloc[0]["Component"] if len(top_parts) else None,
+                self.rows,
+                high,
+                cust_satisfaction.iloc[0]["VehicleID"] if len(cust_satisfaction) else None,
+                cust_satisfaction.iloc[-1]["VehicleID"] if len(cust_satisfaction) else None,
+            ],
+        })
+
+        return {
+            "Summary": summary,
+            "Monthly_Faults": monthly_faults,
+            "Top_Failing_Parts": top_parts,
+            "Severity_Stats": severity_stats,
+            "Customer_Satisfaction": cust_satisfaction,
+            "ServiceCenter_Performance": service_center_perf,
+            "Manufacturing_Alerts": manufacturing_alerts,
+        }
+
+    def write_excel(self, path):
+        """All report tables in one workbook, one sheet each (as the notebook did)."""
+        with pd.ExcelWriter(path) as writer:
+            for sheet, table in self.tables().items():
+                table.to_excel(writer, sheet_name=sheet, index=False)
+
+    def write_csv(self, directory):
+        """One <sheet>.csv per report table (no Excel engine needed)."""
+        os.makedirs(directory, exist_ok=True)
+        for sheet, table in self.tables().items():
+            table.to_csv(os.path.join(directory, f"{sheet}.csv"), index=False)
+
+    def write_report(self, path):
+        """Excel workbook for *.xlsx paths, otherwise a directory of CSV tables."""
+        if path.lower().endswith(".xlsx"):
+            self.write_excel(path)
+        else:
+            self.write_csv(path)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    report = None
+    if "--report" in args:
+        i = args.index("--report")
+        report = args[i + 1]
+        args = args[:i] + args[i + 2:]
+
+    if len(args) >= 3 and args[0] == "update":
+        state_path = args[1]
+        agg = FeedbackAggregates.load(state_path)
+        for path in args[2:]:
+            print(f"{path}: {agg.ingest(path)} new record(s)")
+        agg.save(state_path)
+        print(f"{agg.rows} record(s) aggregated in {state_path}")
+    elif len(args) == 3 and args[0] == "report":
+        agg = FeedbackAggregates.load(args[1])
+        report = args[2]
+    else:
+        print("usage: python feedback_analytics.py update <state.json> <export.csv|.parquet> ... [--report out.xlsx]\n"
+              "       python feedback_analytics.py report <state.json> <out.xlsx|out_dir>")
+        sys.exit(2)
+
+    if report:
+        agg.write_report(report)
+        print("✅ Final report generated:", report)
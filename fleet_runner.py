@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from main_runner import build_agents, module_1
+from instrumentation import METRICS, trace
+from llm_cache import LLMResultCache
+from vehicle_state import VEHICLE_STATE
+
+# -----------------------------
+# Process-pool fleet runner
+# -----------------------------
+# Telemetry rows are sharded across worker processes. Each worker builds its
+# DiagnosticAgents exactly once, in the pool initializer, and reuses them for every
+# row of every shard it receives. Models come from the model registry; with the
+# fork start method the parent loads them before the pool starts, so workers
+# inherit the registry copy-on-write. (MMAP_MODE only memory-maps numpy-backed
+# models; the shipped XGBoost ones are unaffected, see model_registry.)
+# Each row runs under its trace ID, and every shard ships its metrics delta back
+# to the parent, which merges them into its own instrumentation.METRICS.
+# Per-vehicle maintenance state (vehicle_state.VEHICLE_STATE) is owned by the
+# parent: all rows of one vehicle go to the same shard, the shard carries those
+# vehicles' current state to the worker and the updated state comes back with
+# the results.
+# With llm_cache_path, every process keeps an LLM verdict cache (llm_cache) backed
+# by that SQLite file, so verdicts are reused across workers and runs.
+
+MMAP_MODE = "r"
+
+_WORKER_AGENTS = None
+
+
+def _llm_cache(path):
+    return LLMResultCache(persist_path=path) if path else None
+
+
+def _init_worker(llm_cache_path=None):
+    global _WORKER_AGENTS
+    _, engine_diag, battery_diag = build_agents(mmap_mode=MMAP_MODE, llm_cache=_llm_cache(llm_cache_path))
+    _WORKER_AGENTS = (engine_diag, battery_diag)
+    METRICS.reset()  # a forked worker starts with a copy of the parent's metrics
+
+
+def _diagnose_rows(rows, agents):
+    """Diagnose a list of (trace_id, engine_row, battery_row); one (decision, confidence) per row."""
+    results = []
+    for trace_id, engine_row, battery_row in rows:
+        with trace(trace_id):
+            state = VEHICLE_STATE if _vehicle_of((trace_id, engine_row, battery_row)) else None
+            results.append(module_1([engine_row], [battery_row], agents=agents, state=state,
+                                    with_confidence=True))
+    return results
+
+
+def _diagnose_shard(shard):
+    """
+    Worker entry point. shard is (rows, vehicle states); returns the decisions,
+    this shard's metrics delta and the updated states of its vehicles.
+    """
+    if _WORKER_AGENTS is None:
+        _init_worker()
+    rows, states = shard
+    for record in states:
+        VEHICLE_STATE.put(record)
+    results = _diagnose_rows(rows, _WORKER_AGENTS)
+    delta = METRICS.snapshot()
+    METRICS.reset()
+    vehicles = {v for v in map(_vehicle_of, rows) if v is not None}
+    return results, delta, [VEHICLE_STATE.get(v) for v in vehicles]
+
+
+def _vehicle_of(row):
+    _, engine_row, battery_row = row
+    return (engine_row or {}).get("vehicle_id") or (battery_row or {}).get("vehicle_id")
+
+
+def _shards(rows, chunksize):
+    """
+    Contiguous chunks of about chunksize rows, in input order. A vehicle whose
+    rows would straddle a shard boundary has its later rows pulled forward into
+    the shard that first saw it, so its state stays in one process.
+    """
+    owner = {}
+    shards = []
+    for i, row in enumerate(rows):
+        vehicle = _vehicle_of(row)
+        shard = owner.get(vehicle) if vehicle is not None else None
+        if shard is None:
+            shard = i // chunksize
+            if vehicle is not None:
+                owner[vehicle] = shard
+        while len(shards) <= shard:
+            shards.append([])
+        shards[shard].append((i, row))
+    return [s for s in shards if s]
+
+
+def _shard_job(shard):
+    rows = [row for _, row in shard]
+    vehicles = {v for v in map(_vehicle_of, rows) if v is not None}
+    states = [VEHICLE_STATE.get(v) for v in vehicles if v in VEHICLE_STATE]
+    return rows, states
+
+
+def diagnose_fleet(row_pairs, workers=None, chunksize=None, trace_ids=None, llm_cache_path=None,
+                   with_confidence=False):
+    """
+    Diagnose every vehicle in row_pairs, a list of (engine_row, battery_row) dicts,
+    and return the decisions in input order.
+
+    workers: number of processes (default os.cpu_count()); 1 runs in-process.
+    chunksize: rows per shard (default: roughly four shards per worker).
+    trace_ids: optional per-row trace IDs (see instrumentation); one is generated
+    per row when omitted.
+    llm_cache_path: SQLite file of a persistent LLM verdict cache (none by default).
+    with_confidence: return (decision, ML fault confidence) pairs instead of
+    decisions (confidence None when no model scored the row).
+    """
+    row_pairs = list(row_pairs)
+    if not row_pairs:
+        return []
+    if trace_ids is None:
+        trace_ids = [None] * len(row_pairs)
+    rows = [(t, e, b) for t, (e, b) in zip(trace_ids, row_pairs)]
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(row_pairs))
+    if chunksize is None:
+        chunksize = max(1, -(-len(row_pairs) // (workers * 4)))
+
+    if workers == 1:
+        llm_cache = _llm_cache(llm_cache_path)
+        _, engine_diag, battery_diag = build_agents(mmap_mode=MMAP_MODE, llm_cache=llm_cache)
+        try:
+            results = _diagnose_rows(rows, (engine_diag, battery_diag))
+        finally:
+            if llm_cache is not None:
+                llm_cache.close()
+    else:
+        if multiprocessing.get_start_method() == "fork":
+            build_agents(mmap_mode=MMAP_MODE)  # warm the registry before forking
+
+        shards = _shards(rows, chunksize)
+        results = [None] * len(rows)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(llm_cache_path,)) as pool:
+            jobs = (_shard_job(shard) for shard in shards)
+            for shard, (shard_result, delta, states) in zip(shards, pool.map(_diagnose_shard, jobs)):
+                for (i, _), result in zip(shard, shard_result):
+                    results[i] = result
+                METRICS.merge(delta)
+                for record in states:
+                    VEHICLE_STATE.put(record)
+    return results if with_confidence else [decision for decision, _ in results]
@@ -0,0 +1,236 @@
+import contextvars
+import functools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------
+# Pipeline instrumentation
+# -----------------------------
+# Per-stage latency histograms (p50/p95/p99), counters, and a trace ID that
+# follows a telemetry row through diagnosis, analysis and booking.
+#
+#   with timer("diagnostic.predict_proba"): ...
+#   inc("diagnostic.conservative_override")
+#   with trace(): ...            # new trace ID for one telemetry row
+#
+# Metrics can be written as JSON (export_json) or served in Prometheus text
+# format (start_metrics_server). Worker processes ship snapshot() back to the
+# parent, which merge()s them.
+
+RESERVOIR_SIZE = 2048   # latency samples kept per stage for percentiles
+RECENT_SPANS = 1000     # (trace_id, stage, seconds) kept for end-to-end inspection
+
+_TRACE_ID = contextvars.ContextVar("autosense_trace_id", default=None)
+
+
+def current_trace():
+    return _TRACE_ID.get()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Run the block under trace_id (a new one if None); yields the ID."""
+    trace_id = trace_id or new_trace_id()
+    token = _TRACE_ID.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _TRACE_ID.reset(token)
+
+
+class Histogram:
+    """Count/sum/min/max plus a reservoir sample for percentiles."""
+
+    def __init__(self, size=RESERVOIR_SIZE):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            j = random.randrange(self.count)
+            if j < self.size:
+                self.samples[j] = value
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+    def state(self):
+        return {"count": self.count, "sum": self.total, "min": self.min, "max": self.max,
+                "samples": list(self.samples)}
+
+    def merge_state(self, state):
+        if not state["count"]:
+            return
+        own = self.count
+        self.count += state["count"]
+        self.total += state["sum"]
+        self.min = state["min"] if self.min is None else min(self.min, state["min"])
+        self.max = state["max"] if self.max is None else max(self.max, state["max"])
+        if len(self.samples) + len(state["samples"]) <= self.size:
+            self.samples = self.samples + state["samples"]
+            return
+        # Each side keeps a share of the reservoir proportional to the values it
+        # observed, so a small shard does not weigh as much as a large one
+        keep = min(len(self.samples), round(self.size * own / self.count))
+        take = min(len(state["samples"]), self.size - keep)
+        self.samples = random.sample(self.samples, keep) + random.sample(state["samples"], take)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.spans = deque(maxlen=RECENT_SPANS)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds)
+            self.spans.append((current_trace(), stage, seconds))
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.spans.clear()
+
+    # ---- cross-process ----
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": {k: h.state() for k, h in self.histograms.items()},
+                "counters": dict(self.counters),
+                "spans": list(self.spans),
+            }
+
+    def merge(self, snap):
+        with self._lock:
+            for stage, state in snap["histograms"].items():
+                self.histograms.setdefault(stage, Histogram()).merge_state(state)
+            for name, n in snap["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.spans.extend(tuple(s) for s in snap["spans"])
+
+    # ---- export ----
+    def as_dict(self):
+        with self._lock:
+            return {
+                "stages": {k: h.summary() for k, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "recent_spans": [{"trace_id": t, "stage": s, "seconds": d} for t, s, d in self.spans],
+            }
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            if self.histograms:
+                lines.append("# TYPE autosense_stage_seconds summary")
+            for stage, h in sorted(self.histograms.items()):
+                for q in (50, 95, 99):
+                    value = h.percentile(q)
+                    if value is not None:
+                        lines.append(f'autosense_stage_seconds{{stage="{stage}",quantile="{q / 100}"}} {value:.9f}')
+                lines.append(f'autosense_stage_seconds_sum{{stage="{stage}"}} {h.total:.9f}')
+                lines.append(f'autosense_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            if self.counters:
+                lines.append("# TYPE autosense_events_total counter")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'autosense_events_total{{name="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def inc(name, n=1):
+    METRICS.inc(name, n)
+
+
+def export_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(METRICS.as_dict(), f, indent=2)
+
+
+def start_metrics_server(port=9108, host="127.0.0.1"):
+    """Serve METRICS at http://host:port/metrics (Prometheus text format) in a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = METRICS.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,199 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import ollama
+from diagnostic_agent import LLAMA_MODEL
+from instrumentation import inc, timer
+
+# -----------------------------
+# Micro-batcher for LLM escalations
+# -----------------------------
+# Rows flagged by the ML model (is_failure) used to cost one ollama.chat round
+# trip each, system prompt included. An EscalationBatcher collects them from any
+# number of threads until max_items are waiting or max_wait_ms have passed since
+# the first one, then either
+#   mode="prompt": sends them as one numbered multi-item prompt and splits the
+#                  "<n>: FAULT|WARNING" lines back out per row, or
+#   mode="burst":  sends the usual single-row prompts as one parallel burst.
+# Items the batch reply does not answer (or a failed batch) fall back to the
+# agent's single-row path, DiagnosticAgent._chat_llama.
+#
+#   batcher = EscalationBatcher(max_items=16, max_wait_ms=20)
+#   agent = DiagnosticAgent(..., llm_batcher=batcher)   # ask_llama goes through it
+#   batcher.close()
+
+BATCH_SYSTEM_PROMPT = (
+    "You are a STRICT diagnostic assistant. You get numbered telemetry items. "
+    "Answer EVERY item on its own line, exactly as '<number>: FAULT' or '<number>: WARNING'. "
+    "No explanation, no extra text."
+)
+
+_ANSWER = re.compile(r"^\W*(\d+)\s*[:.)\-]\s*\W*(FAULT|WARNING)\b", re.IGNORECASE)
+_BARE = re.compile(r"^\W*(FAULT|WARNING)\W*$", re.IGNORECASE)
+
+
+def build_batch_messages(items):
+    """Chat messages for one multi-item prompt; items are (agent, data, ml_pred, ml_conf)."""
+    lines = ["Items:"]
+    for n, (agent, data, ml_pred, ml_conf) in enumerate(items, 1):
+        line = f"{n}. {agent.name} Data: {agent.essential_fields(data)}"
+        if ml_pred is not None and ml_conf is not None:
+            line += f"; ML_prediction = {ml_pred}, ML_confidence = {ml_conf:.3f}"
+        lines.append(line)
+    lines.append("For each item: if ML_confidence >= 0.60 and ML_prediction != 'Normal', you MUST output FAULT. "
+                 "Otherwise output WARNING. Items without ML evidence: FAULT if dangerous, else WARNING.")
+    return [{"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n".join(lines)}]
+
+
+def parse_batch_reply(raw, n):
+    """Per-item "FAULT"/"WARNING" from a multi-item reply; None where an item is unanswered."""
+    answers = [None] * n
+    bare = []
+    for line in (raw or "").splitlines():
+        m = _ANSWER.match(line)
+        if m:
+            i = int(m.group(1)) - 1
+            if 0 <= i < n and answers[i] is None:
+                answers[i] = m.group(2).upper()
+            continue
+        m = _BARE.match(line)
+        if m:
+            bare.append(m.group(1).upper())
+    # Unnumbered answers only count if there is exactly one per item
+    if all(a is None for a in answers) and len(bare) == n:
+        return bare
+    return answers
+
+
+class EscalationBatcher:
+    def __init__(self, max_items=16, max_wait_ms=20, mode="prompt", model=LLAMA_MODEL, max_inflight=2,
+                 verbose=False):
+        if mode not in ("prompt", "burst"):
+            raise ValueError(f"mode must be 'prompt' or 'burst', got {mode!r}")
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000.0
+        self.mode = mode
+        self.model = model
+        self.max_inflight = max_inflight
+        self.verbose = verbose
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._senders = None  # batches in flight while the next one is collected
+        self._burst = None    # single-row requests of one burst
+        self._lock = threading.Lock()
+        self.stats = {"items": 0, "batches": 0, "answered_in_batch": 0, "fallbacks": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    # ---- lifecycle ----
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._senders = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="llm-batch")
+                self._burst = ThreadPoolExecutor(max_workers=self.max_items, thread_name_prefix="llm-row")
+                self._thread = threading.Thread(target=self._collect, name="llm-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def close(self):
+        """Send what is still queued, wait for every batch to finish, stop the threads."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+        self._senders.shutdown(wait=True)
+        self._burst.shutdown(wait=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- submit ----
+    def submit(self, agent, data, ml_pred=None, ml_conf=None):
+        """Queue one flagged row of agent; returns a Future with "FAULT" or "WARNING"."""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((agent, data, ml_pred, ml_conf, future))
+        self._count("items")
+        return future
+
+    def ask(self, agent, data, ml_pred=None, ml_conf=None):
+        return self.submit(agent, data, ml_pred, ml_conf).result()
+
+    # ---- batching ----
+    def _collect(self):
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._senders.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        self._count("batches")
+        if self.verbose:
+            print(f"[LLM-BATCHER] Sending {len(batch)} escalation(s) ({self.mode})")
+        # A lone row or a burst goes out as single-row prompts
+        shared = self.mode == "prompt" and len(batch) > 1
+        with timer("llm_batcher.flush"):
+            answers = self._ask_batch(batch) if shared else [None] * len(batch)
+
+        rest = []
+        for item, answer in zip(batch, answers):
+            if answer is None:
+                rest.append(item)
+            else:
+                self._count("answered_in_batch")
+                item[4].set_result(answer)
+        if shared and rest:
+            self._count("fallbacks", len(rest))
+            inc("llm_batcher.fallback", len(rest))
+        for future in [self._burst.submit(self._single, item) for item in rest]:
+            future.result()  # _single resolves the row's own future
+
+    def _ask_batch(self, batch):
+        try:
+            resp = ollama.chat(model=self.model, messages=build_batch_messages([item[:4] for item in batch]))
+            raw = resp.get("message", {}).get("content", "")
+        except Exception as e:
+            self._count("errors")
+            if self.verbose:
+                print(f"[LLM-BATCHER][ERROR] Batch of {len(batch)} failed, asking row by row: {e}")
+            return [None] * len(batch)
+        answers = parse_batch_reply(raw, len(batch))
+        if self.verbose and None in answers:
+            print(f"[LLM-BATCHER] {answers.count(None)}/{len(batch)} item(s) unanswered in {raw!r}")
+        return answers
+
+    def _single(self, item):
+        agent, data, ml_pred, ml_conf, future = item
+        try:
+            future.set_result(agent._chat_llama(data, ml_pred, ml_conf))
+        except Exception as e:
+            future.set_exception(e)
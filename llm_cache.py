@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# -----------------------------
+# LRU + TTL cache for LLM verdicts
+# -----------------------------
+# ask_llama's answer depends only on a few sensor fields plus the ML evidence, so
+# near-identical readings can share one verdict. Keys are built by quantizing
+# those fields to a configurable step; entries expire after ttl seconds and the
+# least recently used entry is evicted once maxsize is reached. An optional
+# SQLite file keeps the cache across runs; several processes may share it (WAL
+# journal, busy timeout), and a write that still fails only loses the persisted
+# copy - the verdict stays in memory and is returned as usual.
+
+# field -> quantization step (values are rounded to the nearest multiple)
+DEFAULT_QUANTIZATION = {
+    "Voltage (V)": 0.1,
+    "Temperature (°C)": 1.0,
+    "lub oil temp": 1.0,
+    "Engine rpm": 50.0,
+    "ml_conf": 0.05,
+}
+
+
+def _quantize(value, step):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return value
+    if value != value:  # NaN
+        return None
+    if not step:
+        return value
+    return round(round(value / step) * step, 6)
+
+
+class LLMResultCache:
+    def __init__(self, maxsize=4096, ttl=24 * 3600, quantize=None, persist_path=None, db_timeout=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.quantize = dict(DEFAULT_QUANTIZATION if quantize is None else quantize)
+
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self._db = None
+        self.db_timeout = db_timeout
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.write_errors = 0
+
+        if persist_path:
+            self._open_store(persist_path)
+
+    # ---- keys ----
+    def make_key(self, subsystem, model, data, ml_pred=None, ml_conf=None):
+        fields = {k: _quantize(data.get(k), step) for k, step in self.quantize.items()
+                  if k != "ml_conf" and k in data}
+        conf = _quantize(ml_conf, self.quantize.get("ml_conf")) if ml_conf is not None else None
+        return json.dumps([subsystem, model, sorted(fields.items()), str(ml_pred), conf])
+
+    # ---- lookups ----
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, stored_at = item
+            if self.ttl is not None and now - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            evicted = self._insert(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in evicted])
+                    self._db.execute("INSERT OR REPLACE INTO llm_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                                     (key, value, now))
+                    self._db.commit()
+                except sqlite3.Error:
+                    # e.g. still locked by another worker after db_timeout
+                    self.write_errors += 1
+                    try:
+                        self._db.rollback()
+                    except sqlite3.Error:
+                        pass
+
+    def _insert(self, key, value, stored_at):
+        """Insert into the in-memory LRU; returns the evicted keys."""
+        self._data[key] = (value, stored_at)
+        self._data.move_to_end(key)
+        evicted = []
+        while len(self._data) > self.maxsize:
+            old_key, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            evicted.append(old_key)
+        return evicted
+
+    # ---- persistence ----
+    def _open_store(self, path):
+        self._db = sqlite3.connect(path, timeout=self.db_timeout, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)")
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - self.ttl,))
+        rows = self._db.execute(
+            "SELECT key, value, stored_at FROM llm_cache ORDER BY stored_at DESC LIMIT ?", (self.maxsize,)
+        ).fetchall()
+        for key, value, stored_at in reversed(rows):  # oldest first, newest most recently used
+            self._data[key] = (value, stored_at)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ---- stats ----
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "write_errors": self.write_errors,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
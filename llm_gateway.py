@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import httpx
+
+# -----------------------------
+# Async LLM gateway for ollama
+# -----------------------------
+# One pooled httpx.AsyncClient talks to the ollama /api/chat endpoint for every
+# agent. A semaphore bounds concurrent requests, each request has its own
+# timeout, and identical requests that are already in flight are coalesced into
+# a single round trip whose result is shared by all awaiting callers.
+
+DEFAULT_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+
+
+class LLMGateway:
+    def __init__(self, host=None, max_concurrency=8, timeout=60.0, coalesce=True):
+        host = host or DEFAULT_HOST
+        if "://" not in host:
+            host = "http://" + host
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self.max_concurrency = max_concurrency
+
+        self._client = None
+        self._semaphore = None
+        self._inflight = {}
+
+        self.stats = {"requests": 0, "sent": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    def _ensure_client(self):
+        # Created lazily so the gateway binds to the event loop that first uses it
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _send(self, model, messages, options, timeout):
+        self._ensure_client()
+        body = {"model": model, "messages": messages, "stream": False}
+        if options:
+            body["options"] = options
+
+        async with self._semaphore:
+            self.stats["sent"] += 1
+            try:
+                resp = await asyncio.wait_for(self._client.post("/api/chat", json=body), timeout)
+                resp.raise_for_status()
+                return resp.json()
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    async def chat(self, model, messages, options=None, timeout=None):
+        """
+        Send one chat request; returns the ollama response dict
+        ({"message": {"role": ..., "content": ...}, ...}).
+        """
+        self.stats["requests"] += 1
+        timeout = self.timeout if timeout is None else timeout
+
+        if not self.coalesce:
+            return await self._send(model, messages, options, timeout)
+
+        key = json.dumps([model, messages, options], sort_keys=True, default=str)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._send(model, messages, options, timeout))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def chat_many(self, model, message_lists, options=None, timeout=None):
+        """Run many chats concurrently; failed requests come back as exceptions."""
+        return await asyncio.gather(
+            *[self.chat(model, messages, options=options, timeout=timeout) for messages in message_lists],
+            return_exceptions=True
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -1,7 +1,13 @@
+import contextvars
 import os
-import time
-from diagnostic_agent import DiagnosticAgent
-from analytics_agent import DataAnalystAgent
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from diagnostic_agent import DEFAULT_KM_DRIVEN, DiagnosticAgent
+from analytics_agent import DataAnalystAgent, merge_decisions
+from telemetry_stream import drain_csv
+from instrumentation import timed
+from vehicle_state import DEFAULT_VEHICLE, VehicleStateStore
 
 ENGINE_CSV = "engine_inference.csv"
 BATTERY_CSV = "battery_inference.csv"
@@ -11,8 +17,16 @@ BATTERY_RAW = ["Voltage (V)", "Current (A)", "Temperature (°C)", "Motor Speed (
 BATTERY_FINAL = BATTERY_RAW + ["Power_Watts", "Internal_Res_Proxy", "Temp_Stress"]
 
 
-def module_1():
-    analyst = DataAnalystAgent(service_threshold=5000)
+def build_agents(analyst=None, mmap_mode=None, compiled=False, llm_batcher=None, envelopes=None, llm_cache=None):
+    """
+    Create the analyst and both diagnostic agents. Models come from the shared
+    model registry, so only the first call in a process deserializes them.
+    envelopes optionally maps "ENGINE"/"BATTERY" to an envelope_filter.EnvelopeFilter.
+    llm_cache is an optional llm_cache.LLMResultCache shared by both agents.
+    """
+    envelopes = envelopes or {}
+    if analyst is None:
+        analyst = DataAnalystAgent(service_threshold=5000)
 
     engine_diag = DiagnosticAgent(
         "ENGINE",
@@ -22,7 +36,12 @@ def module_1():
         analyst,
         base_dir="",
         verbose=False,
-        conservative_on_error=True
+        conservative_on_error=True,
+        mmap_mode=mmap_mode,
+        compiled=compiled,
+        llm_batcher=llm_batcher,
+        llm_cache=llm_cache,
+        envelope=envelopes.get("ENGINE")
     )
 
     battery_diag = DiagnosticAgent(
@@ -33,29 +52,137 @@ def module_1():
         analyst,
         base_dir="",
         verbose=False,
-        conservative_on_error=True
+        conservative_on_error=True,
+        mmap_mode=mmap_mode,
+        compiled=compiled,
+        llm_batcher=llm_batcher,
+        llm_cache=llm_cache,
+        envelope=envelopes.get("BATTERY")
     )
 
-    if not os.path.exists(ENGINE_CSV):
-        #print("No CSV Available.")
-        return None
+    return analyst, engine_diag, battery_diag
 
-    last_decision = None
-    while True:
-        engine_done = engine_diag.run(ENGINE_CSV)
-        battery_done = battery_diag.run(BATTERY_CSV)
 
-        # Read the latest decision saved by analyst (could be None until first report)
-        if hasattr(analyst, "last_output"):
-            last_decision = analyst.last_output
+# -----------------------------
+# Subsystem fan-out / fan-in
+# -----------------------------
+# The subsystem diagnoses of one telemetry row run side by side (each may block
+# on its LLM call), so a row takes as long as its slowest subsystem rather than
+# the sum. Every subsystem reports to its own analyst - all sharing one vehicle
+# state store; each analyst re-reads its facts and records its decision (and any
+# service reset) under the store's per-vehicle lock, LLM calls stay outside it -
+# and the decisions are merged by severity (merge_decisions), so a later
+# "NO SERVICE" from one subsystem cannot mask another's ISSUE. Every subsystem row repeats the row's km_driven, so the
+# odometer is advanced once here and the analysts get km_driven = 0.
 
-        if engine_done and battery_done:
-            break
+SUBSYSTEM_THREADS = 4
 
-        time.sleep(0.5)  # small polling delay
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+
+def _subsystem_pool():
+    """Process-wide thread pool (recreated in forked worker processes)."""
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid():
+            _POOL = ThreadPoolExecutor(max_workers=SUBSYSTEM_THREADS, thread_name_prefix="subsystem")
+            _POOL_PID = os.getpid()
+        return _POOL
+
+
+def _diagnose(diag, row):
+    diag.analyst.last_output = diag.analyst.last_confidence = None
+    diag.run_row(row)
+    return diag.analyst.last_output, diag.analyst.last_confidence
+
+
+def _advance_odometer(state, rows):
+    """Add the telemetry row's km_driven to the vehicle once; rows without it for the analysts."""
+    first = rows[0]
+    vehicle_id = first.get("vehicle_id") or DEFAULT_VEHICLE
+    state.add_km(vehicle_id, float(first.get("km_driven", DEFAULT_KM_DRIVEN)))
+    return [dict(row, km_driven=0) for row in rows]
+
+
+def diagnose_vehicle(agents, rows, state=None):
+    """
+    Diagnose one vehicle's rows (rows[i] for agents[i], None to skip a subsystem)
+    concurrently. Returns (merged decision, [decision per subsystem], confidence),
+    confidence being the ML fault confidence behind the merged decision (the
+    highest among subsystems that reached it; None if none was scored).
+    state is the store the agents' analysts share (attach_analysts); the row's
+    km_driven is then counted once instead of once per subsystem.
+    """
+    jobs = [(diag, row) for diag, row in zip(agents, rows) if row is not None]
+    if state is not None and jobs:
+        jobs = list(zip((diag for diag, _ in jobs), _advance_odometer(state, [row for _, row in jobs])))
+    futures = [
+        # copy_context keeps the caller's trace ID on the pool thread
+        _subsystem_pool().submit(contextvars.copy_context().run, _diagnose, diag, row)
+        for diag, row in jobs[1:]
+    ]
+    outputs = [_diagnose(*jobs[0])] if jobs else []
+    outputs += [f.result() for f in futures]
+
+    by_agent = dict(zip((diag for diag, _ in jobs), (decision for decision, _ in outputs)))
+    per_subsystem = [by_agent.get(diag) for diag in agents]
+    merged = merge_decisions(per_subsystem)
+    confidence = max((c for d, c in outputs if d == merged and c is not None), default=None)
+    return merged, per_subsystem, confidence
+
+
+def attach_analysts(agents, state=None):
+    """Give every diagnostic agent its own analyst over one shared state store."""
+    state = state if state is not None else VehicleStateStore()
+    for diag in agents:
+        diag.analyst = DataAnalystAgent(service_threshold=5000, state=state)
+    return state
+
+
+@timed("main_runner.module_1")
+def module_1(engine_rows=None, battery_rows=None, agents=None, state=None, llm_cache=None, with_confidence=False):
+    """
+    Run both diagnostic agents over a stream of telemetry rows and return the
+    combined decision for the last row. engine_rows / battery_rows may be any
+    iterable of row dicts (see telemetry_stream); by default the inference CSVs
+    are drained once.
+    agents is an optional (engine_diag, battery_diag) pair to reuse already loaded
+    models; fresh analysts are attached to them for this call.
+    state is an optional vehicle_state.VehicleStateStore: rows carrying a
+    "vehicle_id" then update that vehicle's odometer/service history across calls.
+    llm_cache (llm_cache.LLMResultCache) is used when the agents are built here.
+    with_confidence=True returns (decision, ML fault confidence) instead (see
+    diagnose_vehicle).
+    """
+    if agents is None:
+        _, engine_diag, battery_diag = build_agents(llm_cache=llm_cache)
+    else:
+        engine_diag, battery_diag = agents
+        engine_diag.refresh_models()
+        battery_diag.refresh_models()
+    agents = (engine_diag, battery_diag)
+    state = attach_analysts(agents, state)
+
+    if engine_rows is None:
+        if not os.path.exists(ENGINE_CSV):
+            #print("No CSV Available.")
+            return (None, None) if with_confidence else None
+        engine_rows = drain_csv(ENGINE_CSV)
+    if battery_rows is None:
+        battery_rows = drain_csv(BATTERY_CSV)
+
+    last_decision = last_confidence = None
+    # Rows are handed straight to the agents: no file rewrite, no polling.
+    # Subsystems of a row run concurrently; rows stay in order (vehicle state).
+    for engine_row, battery_row in zip_longest(engine_rows, battery_rows):
+        decision, _, confidence = diagnose_vehicle(agents, (engine_row, battery_row), state)
+        if decision is not None:
+            last_decision, last_confidence = decision, confidence
 
     # return the last decision (string) for the caller to use
-    return last_decision
+    return (last_decision, last_confidence) if with_confidence else last_decision
 
 
 if __name__ == "__main__":
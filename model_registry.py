@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+import joblib
+
+# -----------------------------
+# Process-wide model registry
+# -----------------------------
+# joblib artifacts (models, label encoders) are loaded once per process and shared
+# by every agent that asks for the same file. An entry is reloaded automatically
+# when the file's mtime changes, so a retrained model can be dropped in place.
+
+
+def _resident_bytes():
+    """Current resident set size of this process (Linux), or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _Entry:
+    __slots__ = ("obj", "mtime", "file_bytes", "load_seconds", "resident_bytes", "hits", "loads")
+
+    def __init__(self):
+        self.obj = None
+        self.mtime = None
+        self.file_bytes = 0
+        self.load_seconds = 0.0
+        self.resident_bytes = None
+        self.hits = 0
+        self.loads = 0
+
+
+class ModelRegistry:
+    """
+    Cache of joblib-loaded objects keyed by (absolute path, mmap_mode).
+
+    mmap_mode is passed through to joblib.load; with mmap_mode="r" the numpy
+    arrays inside the pickle are memory-mapped read-only, so processes forked
+    after the load (or loading the same file) share those pages.
+    This only helps artifacts that hold large numpy arrays (e.g. scikit-learn
+    forests). The shipped EngineRF/BatteryRF are XGBoost classifiers whose
+    booster is pickled as one byte buffer and rebuilt on load, so mmap_mode
+    changes nothing for them; forked workers share them only copy-on-write.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, mmap_mode=None):
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        key = (path, mmap_mode)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                entry.hits += 1
+                return entry.obj
+
+            if entry is None:
+                entry = _Entry()
+
+            rss_before = _resident_bytes()
+            start = time.perf_counter()
+            obj = joblib.load(path, mmap_mode=mmap_mode)
+            entry.load_seconds = time.perf_counter() - start
+            rss_after = _resident_bytes()
+
+            entry.obj = obj
+            entry.mtime = mtime
+            entry.file_bytes = os.path.getsize(path)
+            entry.resident_bytes = (rss_after - rss_before) if None not in (rss_before, rss_after) else None
+            entry.loads += 1
+            self._entries[key] = entry
+            return obj
+
+    def reload(self, path=None):
+        """Drop cached entries (all, or just those for path) so the next get() reloads."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+    def stats(self):
+        """One dict per cached artifact: load time, sizes, hit and load counts."""
+        with self._lock:
+            return [
+                {
+                    "path": path,
+                    "mmap_mode": mmap_mode,
+                    "load_seconds": e.load_seconds,
+                    "file_bytes": e.file_bytes,
+                    "resident_bytes": e.resident_bytes,
+                    "hits": e.hits,
+                    "loads": e.loads,
+                }
+                for (path, mmap_mode), e in self._entries.items()
+            ]
+
+
+REGISTRY = ModelRegistry()
+
+
+def load_model(path, mmap_mode=None):
+    """Shared, load-once access to a joblib artifact through the global registry."""
+    return REGISTRY.get(path, mmap_mode=mmap_mode)
+
+
+if __name__ == "__main__":
+    for name in ["EngineRF.joblib", "EngineLE.joblib", "BatteryRF.joblib", "BatteryLE.joblib"]:
+        load_model(name)
+        load_model(name)
+    for s in REGISTRY.stats():
+        print(f"{os.path.basename(s['path'])}: {s['load_seconds'] * 1000:.1f} ms, "
+              f"file {s['file_bytes'] / 1e6:.2f} MB, resident {s['resident_bytes']} B, "
+              f"loads={s['loads']} hits={s['hits']}")
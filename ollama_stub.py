@@ -0,0 +1,88 @@
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------
+# Local stand-in for the ollama chat endpoint
+# -----------------------------
+# Serves POST /api/chat with ollama-shaped JSON so the LLM gateway and the agents
+# can be exercised (and benchmarked) without a model server. Replies follow the
+# agents' own rules: the diagnostic check answers FAULT (one numbered line per
+# item for llm_batcher prompts), the analyst prompt is answered from its INPUT block.
+
+
+def default_reply(model, messages):
+    text = "\n".join(m.get("content", "") for m in messages)
+
+    if "Subsystem =" in text:
+        facts = dict(re.findall(r"(Subsystem|Fault Detected|Odometer Crossed|Date Crossed) = (\w+)", text))
+        fault = facts.get("Fault Detected") == "True"
+        if fault and facts.get("Subsystem") == "BATTERY":
+            return "BATTERY ISSUE"
+        if fault and facts.get("Subsystem") == "ENGINE":
+            return "ENGINE ISSUE"
+        if "True" in (facts.get("Odometer Crossed"), facts.get("Date Crossed")):
+            return "MAINTENANCE DUE"
+        return "NO SERVICE"
+
+    # Multi-item escalation prompt (llm_batcher): one numbered answer per item
+    items = re.findall(r"^(\d+)\. ", text, re.MULTILINE)
+    if items:
+        return "\n".join(f"{n}: FAULT" for n in items)
+
+    return "FAULT"
+
+
+def start_stub_server(reply=default_reply, host="127.0.0.1", port=0, delay=0.0):
+    """
+    Start the stub in a daemon thread. reply(model, messages) -> str builds the
+    message content; delay adds a fixed latency per request.
+    Returns (server, base_url); call server.shutdown() to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse sockets
+
+        def do_POST(self):
+            if self.path != "/api/chat":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            server.requests += 1
+            if delay:
+                time.sleep(delay)
+
+            content = reply(body.get("model"), body.get("messages", []))
+            out = json.dumps({
+                "model": body.get("model"),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11434
+    server, url = start_stub_server(port=port)
+    print(f"ollama stub listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,196 @@
+import os
+import sys
+from datetime import date, timedelta
+import pandas as pd
+from booking_log import BookingLog
+from calendar_engine import engine_for
+from scheduler_agent import EXPECTED_COLUMNS, _apply_booking, bind_log, slot_frame
+
+# -----------------------------
+# Rolling-horizon service calendar
+# -----------------------------
+# The calendar is kept as day partitions, one CSV per date:
+#   calendar_days/2026-10-18.csv        (EXPECTED_COLUMNS rows of that day)
+#   calendar_days/bookings.log          (booking log, see booking_log.py)
+#   calendar_days/archive/<date>.csv    (days that have passed)
+# Only the days that are asked for are materialized - read from their partition
+# if it exists, otherwise generated - so opening a calendar costs the same for a
+# one-week and a six-month horizon. SlotIDs encode the real date and hour
+# (YYYYMMDDHH), so they never collide across weeks or runs, and bookings made by
+# earlier runs are kept. advance() slides the window: passed days are archived,
+# new days appear on demand.
+# Every logged booking is folded into exactly one partition before the log is
+# truncated - the archived one for a day that has already passed - so a booking
+# on a day that went by before the next compaction is never lost.
+#
+#   cal = RollingCalendar(horizon_days=180)
+#   df = cal.frame(days=7)     # next 7 days; book with scheduler_agent as usual
+#   cal.advance()              # once a day
+
+CALENDAR_DIR = "calendar_days"
+
+_TEXT_COLUMNS = {c: str for c in ("Date", "Day", "Time", "Status", "VehicleID", "RiskLevel",
+                                  "ServiceType", "VehicleType")}
+
+
+def slot_id_for(when):
+    """SlotID of the slot starting at datetime `when` (YYYYMMDDHH)."""
+    return ((when.year * 100 + when.month) * 100 + when.day) * 100 + when.hour
+
+
+def date_of_slot(slot_id):
+    slot_id = int(slot_id) // 100
+    return date(slot_id // 10000, slot_id // 100 % 100, slot_id % 100)
+
+
+class RollingCalendar:
+    def __init__(self, directory=CALENDAR_DIR, horizon_days=7, start=None, compact_every=500, verbose=False):
+        self.directory = directory
+        self.archive_dir = os.path.join(directory, "archive")
+        self.horizon_days = horizon_days
+        self.start = start or date.today() + timedelta(days=1)
+        self.verbose = verbose
+        os.makedirs(directory, exist_ok=True)
+
+        # Bookings on frame() go to this log; compaction rewrites the day partitions
+        self.log = BookingLog(os.path.join(directory, "calendar.csv"),
+                              log_path=os.path.join(directory, "bookings.log"),
+                              compact_every=compact_every, writer=self.write_snapshot)
+        self.df = None        # live frame over [start, end)
+        self.end = self.start
+        self._pending = None  # date -> logged booking events not applied to a partition yet
+
+    # ---- partitions ----
+    def _path(self, day, archived=False):
+        return os.path.join(self.archive_dir if archived else self.directory, f"{day.isoformat()}.csv")
+
+    def _pending_events(self):
+        if self._pending is None:
+            self._pending = {}
+            for events in self.log.replay():
+                for ev in events:
+                    self._pending.setdefault(date_of_slot(ev["SlotID"]), []).append(ev)
+        return self._pending
+
+    def load_day(self, day):
+        """
+        Partition for one date - from disk (the archive for a day that was already
+        archived), or freshly generated - with logged bookings applied.
+        """
+        path = self._path(day)
+        if not os.path.exists(path) and os.path.exists(self._path(day, archived=True)):
+            path = self._path(day, archived=True)
+        if os.path.exists(path):
+            part = pd.read_csv(path, dtype=_TEXT_COLUMNS, keep_default_na=False)
+            part["SlotDateTime"] = pd.to_datetime(part["Date"] + " " + part["Time"])
+        else:
+            part = slot_frame([day])
+            part["SlotID"] = [slot_id_for(t) for t in part["SlotDateTime"]]
+
+        events = self._pending_events().pop(day, ())
+        if events:
+            engine = engine_for(part)
+            for ev in events:
+                row = engine.lookup(ev["SlotID"])
+                if row is not None:
+                    _apply_booking(part, engine, row, ev["VehicleID"], ev["VehicleType"],
+                                   ev["ServiceType"], ev["RiskLevel"])
+        return part
+
+    def _write(self, path, part):
+        tmp = path + ".tmp"
+        part[EXPECTED_COLUMNS].to_csv(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _archive(self, day, part):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._write(self._path(day, archived=True), part)
+        if os.path.exists(self._path(day)):
+            os.remove(self._path(day))
+
+    def write_snapshot(self, df):
+        """BookingLog writer: one partition file per date in df (and per logged day not loaded)."""
+        for day, part in df.groupby("Date", sort=False):
+            self._write(self._path(date.fromisoformat(day)), part)
+        # The log is truncated after this; fold in bookings for days outside df,
+        # into the archive for days that have already passed
+        for day in list(self._pending_events()):
+            if day < self.start:
+                self._archive(day, self.load_day(day))
+            else:
+                self._write(self._path(day), self.load_day(day))
+
+    # ---- window ----
+    def frame(self, days=None):
+        """
+        Live calendar frame from start covering at least `days` days (default and
+        cap: horizon_days). Extending the window returns a new frame; bookings go
+        to this calendar's log.
+        """
+        days = self.horizon_days if days is None else min(days, self.horizon_days)
+        end = self.start + timedelta(days=days)
+        if self.df is None or end > self.end:
+            first = self.end if self.df is not None else self.start
+            parts = [self.load_day(first + timedelta(days=d)) for d in range((end - first).days)]
+            if self.df is not None:
+                parts.insert(0, self.df)
+            self.df = pd.concat(parts, ignore_index=True)
+            self.end = end
+            bind_log(self.df, self.log)
+            if self.verbose:
+                print(f"[CALENDAR] {self.start} .. {self.end - timedelta(days=1)}: {len(self.df)} slots")
+        return self.df
+
+    def advance(self, today=None):
+        """
+        Start the window the day after `today` (default: the real today). Days
+        before it are moved to the archive - with any bookings still in the log -
+        and the log is compacted; returns the archived dates.
+        """
+        start = (today or date.today()) + timedelta(days=1)
+        cutoff = start.isoformat()
+        pending = self._pending_events()
+
+        expired = {}
+        if self.df is not None:
+            old = self.df["Date"] < cutoff  # ISO dates order as strings
+            if old.any():
+                for day, part in self.df[old].groupby("Date", sort=False):
+                    expired[date.fromisoformat(day)] = part
+                self.df = self.df[~old].reset_index(drop=True)
+                bind_log(self.df, self.log)
+        for name in os.listdir(self.directory):
+            if name.endswith(".csv") and name[:-4] < cutoff:
+                day = date.fromisoformat(name[:-4])
+                if day not in expired:
+                    expired[day] = self.load_day(day)
+        for day in [d for d in pending if d < start]:
+            expired.setdefault(day, self.load_day(day))
+
+        for day, part in sorted(expired.items()):
+            self._archive(day, part)
+
+        self.start = max(self.start, start)
+        self.end = max(self.end, self.start)
+        if self.df is not None and self.df.empty:
+            self.df = None
+        # Archived partitions now hold their logged bookings: truncate the log
+        # so they are not replayed onto them again
+        if expired:
+            self.save()
+        if self.verbose and expired:
+            print(f"[CALENDAR] Archived {len(expired)} day(s); window starts {self.start}")
+        return sorted(expired)
+
+    def save(self):
+        """Write every loaded or logged day to its partition now and truncate the log."""
+        df = self.df if self.df is not None else pd.DataFrame(columns=EXPECTED_COLUMNS)
+        self.log.write_snapshot(df[EXPECTED_COLUMNS])
+
+
+if __name__ == "__main__":
+    # python rolling_calendar.py [days] - show the next days of the calendar
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    cal = RollingCalendar(horizon_days=max(days, 7), verbose=True)
+    cal.advance()
+    print(cal.frame(days)[EXPECTED_COLUMNS].to_string(index=False))
@@ -1,12 +1,21 @@
 import pandas as pd
 from datetime import datetime, timedelta
+import heapq
+import itertools
 import math
 import random
+import time
+import weakref
+from contextlib import contextmanager
+import numpy as np
+from calendar_engine import engine_for
+from booking_log import BookingLog
+from instrumentation import timed
 
 # -----------------------------
 # Constants
 # -----------------------------
-EXPECTED_COLUMNS = ["SlotID", "Day", "Time", "Status", "VehicleID", "RiskLevel",
+EXPECTED_COLUMNS = ["SlotID", "Date", "Day", "Time", "Status", "VehicleID", "RiskLevel",
                     "ServiceType", "Capacity", "Used", "VehicleType"]
 
 SERVICE_DURATION = {
@@ -17,48 +26,72 @@ SERVICE_DURATION = {
 }
 
 SLOT_CAPACITY = 5
+SLOT_HOURS = range(9, 18)  # 9 AM - 5 PM, one slot per hour
+
+CALENDAR_CSV = "AutoSense_ServiceCalendar.csv"
+
+# Every calendar frame books through its own log, bound to it by whoever made the
+# frame: generate_slots / load_calendar append to AutoSense_ServiceCalendar.log (the
+# CSV is only rewritten as a snapshot when the log is compacted, see booking_log.py),
+# rolling_calendar to its own log. Two frames never share a log, so compacting one
+# cannot snapshot over the other's bookings. A frame with no log is in memory only.
+_LOGS = {}
+
+
+def bind_log(df, log):
+    """Send bookings made on df to log."""
+    key = id(df)
+    _LOGS[key] = (weakref.ref(df), log)
+    weakref.finalize(df, _LOGS.pop, key, None)
+
+
+def log_for(df):
+    """The BookingLog bound to df, or None."""
+    entry = _LOGS.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return None
+
+
+# -----------------------------
+# Slot rows for a set of dates
+# -----------------------------
+def slot_frame(dates, slot_ids=None):
+    """
+    FREE calendar rows for every SLOT_HOURS slot of each date, built in one
+    vectorized pass. SlotDateTime (not saved to CSV) holds the real datetime.
+    slot_ids defaults to 1..n.
+    """
+    days = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+    hours = np.asarray(SLOT_HOURS, dtype="timedelta64[h]")
+    slot_dt = pd.DatetimeIndex((days.values[:, None] + hours[None, :]).ravel())
+    n = len(slot_dt)
+    df = pd.DataFrame({
+        "SlotID": np.arange(1, n + 1) if slot_ids is None else slot_ids,
+        "Date": slot_dt.strftime("%Y-%m-%d"),
+        "Day": slot_dt.strftime("%A"),        # e.g., "Tuesday"
+        "Time": slot_dt.strftime("%H:%M"),    # e.g., "09:00"
+        "Status": "FREE", "VehicleID": "", "RiskLevel": "", "ServiceType": "",
+        "Capacity": SLOT_CAPACITY, "Used": 0, "VehicleType": "",
+    }, columns=EXPECTED_COLUMNS)
+    df["SlotDateTime"] = slot_dt
+    return df
+
 
 # -----------------------------
 # Generate slots (Modified)
 # -----------------------------
-def generate_slots(days_ahead=7):
-    rows = []
-    now = datetime.now()
-    slot_id_counter = 1 # Start counter for the new unique ID
-
-    for d in range(1, days_ahead + 1):
-        day = now + timedelta(days=d)
-        
-        # Calculate the actual date for generating Day name
-        slot_date = day.replace(hour=0, minute=0, second=0, microsecond=0) 
-        day_name = slot_date.strftime("%A") # e.g., "Tuesday"
-
-        for hour in range(9, 18):  # 9 AM - 5 PM
-            time_str = datetime(2000, 1, 1, hour, 0).strftime("%H:%M") # e.g., "09:00"
-
-            # SlotDateTime is calculated but NOT saved to the CSV.
-            # It's only used internally to track the slot's true date/time for console output.
-            slot_dt = day.replace(hour=hour, minute=0, second=0, microsecond=0)
-            
-            # Note: We are using Day and Time, not the full date for the CSV.
-            # We save the SlotID, Day name, and Time string.
-            rows.append([slot_id_counter, day_name, time_str, "FREE", "", "", "", SLOT_CAPACITY, 0, ""])
-            slot_id_counter += 1
-
-    df = pd.DataFrame(rows, columns=EXPECTED_COLUMNS)
-    df.to_csv("AutoSense_ServiceCalendar.csv", index=False)
-
-    print(f"Created new calendar CSV file: AutoSense_ServiceCalendar.csv")
-    print(f"Generated {len(rows)} slots.\n")
-    
-    # Add a temporary SlotDateTime column back for internal use in other functions 
-    # (like display_calendar and random_bookings which rely on continuous indices)
-    temp_df = []
-    for d in range(1, days_ahead + 1):
-        day = now + timedelta(days=d)
-        for hour in range(9, 18):
-             temp_df.append(day.replace(hour=hour, minute=0, second=0, microsecond=0))
-    df['SlotDateTime'] = temp_df
+def generate_slots(days_ahead=7, path=CALENDAR_CSV):
+    # Fixed calendar of the next days_ahead days; see rolling_calendar for a
+    # calendar that keeps its bookings across runs.
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    df = slot_frame(tomorrow + timedelta(days=d) for d in range(days_ahead))
+    log = BookingLog(path)
+    log.write_snapshot(df[EXPECTED_COLUMNS])
+    bind_log(df, log)
+
+    print(f"Created new calendar CSV file: {path}")
+    print(f"Generated {len(df)} slots.\n")
     
     return df
 
@@ -66,12 +99,25 @@ def generate_slots(days_ahead=7):
 # -----------------------------
 # Load calendar (Modified)
 # -----------------------------
-def load_calendar():
+def load_calendar(path=CALENDAR_CSV):
     # SlotDateTime is not in the CSV, so we don't parse it.
-    df = pd.read_csv("AutoSense_ServiceCalendar.csv")
+    df = pd.read_csv(path)
+    if "Date" not in df.columns:  # calendars written before the Date column
+        df.insert(1, "Date", "")
     df["Capacity"] = df["Capacity"].astype(int)
     df["Used"] = df["Used"].astype(int)
     df.fillna("", inplace=True)
+
+    # Replay bookings made since the last snapshot
+    engine = engine_for(df)
+    log = BookingLog(path)
+    for events in log.replay():
+        for ev in events:
+            row = engine.lookup(ev["SlotID"])
+            if row is not None:
+                _apply_booking(df, engine, row, ev["VehicleID"], ev["VehicleType"],
+                               ev["ServiceType"], ev["RiskLevel"])
+    bind_log(df, log)
     
     # *** IMPORTANT ***
     # Since the original booking logic relied on SlotDateTime for indexing, 
@@ -80,12 +126,64 @@ def load_calendar():
     # For now, we'll return the calendar as is, but random_bookings will have issues.
     return df
 
+# -----------------------------
+# Apply one booking to the calendar frame + engine
+# -----------------------------
+_BOOKING_FIELDS = ["Status", "VehicleID", "RiskLevel", "ServiceType", "VehicleType", "Used"]
+
+
+def _apply_booking(df, engine, row, vehicle_id, vehicle_type, service_type, risk_level, undo=None):
+    idx = df.index[row]
+    if undo is not None:  # saved before anything changes, see _booking
+        undo.append((row, [df.at[idx, col] for col in _BOOKING_FIELDS], engine.row_state(row)))
+    df.at[idx, "Status"] = "BOOKED"
+    df.at[idx, "VehicleID"] = vehicle_id
+    df.at[idx, "RiskLevel"] = risk_level
+    df.at[idx, "ServiceType"] = service_type
+    df.at[idx, "VehicleType"] = vehicle_type
+    df.at[idx, "Used"] += 1
+    engine.mark_booked(row)
+
+    # Event recorded in the booking log
+    return {"SlotID": engine.slot_ids[row], "VehicleID": vehicle_id, "VehicleType": vehicle_type,
+            "ServiceType": service_type, "RiskLevel": risk_level}
+
+
+@contextmanager
+def _booking(df, log=None):
+    """
+    One all-or-nothing booking transaction on df: yields (events, undo). Pass undo
+    to _apply_booking; if the block raises, every row it touched is restored in df
+    and the engine, and nothing is logged. log defaults to log_for(df); without
+    one the booking only lives in df. The engine lock is held throughout, so
+    capacity checked in the block (held capacity included) cannot be taken by a
+    concurrent booking or hold.
+    """
+    engine = engine_for(df)
+    log = log or log_for(df)
+    undo = []
+    try:
+        with engine.lock:
+            if log is None:
+                yield [], undo
+            else:
+                with log.transaction(df, EXPECTED_COLUMNS) as events:
+                    yield events, undo
+    except BaseException:
+        for row, values, state in reversed(undo):
+            idx = df.index[row]
+            for col, value in zip(_BOOKING_FIELDS, values):
+                df.at[idx, col] = value
+            engine.restore_row(row, state)
+        raise
+
 # -----------------------------
 # Random bookings generator (Modified)
 # -----------------------------
 def random_bookings(df, booking_ratio=0.3):
     total_slots = len(df)
     slots_to_book = int(total_slots * booking_ratio)
+    # NOTE: df must keep its default RangeIndex (row index == SlotID - 1)
 
     VEHICLE_SERVICES = {
         "Car": ["General Service", "Brake Check", "Engine Check", "Coolant Leak"],
@@ -96,52 +194,36 @@ def random_bookings(df, booking_ratio=0.3):
 
     RISK_LEVELS = ["High", "Medium", "Low"]
 
-    booked_count = 0
-    while booked_count < slots_to_book:
-
-        # Use SlotID for random selection logic
-        idx = random.randint(1, total_slots) # SlotID starts at 1
-
-        # We must map the SlotID back to the DataFrame index (which starts at 0)
-        df_index = idx - 1 
-
-        if df.at[df_index, "Status"] != "FREE":
-            continue
-
-        vehicle_type = random.choice(list(VEHICLE_SERVICES.keys()))
-        service_type = random.choice(VEHICLE_SERVICES[vehicle_type])
-        risk_level = random.choice(RISK_LEVELS)
-        vehicle_id = f"{vehicle_type[:2].upper()}{random.randint(1000,9999)}"
+    engine = engine_for(df)
 
-        duration = SERVICE_DURATION.get(vehicle_type, {}).get(service_type, 60)
-        slots_needed = math.ceil(duration / 60)
+    # One log transaction for the whole run instead of rewriting the calendar CSV
+    with _booking(df) as (events, undo):
+        booked_count = 0
+        while booked_count < slots_to_book:
 
-        if df_index + slots_needed > total_slots:
-            continue
+            vehicle_type = random.choice(list(VEHICLE_SERVICES.keys()))
+            service_type = random.choice(VEHICLE_SERVICES[vehicle_type])
+            risk_level = random.choice(RISK_LEVELS)
+            vehicle_id = f"{vehicle_type[:2].upper()}{random.randint(1000,9999)}"
 
-        # Book consecutive slots using DataFrame index
-        can_book = True
-        for j in range(slots_needed):
-            if df.at[df_index + j, "Status"] != "FREE":
-                can_book = False
-                break
+            duration = SERVICE_DURATION.get(vehicle_type, {}).get(service_type, 60)
+            slots_needed = math.ceil(duration / 60)
 
-        if not can_book:
-            continue
+            # Random start among all runs of consecutive free slots (same day), taken
+            # from the engine's free-slot bitmaps instead of a probe-and-retry loop
+            df_index = engine.random_consecutive(slots_needed)
+            if df_index is None:
+                if engine.random_consecutive(1) is None:
+                    break  # calendar is full
+                continue
 
-        # Confirm booking
-        for j in range(slots_needed):
-            df.at[df_index + j, "Status"] = "BOOKED"
-            df.at[df_index + j, "VehicleID"] = vehicle_id
-            df.at[df_index + j, "RiskLevel"] = risk_level
-            df.at[df_index + j, "ServiceType"] = service_type
-            df.at[df_index + j, "Used"] += 1
-            df.at[df_index + j, "VehicleType"] = vehicle_type
+            # Confirm booking
+            for j in range(slots_needed):
+                events.append(_apply_booking(df, engine, df_index + j, vehicle_id,
+                                             vehicle_type, service_type, risk_level, undo))
 
-        booked_count += 1
+            booked_count += 1
 
-    # Save the calendar without the SlotDateTime column
-    df[EXPECTED_COLUMNS].to_csv("AutoSense_ServiceCalendar.csv", index=False)
     print("Random booking completed.\n")
     return df
 
@@ -151,43 +233,183 @@ def random_bookings(df, booking_ratio=0.3):
 # -----------------------------
 def get_available_slots(df):
     # Now returns Day and Time combined, instead of SlotDateTime
-    free_df = df[(df["Status"] == "FREE") & (df["Used"] < df["Capacity"])]
-    
-    # Return a list of strings: "Day HH:MM"
-    return (free_df['Day'] + ' ' + free_df['Time']).tolist()
+    # Return a list of strings: "Day HH:MM" (FREE slots with spare capacity)
+    return engine_for(df).available_labels()
 
 # -----------------------------
 # Function to book slot for real customer (Modified)
 # -----------------------------
+@timed("scheduler.book_slot")
 def book_slot(df, slot_id, vehicle_id, vehicle_type, service_type, risk_level):
     
-    # The SlotID is now the primary key.
-    # Check if the SlotID is valid
-    if slot_id not in df["SlotID"].values:
+    # The SlotID is now the primary key, looked up in O(1) through the engine index
+    engine = engine_for(df)
+    row = engine.lookup(slot_id)
+    if row is None:
         return "❌ Error: Slot ID not found."
 
-    # Find the DataFrame index (which starts at 0) from the SlotID (which starts at 1)
-    match = df[df["SlotID"] == slot_id]
-    idx = match.index[0]
-
-    if df.at[idx, "Used"] >= df.at[idx, "Capacity"]:
-        return "❌ Slot already full."
+    # Append the booking to the log (the CSV snapshot is rewritten only on compaction)
+    with _booking(df) as (events, undo):
+        if engine.is_full(row):
+            return "❌ Slot already full."
+        events.append(_apply_booking(df, engine, row, vehicle_id, vehicle_type, service_type, risk_level, undo))
 
-    # The booking process uses the DataFrame index 'idx'
-    df.at[idx, "Status"] = "BOOKED"
-    df.at[idx, "VehicleID"] = vehicle_id
-    df.at[idx, "RiskLevel"] = risk_level
-    df.at[idx, "ServiceType"] = service_type
-    df.at[idx, "VehicleType"] = vehicle_type
-    df.at[idx, "Used"] += 1
-
-    # Save the calendar without the SlotDateTime column
-    df[EXPECTED_COLUMNS].to_csv("AutoSense_ServiceCalendar.csv", index=False)
+    idx = df.index[row]
     
     day_time = f"{df.at[idx, 'Day']} at {df.at[idx, 'Time']}"
     return f"✅ Booking confirmed for {vehicle_id} (Slot ID: {slot_id}) on {day_time}."
 
 
+# -----------------------------
+# Duration-aware booking for real customers
+# -----------------------------
+def slots_needed(vehicle_type, service_type):
+    """Consecutive hourly slots a service takes (SERVICE_DURATION, default 60 min)."""
+    duration = SERVICE_DURATION.get(vehicle_type, {}).get(service_type, 60)
+    return math.ceil(duration / 60)
+
+
+def find_service_slots(df, vehicle_type, service_type, start_slot_id=None, exact=False):
+    """
+    SlotIDs of the earliest run of consecutive same-day slots with spare Capacity
+    that fits the service, starting at start_slot_id or later (exactly at it with
+    exact=True). None if none fits.
+    """
+    engine = engine_for(df)
+    start_row = 0
+    if start_slot_id is not None:
+        start_row = engine.lookup(start_slot_id)
+        if start_row is None:
+            return None
+    k = slots_needed(vehicle_type, service_type)
+    if exact:
+        row = start_row if engine.capacity_run_at(start_row, k) else None
+    else:
+        row = engine.find_capacity_run(k, start_row)
+    if row is None:
+        return None
+    return [engine.slot_ids[r] for r in range(row, row + k)]
+
+
+@timed("scheduler.book_service")
+def book_service(df, vehicle_id, vehicle_type, service_type, risk_level, start_slot_id=None, exact=False):
+    """
+    Book every slot the service needs in one go: either all of them are
+    written (as one booking-log transaction) or none. With exact=True the visit
+    must start at start_slot_id; it is never moved to a later slot.
+    """
+    engine = engine_for(df)
+    with _booking(df) as (events, undo):
+        slot_ids = find_service_slots(df, vehicle_type, service_type, start_slot_id, exact)
+        if slot_ids is None and exact:
+            return f"❌ Slot ID {start_slot_id} can no longer start a {service_type} visit."
+        if slot_ids is None:
+            return f"❌ No {slots_needed(vehicle_type, service_type)} consecutive slots available for {service_type}."
+        rows = [engine.lookup(sid) for sid in slot_ids]
+        events.extend(_apply_booking(df, engine, row, vehicle_id, vehicle_type, service_type, risk_level, undo)
+                      for row in rows)
+
+    first, last = df.index[rows[0]], df.index[rows[-1]]
+    span = f"{df.at[first, 'Day']} at {df.at[first, 'Time']}"
+    if len(rows) > 1:
+        span += f" (until the {df.at[last, 'Time']} slot ends)"
+    ids = ", ".join(str(sid) for sid in slot_ids)
+    return f"✅ Booking confirmed for {vehicle_id} (Slot ID: {ids}) on {span}."
+
+
+# -----------------------------
+# Risk-prioritized scheduling queue
+# -----------------------------
+SEVERITY = {"ENGINE ISSUE": 3, "BATTERY ISSUE": 2, "MAINTENANCE DUE": 1, "NO SERVICE": 0}
+RISK_BY_SEVERITY = {3: "High", 2: "Medium", 1: "Low", 0: "Low"}
+
+
+class PriorityScheduler:
+    """
+    Heap of flagged vehicles waiting for a bay, most urgent first:
+        priority = severity + confidence_weight * ML confidence + aging_per_hour * hours waited
+    Every entry ages at the same rate, so the order never changes after a push and
+    the heap key can be fixed at push time (severity + weighted confidence -
+    aging_per_hour * enqueue hour). Ties go to whoever was pushed first.
+    """
+
+    def __init__(self, confidence_weight=0.5, aging_per_hour=0.1):
+        self.confidence_weight = confidence_weight
+        self.aging_per_hour = aging_per_hour
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, vehicle_id, verdict, confidence=1.0, vehicle_type="Vehicle", service_type=None,
+             enqueued_at=None, **info):
+        """Queue a vehicle; extra keyword arguments are kept on the entry (e.g. row index)."""
+        severity = SEVERITY.get(verdict, 0)
+        enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        key = severity + self.confidence_weight * confidence - self.aging_per_hour * enqueued_at / 3600.0
+        entry = dict(info, vehicle_id=vehicle_id, verdict=verdict, severity=severity,
+                     confidence=confidence, vehicle_type=vehicle_type,
+                     service_type=service_type or verdict, risk_level=RISK_BY_SEVERITY[severity],
+                     enqueued_at=enqueued_at)
+        heapq.heappush(self._heap, (-key, next(self._seq), entry))
+        return entry
+
+    def priority(self, entry, now=None):
+        now = time.time() if now is None else now
+        return (entry["severity"] + self.confidence_weight * entry["confidence"]
+                + self.aging_per_hour * (now - entry["enqueued_at"]) / 3600.0)
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
+    def drain(self):
+        """Pop every queued entry, most urgent first."""
+        while self._heap:
+            yield self.pop()
+
+    @timed("scheduler.assign")
+    def assign(self, df, limit=None):
+        """
+        Book the queued vehicles (all, or the `limit` most urgent) onto the
+        calendar in priority order, each on the earliest run of consecutive slots
+        its service needs. Bookings only ever remove capacity, so the search for
+        each run length resumes at the day where the previous one stopped and
+        scans the engine's per-day capacity bitmaps forward from there
+        (CalendarEngine.find_capacity_run): every day is passed over at most once
+        per run length, O(days * k + vehicles * k) in total rather than a scan of
+        the calendar per vehicle.
+        All bookings are written as a single booking-log transaction; if it fails,
+        none are kept and the vehicles go back on the queue.
+        Returns [(entry, slot_ids or None), ...] in priority order.
+        """
+        engine = engine_for(df)
+        cursor = {}  # slots needed -> first row that can still start a fitting run
+        assigned = []
+        popped = []  # heap items taken so far, pushed back if the transaction fails
+        try:
+            with _booking(df) as (events, undo):
+                while self._heap and (limit is None or len(assigned) < limit):
+                    popped.append(heapq.heappop(self._heap))
+                    entry = popped[-1][2]
+                    k = slots_needed(entry["vehicle_type"], entry["service_type"])
+                    row = engine.find_capacity_run(k, cursor.get(k, 0))
+                    if row is None:
+                        cursor[k] = len(engine.slot_ids)
+                        assigned.append((entry, None))
+                        continue
+                    cursor[k] = row
+                    for r in range(row, row + k):
+                        events.append(_apply_booking(df, engine, r, entry["vehicle_id"], entry["vehicle_type"],
+                                                     entry["service_type"], entry["risk_level"], undo))
+                    assigned.append((entry, [engine.slot_ids[r] for r in range(row, row + k)]))
+        except BaseException:
+            for item in popped:
+                heapq.heappush(self._heap, item)
+            raise
+        return assigned
+
+
 # -----------------------------
 # Display calendar neatly (Modified)
 # -----------------------------
@@ -217,9 +439,9 @@ if __name__ == "__main__":
     
     # Find the Day/Time for display purposes
     day = df[df['SlotID'] == slot_id_to_book]['Day'].iloc[0]
-    time = df[df['SlotID'] == slot_id_to_book]['Time'].iloc[0]
+    slot_time = df[df['SlotID'] == slot_id_to_book]['Time'].iloc[0]
     
-    print(f"\nAttempting to book SlotID {slot_id_to_book} ({day} {time})...")
+    print(f"\nAttempting to book SlotID {slot_id_to_book} ({day} {slot_time})...")
     
     # You must pass the SlotID (integer) now, not the full datetime string
     booking_result = book_slot(
@@ -0,0 +1,187 @@
+import re
+from datetime import date, timedelta
+from calendar_engine import engine_for
+
+# -----------------------------
+# Spoken slot resolution
+# -----------------------------
+# Turns the caller's SpeechResult ("tuesday at ten", "the first one", "2 pm on
+# friday") into one of the slots that were offered on the call, with a
+# confidence score, without another call or an LLM round trip. The offered
+# "Day HH:MM" labels are parsed once into a small index; a match is a handful
+# of dict lookups.
+#
+#   matcher = SlotMatcher.from_calendar(calendar_df)   # same order as get_available_slots
+#   slot_id, label, confidence = matcher.match("tuesday at ten")
+
+MIN_CONFIDENCE = 0.5   # below this the reply is treated as unresolved
+# A bare hour offered on several days: best guess only, the caller must ask for the day
+AMBIGUOUS_CONFIDENCE = 0.3
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_DAY_WORDS = {**{d: i for i, d in enumerate(WEEKDAYS)},
+              **{d[:3]: i for i, d in enumerate(WEEKDAYS)},
+              "tues": 1, "weds": 2, "thur": 3, "thurs": 3}
+
+_NUMBER_WORDS = {
+    "zero": 0, "oh": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
+    "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "noon": 12,
+}
+_ORDINALS = {
+    "first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2, "fourth": 3, "4th": 3,
+    "fifth": 4, "5th": 4, "sixth": 5, "6th": 5, "seventh": 6, "7th": 6, "eighth": 7, "8th": 7,
+    "ninth": 8, "9th": 8, "tenth": 9, "10th": 9, "last": -1, "earliest": 0, "latest": -1,
+}
+_NEGATIVE = {"no", "none", "neither", "nothing", "cancel", "later", "not"}
+
+# Working hours are 09:00-17:00, so a bare "two" or "five" means the afternoon
+_PM_BELOW = 8
+
+
+def _tokens(text):
+    text = text.lower().replace("a.m.", "am").replace("p.m.", "pm")
+    text = re.sub(r"(\d{1,2}):(\d{2})", r"\1 \2", text)
+    text = re.sub(r"(\d)(am|pm)\b", r"\1 \2", text)
+    return re.findall(r"[a-z]+|\d+(?:st|nd|rd|th)?", text)
+
+
+def _one_is_number(words, i):
+    prev = words[i - 1] if i else ""
+    nxt = words[i + 1] if i + 1 < len(words) else ""
+    return prev in ("at", "around", "by", "about") or nxt in ("am", "pm", "o", "oclock", "clock") \
+        or nxt in _NUMBER_WORDS or nxt.isdigit()
+
+
+def parse_speech(text, today=None):
+    """
+    Pull day, hour, minute and ordinal out of a spoken reply.
+    Returns a dict with keys day (weekday 0-6), hour, minute, ordinal, negative;
+    missing parts are None.
+    """
+    today = today or date.today()
+    words = _tokens(text or "")
+    out = {"day": None, "hour": None, "minute": None, "ordinal": None, "negative": False}
+    meridiem = None
+    numbers = []
+
+    i = 0
+    while i < len(words):
+        w = words[i]
+        if w == "tomorrow":
+            out["day"] = (today + timedelta(days=1)).weekday()
+        elif w == "today":
+            out["day"] = today.weekday()
+        elif w in _DAY_WORDS:
+            out["day"] = _DAY_WORDS[w]
+        elif w in _ORDINALS:
+            out["ordinal"] = _ORDINALS[w]
+        elif w in ("am", "morning"):
+            meridiem = "am"
+        elif w in ("pm", "afternoon", "evening"):
+            meridiem = "pm"
+        elif w == "half" and i + 1 < len(words) and words[i + 1] == "past":
+            out["minute"] = 30
+            i += 1
+        elif w.isdigit():
+            numbers.append(int(w))
+        elif w == "one" and not _one_is_number(words, i):
+            pass  # "the first one", "that one"
+        elif w in _NUMBER_WORDS:
+            n = _NUMBER_WORDS[w]
+            # "twenty five" / "thirty" after an hour -> minutes
+            if n >= 20 and i + 1 < len(words) and words[i + 1] in _NUMBER_WORDS \
+                    and _NUMBER_WORDS[words[i + 1]] < 10:
+                n += _NUMBER_WORDS[words[i + 1]]
+                i += 1
+            numbers.append(n)
+        elif w in _NEGATIVE:
+            out["negative"] = True
+        i += 1
+
+    if numbers:
+        hour = numbers[0]
+        if hour <= 24:
+            out["hour"] = hour
+            if len(numbers) > 1 and numbers[1] < 60:
+                out["minute"] = numbers[1]
+    if out["hour"] is not None:
+        if meridiem == "pm" and out["hour"] < 12:
+            out["hour"] += 12
+        elif meridiem is None and out["hour"] < _PM_BELOW:
+            out["hour"] += 12
+        elif meridiem == "am" and out["hour"] == 12:
+            out["hour"] = 0
+    return out
+
+
+class SlotMatcher:
+    def __init__(self, labels, slot_ids=None):
+        self.labels = list(labels)
+        self.slot_ids = list(slot_ids) if slot_ids is not None else list(self.labels)
+        self._by_label = {}
+        self._by_day = {}
+        self._by_hour = {}
+        self._by_day_hour = {}
+        self._by_time = {}
+        for pos, label in enumerate(self.labels):
+            day_word, _, time_str = label.partition(" ")
+            day = _DAY_WORDS.get(day_word.lower())
+            hour, _, minute = time_str.partition(":")
+            hour, minute = int(hour), int(minute or 0)
+            self._by_label.setdefault(label.lower(), pos)
+            self._by_day.setdefault(day, []).append(pos)
+            self._by_hour.setdefault(hour, []).append(pos)
+            self._by_day_hour.setdefault((day, hour), []).append(pos)
+            self._by_time[(day, hour, minute)] = self._by_time.get((day, hour, minute), pos)
+
+    @classmethod
+    def from_calendar(cls, df):
+        """Matcher over the calendar's available slots (get_available_slots order)."""
+        engine = engine_for(df)
+        rows = engine.available_rows()
+        return cls([engine.labels[r] for r in rows], [engine.slot_ids[r] for r in rows])
+
+    def _result(self, pos, confidence):
+        return self.slot_ids[pos], self.labels[pos], confidence
+
+    def match(self, speech, today=None):
+        """(slot_id, label, confidence) for the reply; (None, None, 0.0) if nothing fits."""
+        none = (None, None, 0.0)
+        if not speech or not self.labels:
+            return none
+
+        text = " ".join(speech.lower().split())
+        pos = self._by_label.get(text.strip(" ."))
+        if pos is not None:
+            return self._result(pos, 1.0)
+
+        p = parse_speech(text, today)
+        day, hour, minute, ordinal = p["day"], p["hour"], p["minute"], p["ordinal"]
+        if p["negative"] and day is None and hour is None and ordinal is None:
+            return none
+
+        if hour is not None:
+            if day is not None:
+                if (day, hour, minute or 0) in self._by_time:
+                    return self._result(self._by_time[(day, hour, minute or 0)], 0.95)
+                candidates = self._by_day_hour.get((day, hour))
+                if candidates:
+                    return self._result(candidates[0], 0.8)
+            else:
+                candidates = self._by_hour.get(hour)
+                if candidates:
+                    # "at ten": resolved only if one offered day has a ten o'clock slot
+                    return self._result(candidates[0], 0.8 if len(candidates) == 1 else AMBIGUOUS_CONFIDENCE)
+
+        if ordinal is not None:
+            pool = self._by_day.get(day, []) if day is not None else range(len(self.labels))
+            if len(pool) and -len(pool) <= ordinal < len(pool):
+                return self._result(pool[ordinal], 0.85 if day is not None else 0.9)
+
+        if day is not None and hour is None and self._by_day.get(day):
+            return self._result(self._by_day[day][0], 0.6)
+
+        return none
@@ -0,0 +1,316 @@
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from main_runner import BATTERY_RAW, ENGINE_FEATS
+
+try:
+    import pyarrow
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Feather are optional; the .npcol store needs only NumPy
+    pyarrow = None
+
+# -----------------------------
+# Columnar telemetry storage
+# -----------------------------
+# Daily fleet dumps take longer to parse as CSV than to score, so telemetry can be
+# converted once into a typed columnar file and read back column by column:
+#
+#   * .npcol directory (default, NumPy only): one raw little-endian array per
+#     column, memory-mapped on read, plus a schema.json sidecar with dtypes,
+#     row count and the categories of dictionary-encoded text columns
+#   * .parquet / .feather (needs pyarrow)
+#
+# read_table(path, columns=ENGINE_COLUMNS) only touches the requested columns
+# (projection pushdown), so each agent reads just its own features.
+#
+#   python telemetry_io.py convert telemetry.csv telemetry.npcol
+#   python telemetry_io.py info telemetry.npcol
+
+ENGINE_COLUMNS = ENGINE_FEATS + ["km_driven"]
+BATTERY_COLUMNS = BATTERY_RAW + ["km_driven"]
+CUSTOMER_COLUMNS = ["Name", "Phone Number"]
+
+# Typed telemetry.csv columns; anything else is inferred from the first chunk
+TELEMETRY_SCHEMA = {
+    **{c: "category" for c in CUSTOMER_COLUMNS},
+    **{c: "float64" for c in ENGINE_FEATS + BATTERY_RAW},
+    "km_driven": "float64",
+}
+TELEMETRY_COLUMNS = CUSTOMER_COLUMNS + ENGINE_FEATS + ["km_driven"] + BATTERY_RAW
+
+SCHEMA_FILE = "schema.json"
+FORMAT_VERSION = 1
+
+
+def _format_of(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext == ".parquet":
+        return "parquet"
+    if ext in (".feather", ".arrow"):
+        return "feather"
+    return "npcol"
+
+
+def _require_arrow(fmt):
+    if pyarrow is None:
+        raise ImportError(f"{fmt} telemetry files need pyarrow (pip install pyarrow); "
+                          f"use a .npcol store instead")
+
+
+def _typed(chunk, schema):
+    """Apply schema dtypes to a raw CSV chunk, dropping repeated header lines."""
+    first = chunk.columns[0]
+    chunk = chunk[chunk[first].astype(str) != first]
+    out = {}
+    for col in chunk.columns:
+        dtype = schema.get(col)
+        if dtype is None:
+            numeric = pd.to_numeric(chunk[col], errors="coerce")
+            dtype = "float64" if numeric.notna().sum() == chunk[col].notna().sum() else "category"
+            schema[col] = dtype
+        if dtype == "category":
+            out[col] = chunk[col].astype(str).where(chunk[col].notna(), None)
+        else:
+            out[col] = pd.to_numeric(chunk[col], errors="coerce").astype(dtype)
+    return pd.DataFrame(out, index=chunk.index)
+
+
+# -----------------------------
+# .npcol column store
+# -----------------------------
+class ColumnStore:
+    """Read side of a .npcol directory: columns are np.memmap views, nothing is parsed."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported column store version in {path}: {meta.get('version')}")
+        self.rows = meta["rows"]
+        self.schema = meta["columns"]  # name -> {"file", "dtype", ["categories"]}
+        self.columns = list(self.schema)
+        self._cache = {}
+
+    def column(self, name):
+        """Raw array for one column (category columns give their int32 codes)."""
+        arr = self._cache.get(name)
+        if arr is None:
+            spec = self.schema[name]
+            dtype = "<i4" if spec["dtype"] == "category" else spec["dtype"]
+            if self.rows == 0:
+                arr = np.empty(0, dtype=dtype)
+            else:
+                arr = np.memmap(os.path.join(self.path, spec["file"]), dtype=dtype, mode="r",
+                                shape=(self.rows,))
+            self._cache[name] = arr
+        return arr
+
+    def series(self, name, start=0, stop=None):
+        spec = self.schema[name]
+        values = self.column(name)[start:stop]
+        if spec["dtype"] == "category":
+            categories = np.asarray(spec["categories"] + [None], dtype=object)
+            return pd.Series(categories[values], name=name)  # code -1 -> None
+        return pd.Series(np.array(values), name=name)
+
+    def frame(self, columns=None, start=0, stop=None):
+        columns = self.columns if columns is None else columns
+        missing = [c for c in columns if c not in self.schema]
+        if missing:
+            raise KeyError(f"Columns not in {self.path}: {missing}")
+        return pd.DataFrame({c: self.series(c, start, stop) for c in columns})
+
+
+class ColumnStoreWriter:
+    """Append DataFrame chunks to a .npcol directory; close() writes the sidecar."""
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = dict(TELEMETRY_SCHEMA if schema is None else schema)
+        os.makedirs(path, exist_ok=True)
+        self.rows = 0
+        self.specs = {}       # column -> sidecar entry
+        self._files = {}
+        self._categories = {}  # column -> {value: code}
+
+    def _open(self, col):
+        spec = {"file": f"c{len(self.specs):03d}.bin", "dtype": self.schema[col]}
+        if spec["dtype"] != "category":
+            spec["dtype"] = np.dtype(spec["dtype"]).newbyteorder("<").str
+        self.specs[col] = spec
+        self._categories[col] = {}
+        self._files[col] = open(os.path.join(self.path, spec["file"]), "wb")
+
+    def write(self, df):
+        if self.rows == 0 and not self.specs:
+            for col in df.columns:
+                self.schema.setdefault(col, "float64" if pd.api.types.is_numeric_dtype(df[col]) else "category")
+                self._open(col)
+        if list(df.columns) != list(self.specs):
+            raise ValueError(f"Chunk columns {list(df.columns)} differ from store columns {list(self.specs)}")
+
+        for col in df.columns:
+            spec = self.specs[col]
+            if spec["dtype"] == "category":
+                lookup = self._categories[col]
+                codes = np.fromiter(
+                    (-1 if v is None or v != v else lookup.setdefault(str(v), len(lookup)) for v in df[col]),
+                    dtype="<i4", count=len(df))
+                self._files[col].write(codes.tobytes())
+            else:
+                self._files[col].write(np.ascontiguousarray(df[col].to_numpy(), dtype=spec["dtype"]).tobytes())
+        self.rows += len(df)
+
+    def close(self):
+        columns = {}
+        for col, spec in self.specs.items():
+            self._files[col].close()
+            if spec["dtype"] == "category":
+                spec = dict(spec, categories=list(self._categories[col]))
+            columns[col] = spec
+        tmp = os.path.join(self.path, SCHEMA_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "rows": self.rows, "columns": columns}, f)
+        os.replace(tmp, os.path.join(self.path, SCHEMA_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Public read / write / convert
+# -----------------------------
+def _arrow_table(df):
+    for col in df.columns:
+        if TELEMETRY_SCHEMA.get(col) == "category" or df[col].dtype == object:
+            df = df.assign(**{col: df[col].astype("string")})
+    return pyarrow.Table.from_pandas(df, preserve_index=False)
+
+
+def write_table(df, path, fmt=None, schema=None):
+    """Write a telemetry DataFrame to path in a columnar format (by extension)."""
+    fmt = _format_of(path, fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "npcol":
+        with ColumnStoreWriter(path, schema) as writer:
+            writer.write(df)
+    else:
+        _require_arrow(fmt)
+        table = _arrow_table(df)
+        if fmt == "parquet":
+            pq.write_table(table, path)
+        else:
+            feather.write_feather(table, path)
+
+
+def read_table(path, columns=None, fmt=None):
+    """
+    Read telemetry from CSV, .npcol, Parquet or Feather as a typed DataFrame.
+    Only the requested columns are read from columnar files.
+    """
+    fmt = _format_of(path, fmt)
+    if fmt == "csv":
+        raw = pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=True)
+        df = _typed(raw, dict(TELEMETRY_SCHEMA)).reset_index(drop=True)
+        return df if columns is None else df[columns]
+    if fmt == "npcol":
+        return ColumnStore(path).frame(columns)
+    _require_arrow(fmt)
+    if fmt == "parquet":
+        return pq.read_table(path, columns=columns).to_pandas()
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def iter_frames(path, columns=None, chunksize=100_000, fmt=None):
+    """Yield typed DataFrame chunks of at most chunksize rows."""
+    fmt = _format_of(path, fmt)
+    if fmt == "csv":
+        schema = dict(TELEMETRY_SCHEMA)
+        for raw in pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunksize):
+            yield _typed(raw, schema)
+    elif fmt == "npcol":
+        store = ColumnStore(path)
+        for start in range(0, store.rows, chunksize):
+            yield store.frame(columns, start, start + chunksize)
+    elif fmt == "parquet":
+        _require_arrow(fmt)
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        df = read_table(path, columns, fmt)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+def iter_rows(path, columns=None, chunksize=100_000, fmt=None):
+    """Row dicts for DiagnosticAgent.run_stream / main_runner.module_1 (see telemetry_stream)."""
+    for chunk in iter_frames(path, columns, chunksize, fmt):
+        yield from chunk.to_dict(orient="records")
+
+
+def convert_csv(csv_path, out_path, fmt=None, chunksize=100_000, schema=None):
+    """
+    Stream a telemetry CSV into a columnar file chunk by chunk (constant memory
+    for .npcol and Parquet). Returns the number of rows written.
+    """
+    fmt = _format_of(out_path, fmt)
+    schema = dict(TELEMETRY_SCHEMA if schema is None else schema)
+    chunks = (_typed(raw, schema) for raw in pd.read_csv(csv_path, dtype=str, chunksize=chunksize))
+
+    if fmt == "npcol":
+        with ColumnStoreWriter(out_path, schema) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        return writer.rows
+
+    _require_arrow(fmt)
+    if fmt == "parquet":
+        rows = 0
+        writer = None
+        try:
+            for chunk in chunks:
+                table = _arrow_table(chunk)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    df = pd.concat(list(chunks), ignore_index=True)
+    write_table(df, out_path, fmt)
+    return len(df)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) == 3 and args[0] == "convert":
+        n = convert_csv(args[1], args[2])
+        print(f"Wrote {n} rows to {args[2]}")
+    elif len(args) == 2 and args[0] == "info":
+        if _format_of(args[1]) == "npcol":
+            store = ColumnStore(args[1])
+            print(f"{args[1]}: {store.rows} rows")
+            for col, spec in store.schema.items():
+                extra = f" ({len(spec['categories'])} values)" if spec["dtype"] == "category" else ""
+                print(f"  {col:22} {spec['dtype']}{extra}")
+        else:
+            print(read_table(args[1]).dtypes)
+    else:
+        print("usage: python telemetry_io.py convert <in.csv> <out.npcol|.parquet|.feather>\n"
+              "       python telemetry_io.py info <path>")
+        sys.exit(2)
@@ -0,0 +1,213 @@
+import csv
+import io
+import os
+import queue
+import socket
+import threading
+import time
+
+import pandas as pd
+
+# -----------------------------
+# Streaming telemetry ingest
+# -----------------------------
+# Every source below yields plain row dicts (column name -> value) that can be handed
+# straight to DiagnosticAgent.run_row / run_batch. Nothing is written back to disk.
+
+_END = object()  # sentinel used to close a RowQueue
+
+
+def _coerce(value):
+    """CSV text -> float where possible (matches what pd.read_csv would produce)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def iter_csv(path, chunksize=1000):
+    """Read a CSV once, in chunks, and yield one dict per row."""
+    if not os.path.exists(path):
+        return
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield from chunk.to_dict(orient="records")
+
+
+def drain_csv(path, chunksize=1000, idle_wait=0.05):
+    """
+    Like iter_csv, but consumes the file: once every row has been yielded the
+    rows that were read are cut from the CSV in a single write (instead of one
+    rewrite per row). Rows appended while draining are kept for the next drain.
+    A last row without a trailing newline is read once the file has not grown
+    for idle_wait seconds (the writer is done with it).
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        header = f.readline()
+        data = f.read()
+    if not header.strip():
+        return
+
+    # Only complete lines: a row still being written stays in the file...
+    end = data.rfind(b"\n") + 1
+    # ...unless the writer has gone idle, then the unterminated tail is a row too
+    if end < len(data) and data[end:].strip():
+        time.sleep(idle_wait)
+        if os.path.getsize(path) == len(header) + len(data):
+            end = len(data)
+    if end:
+        for chunk in pd.read_csv(io.BytesIO(header + data[:end]), chunksize=chunksize):
+            yield from chunk.to_dict(orient="records")
+
+    # Drop exactly the bytes consumed above, keep anything appended since
+    with open(path, "r+b") as f:
+        f.seek(len(header) + end)
+        rest = f.read()
+        f.seek(0)
+        f.write(header + rest)
+        f.truncate()
+
+
+def iter_lines(lines, columns=None):
+    """
+    Parse CSV text lines from any iterable (file, socket, generator).
+    The first line is taken as the header unless columns is given.
+    """
+    reader = csv.reader(line.rstrip("\r\n") for line in lines)
+    if columns is None:
+        columns = next(reader, None)
+        if columns is None:
+            return
+    for values in reader:
+        if not values:
+            continue
+        yield {col: _coerce(v) for col, v in zip(columns, values)}
+
+
+def tail_csv(path, stop_event=None, idle_wait=0.05, from_start=True):
+    """
+    Follow a CSV file that another process keeps appending to (like `tail -f`).
+    Rows are yielded as soon as a full line is available; when the file is idle we
+    block on stop_event for idle_wait seconds so a caller can end the stream.
+    """
+    stop_event = stop_event or threading.Event()
+    while not os.path.exists(path):
+        if stop_event.wait(idle_wait):
+            return
+
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        columns = next(csv.reader([f.readline().rstrip("\r\n")]), None)
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+
+        pending = ""
+        while True:
+            line = f.readline()
+            if not line:
+                if stop_event.wait(idle_wait):
+                    return
+                continue
+            pending += line
+            if not pending.endswith("\n"):
+                continue  # partial line, wait for the writer to finish it
+            yield from iter_lines([pending], columns=columns)
+            pending = ""
+
+
+def iter_socket(address, timeout=None):
+    """
+    Connect to a TCP (host, port) that streams CSV text (header first) and yield rows
+    until the peer closes the connection.
+    """
+    with socket.create_connection(address, timeout=timeout) as sock:
+        with sock.makefile("r", encoding="utf-8", newline="") as f:
+            yield from iter_lines(f)
+
+
+class RowQueue:
+    """
+    Bounded, thread-safe hand-off between a producer (file tail, socket, iterator)
+    and the diagnostic agents. put() blocks when the queue is full, so a slow
+    consumer applies back-pressure instead of buffering unbounded telemetry.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._q = queue.Queue(maxsize=maxsize)
+
+    def put(self, row, timeout=None):
+        self._q.put(row, timeout=timeout)
+
+    def close(self):
+        self._q.put(_END)
+
+    def feed(self, rows, daemon=True):
+        """Pump an iterable into the queue from a background thread, then close it."""
+        def pump():
+            try:
+                for row in rows:
+                    self._q.put(row)
+            finally:
+                self._q.put(_END)
+
+        t = threading.Thread(target=pump, daemon=daemon)
+        t.start()
+        return t
+
+    def get(self, timeout=None):
+        """Next row, or raises queue.Empty on timeout. Returns None once closed."""
+        item = self._q.get(timeout=timeout)
+        if item is _END:
+            self._q.put(_END)  # keep other consumers unblocked
+            return None
+        return item
+
+    def __iter__(self):
+        while True:
+            row = self.get()
+            if row is None:
+                return
+            yield row
+
+
+def micro_batches(source, batch_size=256, max_wait=0.1):
+    """
+    Group rows into DataFrames of up to batch_size rows for DiagnosticAgent.run_batch.
+    With a RowQueue source a partial batch is flushed after max_wait seconds without
+    waiting for it to fill up; plain iterables are batched by size only.
+    """
+    if not isinstance(source, RowQueue):
+        batch = []
+        for row in source:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch)
+        return
+
+    batch = []
+    deadline = None
+    while True:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            row = source.get(timeout=timeout)
+        except queue.Empty:
+            row = False  # deadline hit: flush what we have
+
+        if row is None:
+            if batch:
+                yield pd.DataFrame(batch)
+            return
+        if row is not False:
+            batch.append(row)
+            if deadline is None:
+                deadline = time.monotonic() + max_wait
+
+        if batch and (row is False or len(batch) >= batch_size):
+            yield pd.DataFrame(batch)
+            batch = []
+            deadline = None
@@ -0,0 +1,99 @@
+import itertools
+import threading
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+
+# -----------------------------
+# Local stand-in for the Twilio calls API
+# -----------------------------
+# FakeTelephonyClient has the same shape as twilio.rest.Client for what the call
+# dispatcher uses - client.calls.create(to=, from_=, url=, method=) -> call.sid -
+# and plays the callee: it fetches the TwiML from url, "listens" to the <Say>
+# inside <Gather>, and posts a SpeechResult to the Gather action, exactly like the
+# provider's webhooks. No network access or credentials needed.
+
+
+def default_answer(to_number, script, slots):
+    """Pick the first offered slot, spoken the way a caller would."""
+    return slots[0] if slots else "no thanks"
+
+
+class FakeCall:
+    def __init__(self, sid, to, from_, url):
+        self.sid = sid
+        self.to = to
+        self.from_ = from_
+        self.url = url
+        self.status = "queued"
+        self.script = None
+        self.speech = None
+        self.error = None
+
+
+class _FakeCalls:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, to, from_, url, method="POST", **kwargs):
+        return self._client._place(to, from_, url)
+
+
+class FakeTelephonyClient:
+    """
+    answer(to_number, script, slots) -> speech text, or None to stay silent (the
+    Gather then times out and no response is posted). slots are parsed back from
+    the script's "Available slots are:" lines. ring_time delays the first webhook.
+    """
+
+    def __init__(self, answer=default_answer, ring_time=0.0, talk_time=0.0, timeout=10):
+        self.answer = answer
+        self.ring_time = ring_time
+        self.talk_time = talk_time
+        self.timeout = timeout
+        self.calls = _FakeCalls(self)
+        self.placed = []  # FakeCall objects, in order
+        self._sids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _place(self, to, from_, url):
+        with self._lock:
+            call = FakeCall(f"CA{next(self._sids):032x}", to, from_, url)
+            self.placed.append(call)
+        threading.Thread(target=self._run, args=(call,), daemon=True).start()
+        return call
+
+    def _post(self, url, fields):
+        data = urllib.parse.urlencode(fields).encode()
+        with urllib.request.urlopen(url, data=data, timeout=self.timeout) as resp:
+            return resp.read().decode()
+
+    def _run(self, call):
+        try:
+            if self.ring_time:
+                time.sleep(self.ring_time)
+            call.status = "in-progress"
+            base = {"CallSid": call.sid, "To": call.to, "From": call.from_, "CallStatus": call.status}
+            twiml = ET.fromstring(self._post(call.url, base))
+
+            gather = twiml.find("Gather")
+            if gather is None:
+                call.status = "completed"
+                return
+            call.script = "\n".join((say.text or "").strip() for say in gather.iter("Say"))
+            slots = []
+            if "Available slots are:" in call.script:
+                tail = call.script.split("Available slots are:", 1)[1]
+                slots = [line.strip() for line in tail.splitlines() if line.strip()]
+
+            if self.talk_time:
+                time.sleep(self.talk_time)
+            call.speech = self.answer(call.to, call.script, slots)
+            if call.speech is not None:
+                action = urllib.parse.urljoin(call.url, gather.get("action") or call.url)
+                self._post(action, dict(base, SpeechResult=call.speech, Confidence="0.9"))
+            call.status = "completed"
+        except Exception as e:
+            call.status = "failed"
+            call.error = e
@@ -0,0 +1,206 @@
+import os
+import threading
+from datetime import date
+import numpy as np
+
+# -----------------------------
+# Per-vehicle maintenance state
+# -----------------------------
+# Odometer, last service (km + date), next service date and the last verdict of
+# each subsystem for every vehicle, kept in parallel NumPy arrays. A dict maps a
+# vehicle ID to its row, so every update/check is O(1) and a million vehicles
+# cost ~50 bytes of array state each (plus the ID itself).
+#
+#   store.add_km("CA1234", 12.5)            -> (odometer, km since last service)
+#   store.service_date_passed("CA1234")     -> True/False
+#   store.mark_serviced("CA1234")
+#   store.save("vehicle_state.npz"); store.restore("vehicle_state.npz")
+#
+# Dates are stored as proleptic ordinals (date.toordinal()).
+#
+# Each call is atomic on its own; an analyst that acts on what it read (facts ->
+# mark_serviced) re-reads them and commits under store.lock(vehicle_id), so two
+# subsystems of one vehicle cannot both act on the same reading.
+
+VERDICTS = (None, "SAFE", "WARNING", "FAULT")
+_VERDICT_CODE = {v: i for i, v in enumerate(VERDICTS)}
+SUBSYSTEMS = ("ENGINE", "BATTERY")
+
+DEFAULT_VEHICLE = "_fleet"  # used for payloads that carry no vehicle_id
+VEHICLE_LOCKS = 64  # striped per-vehicle locks, see VehicleStateStore.lock
+
+_FIELDS = {
+    "odometer": np.float64,
+    "last_service_km": np.float64,
+    "last_service_day": np.int64,   # 0 = never serviced
+    "next_service_day": np.int64,
+    "verdict_engine": np.int8,
+    "verdict_battery": np.int8,
+}
+
+
+class VehicleStateStore:
+    def __init__(self, initial_km=1000.0, first_service=date(2025, 12, 31), service_interval_days=365,
+                 snapshot_path=None, snapshot_every=10000, capacity=1024):
+        self.initial_km = initial_km
+        self.first_service_day = first_service.toordinal()
+        self.service_interval_days = service_interval_days
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.pending = 0
+
+        self.index = {}  # vehicle_id -> row
+        self.ids = []
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _FIELDS.items()}
+        self._lock = threading.RLock()
+        self._vehicle_locks = [threading.Lock() for _ in range(VEHICLE_LOCKS)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self.index
+
+    def lock(self, vehicle_id):
+        """Lock serializing read-decide-update steps on one vehicle (shared by a stripe of IDs)."""
+        return self._vehicle_locks[hash(vehicle_id) % VEHICLE_LOCKS]
+
+    # ---- rows ----
+    def _grow(self):
+        for name, arr in self.arrays.items():
+            bigger = np.zeros(max(1024, 2 * len(arr)), dtype=arr.dtype)
+            bigger[:len(arr)] = arr
+            self.arrays[name] = bigger
+
+    def _row(self, vehicle_id):
+        row = self.index.get(vehicle_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.arrays["odometer"]):
+                self._grow()
+            self.index[vehicle_id] = row
+            self.ids.append(vehicle_id)
+            self.arrays["odometer"][row] = self.initial_km
+            self.arrays["next_service_day"][row] = self.first_service_day
+        return row
+
+    def get(self, vehicle_id):
+        """Plain dict of one vehicle's state, or None if it was never seen."""
+        with self._lock:
+            row = self.index.get(vehicle_id)
+            if row is None:
+                return None
+            a = self.arrays
+            last_day = int(a["last_service_day"][row])
+            return {
+                "vehicle_id": vehicle_id,
+                "odometer": float(a["odometer"][row]),
+                "last_service_km": float(a["last_service_km"][row]),
+                "last_service_date": date.fromordinal(last_day) if last_day else None,
+                "next_service_date": date.fromordinal(int(a["next_service_day"][row])),
+                "last_verdicts": {s: VERDICTS[a[f"verdict_{s.lower()}"][row]] for s in SUBSYSTEMS},
+            }
+
+    def put(self, record):
+        """Overwrite one vehicle's state with a dict from get() (e.g. from another process)."""
+        with self._lock:
+            row = self._row(record["vehicle_id"])
+            a = self.arrays
+            a["odometer"][row] = record["odometer"]
+            a["last_service_km"][row] = record["last_service_km"]
+            last = record["last_service_date"]
+            a["last_service_day"][row] = last.toordinal() if last else 0
+            a["next_service_day"][row] = record["next_service_date"].toordinal()
+            for s in SUBSYSTEMS:
+                a[f"verdict_{s.lower()}"][row] = _VERDICT_CODE.get(record["last_verdicts"].get(s), 0)
+
+    # ---- incremental updates ----
+    def add_km(self, vehicle_id, km):
+        """Advance the odometer; returns (odometer, km since last service)."""
+        with self._lock:
+            row = self._row(vehicle_id)
+            odo = self.arrays["odometer"]
+            odo[row] += km
+            self._touched()
+            return float(odo[row]), float(odo[row] - self.arrays["last_service_km"][row])
+
+    def km_since_service(self, vehicle_id):
+        with self._lock:
+            row = self._row(vehicle_id)
+            return float(self.arrays["odometer"][row] - self.arrays["last_service_km"][row])
+
+    def record_verdict(self, vehicle_id, subsystem, verdict):
+        if subsystem not in SUBSYSTEMS:
+            return
+        with self._lock:
+            row = self._row(vehicle_id)
+            self.arrays[f"verdict_{subsystem.lower()}"][row] = _VERDICT_CODE.get(verdict, 0)
+
+    def service_date_passed(self, vehicle_id, today=None):
+        today = (today or date.today()).toordinal()
+        with self._lock:
+            return today > self.arrays["next_service_day"][self._row(vehicle_id)]
+
+    def mark_serviced(self, vehicle_id, today=None):
+        """Reset the service odometer and push the next service date one interval out."""
+        today = (today or date.today()).toordinal()
+        with self._lock:
+            row = self._row(vehicle_id)
+            a = self.arrays
+            a["last_service_km"][row] = a["odometer"][row]
+            a["last_service_day"][row] = today
+            a["next_service_day"][row] = today + self.service_interval_days
+            self._touched()
+
+    def _touched(self):
+        self.pending += 1
+        if self.snapshot_path and self.pending >= self.snapshot_every:
+            self.save(self.snapshot_path)
+
+    # ---- durable snapshots ----
+    def save(self, path=None):
+        """Atomically write every vehicle's state to an .npz file."""
+        path = path or self.snapshot_path
+        with self._lock:
+            n = len(self.ids)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    ids=np.asarray(self.ids, dtype=str),
+                    settings=np.asarray([self.initial_km, self.first_service_day, self.service_interval_days]),
+                    **{name: arr[:n] for name, arr in self.arrays.items()},
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self.pending = 0
+
+    def restore(self, path):
+        """Replace this store's contents with a save() file; no-op if path does not exist."""
+        if not os.path.exists(path):
+            return self
+        with np.load(path) as data, self._lock:
+            initial_km, first_day, interval = data["settings"]
+            self.initial_km = float(initial_km)
+            self.first_service_day = int(first_day)
+            self.service_interval_days = int(interval)
+            self.ids = [str(v) for v in data["ids"]]
+            self.index = {v: i for i, v in enumerate(self.ids)}
+            n = max(1024, len(self.ids))
+            self.arrays = {name: np.zeros(n, dtype=dtype) for name, dtype in _FIELDS.items()}
+            for name in _FIELDS:
+                self.arrays[name][:len(self.ids)] = data[name]
+            self.pending = 0
+        return self
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """New store restored from save(); empty if path does not exist."""
+        return cls(**kwargs).restore(path)
+
+
+# Process-wide store. Analysts only use it when it is passed in explicitly
+# (fleet_runner does, Master_mark1 saves/restores it); a DataAnalystAgent
+# built without state= gets a fresh, empty store of its own.
+VEHICLE_STATE = VehicleStateStore()